@@ -0,0 +1,206 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import contextlib
+
+logger = logging.getLogger()
+
+DEFAULT_CACHE_DIR = '/tmp/artifact_cache'
+# Lambda's default /tmp is 512 MB and is shared with everything else the
+# function writes there
+DEFAULT_MAX_BYTES = 256 * 1024**2
+META_SUFFIX = '.meta.json'
+CHUNK_SIZE = 1024 * 1024
+
+
+def split_s3_path(path):
+    bucket, _, key = path[len('s3://') :].partition('/')
+    return bucket, key
+
+
+def file_digest(path, algorithm='sha256'):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    On-disk cache of S3 artifacts, one directory per MLflow run.
+
+    An object is stored under ``{root}/{run_id}/{key}`` next to a metadata file
+    with its ETag, size and SHA-256. A cached file is used only while its ETag
+    matches the one S3 reports and its content still hashes to the recorded
+    digest; otherwise it is downloaded again. Downloads go to a temporary file
+    and are moved into place with ``os.replace``, under a per-run file lock, so
+    processes sharing the directory never read a partial file. Whole runs are
+    evicted least recently used first once the cache exceeds ``max_bytes``.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, s3=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._s3 = s3
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            import boto3  # pylint: disable=import-outside-toplevel
+
+            self._s3 = boto3.client('s3')
+        return self._s3
+
+    def run_dir(self, run_id):
+        return os.path.join(self.root, run_id)
+
+    @contextlib.contextmanager
+    def lock(self, run_id, blocking=True):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f'.{run_id}.lock'), 'a+b') as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def fetch_directory(self, artifact_path, run_id, exclude=()):
+        """
+        Mirror the objects under an ``s3://`` prefix; returns the local dir.
+
+        Objects whose file name is in ``exclude`` are skipped. ``exclude`` can
+        also be a function of the set of listed file names that returns the
+        names to skip, for choices that depend on what the prefix holds.
+        """
+        if not artifact_path.startswith('s3://'):
+            return artifact_path
+        bucket, prefix = split_s3_path(artifact_path.rstrip('/'))
+        paginator = self.s3.get_paginator('list_objects_v2')
+        listed = [
+            item
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix + '/')
+            for item in page.get('Contents', [])
+        ]
+        if callable(exclude):
+            exclude = exclude({os.path.basename(item['Key']) for item in listed})
+        objects = [
+            item for item in listed if os.path.basename(item['Key']) not in exclude
+        ]
+        with self.lock(run_id):
+            for item in objects:
+                self.fetch_object(bucket, item['Key'], item['ETag'], run_id)
+            os.utime(self.run_dir(run_id))
+        self.evict(keep=run_id)
+        return os.path.join(self.run_dir(run_id), prefix)
+
+    def fetch(self, artifact_path, run_id):
+        """Fetch one ``s3://`` object into the cache; returns the local path."""
+        if not artifact_path.startswith('s3://'):
+            return artifact_path
+        bucket, key = split_s3_path(artifact_path)
+        etag = self.s3.head_object(Bucket=bucket, Key=key)['ETag']
+        with self.lock(run_id):
+            local_path = self.fetch_object(bucket, key, etag, run_id)
+            os.utime(self.run_dir(run_id))
+        self.evict(keep=run_id)
+        return local_path
+
+    def fetch_object(self, bucket, key, etag, run_id):
+        local_path = os.path.join(self.run_dir(run_id), key)
+        if self.is_valid(local_path, etag):
+            self.hits += 1
+            return local_path
+
+        self.misses += 1
+        directory = os.path.dirname(local_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.download-')
+        os.close(fd)
+        try:
+            self.s3.download_file(bucket, key, tmp_path)
+            metadata = {
+                'etag': etag,
+                'size': os.path.getsize(tmp_path),
+                'sha256': file_digest(tmp_path),
+            }
+            # Single-part uploads have the MD5 of the content as their ETag
+            md5 = etag.strip('"')
+            if '-' not in md5 and file_digest(tmp_path, 'md5') != md5:
+                raise IOError(f"Checksum mismatch downloading s3://{bucket}/{key}")
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.write_metadata(local_path, metadata)
+        logger.info("Cached s3://%s/%s at %s", bucket, key, local_path)
+        return local_path
+
+    def write_metadata(self, local_path, metadata):
+        meta_path = local_path + META_SUFFIX
+        tmp_path = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wt', encoding='utf-8') as f_out:
+            json.dump(metadata, f_out)
+        os.replace(tmp_path, meta_path)
+
+    def is_valid(self, local_path, etag):
+        try:
+            with open(local_path + META_SUFFIX, 'rt', encoding='utf-8') as f_in:
+                metadata = json.load(f_in)
+            if metadata['etag'] != etag:
+                return False
+            if os.path.getsize(local_path) != metadata['size']:
+                return False
+            return file_digest(local_path) == metadata['sha256']
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def run_size(self, run_id):
+        total = 0
+        for directory, _, files in os.walk(self.run_dir(run_id)):
+            total += sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+        return total
+
+    def evict(self, keep=None):
+        """Drop least recently used runs until the cache fits in ``max_bytes``."""
+        if not os.path.isdir(self.root):
+            return
+        runs = [
+            entry
+            for entry in os.scandir(self.root)
+            if entry.is_dir() and not entry.name.startswith('.')
+        ]
+        sizes = {entry.name: self.run_size(entry.name) for entry in runs}
+        total = sum(sizes.values())
+        for entry in sorted(runs, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            with self.lock(entry.name, blocking=False) as locked:
+                # Runs being fetched by another process are left alone
+                if not locked:
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+            total -= sizes[entry.name]
+            self.evictions += 1
+            logger.info("Evicted cached artifacts of run %s", entry.name)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,122 @@
+"""
+Microbenchmark of Kinesis record decoding.
+
+Compares the original per-record path (``base64_decode`` plus
+``prepare_features`` for every record) with ``decode_records``. Both paths
+produce what the scorer consumes: the shot IDs and one float64 array per
+feature. Both run at the same log level, ``WARNING`` by default, so the
+per-shot INFO log of ``prepare_features`` is not part of the comparison.
+
+    python benchmarks/decode_bench.py --batch-size 500 --repeat 200
+"""
+
+import os
+import sys
+import json
+import base64
+import timeit
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import numpy as np
+
+from model import FEATURE_COLUMNS, ModelService, base64_decode
+from record_decoder import decode_records
+
+
+def make_records(batch_size, seed=42):
+    rng = np.random.default_rng(seed)
+    records = []
+    for shot_id in range(batch_size):
+        shot_event = {
+            'shot': {
+                'distance_to_goal': float(rng.uniform(0, 40)),
+                'angle_to_goal': float(rng.uniform(0, np.pi)),
+            },
+            'shot_id': shot_id,
+        }
+        data = base64.b64encode(json.dumps(shot_event).encode('utf-8')).decode()
+        records.append({'kinesis': {'data': data, 'sequenceNumber': str(shot_id)}})
+    return records
+
+
+def per_record_path(service, records):
+    shot_ids = []
+    features_batch = []
+    for record in records:
+        shot_event = base64_decode(record['kinesis']['data'])
+        shot_ids.append(shot_event['shot_id'])
+        features_batch.append(service.prepare_features(shot_event['shot']))
+    # The old handler turned the feature dicts into columns for the model
+    columns = {
+        column: np.array(
+            [features[column] for features in features_batch], dtype=np.float64
+        )
+        for column in FEATURE_COLUMNS
+    }
+    return shot_ids, columns
+
+
+def columnar_path(records):
+    # Everything handle_event takes from the decoded batch
+    batch = decode_records(records)
+    valid_indexes = batch.valid_indexes().tolist()
+    shot_ids = [batch.shot_ids[index] for index in valid_indexes]
+    _ = [batch.sequence_numbers[index] for index in valid_indexes]
+    return shot_ids, batch.feature_columns()
+
+
+def run(batch_size, repeat, log_level='WARNING'):
+    logging.getLogger().setLevel(log_level)
+    service = ModelService(None, None)
+    records = make_records(batch_size)
+
+    expected_ids, expected_columns = per_record_path(service, records)
+    shot_ids, columns = columnar_path(records)
+    assert shot_ids == expected_ids
+    for column in FEATURE_COLUMNS:
+        np.testing.assert_array_equal(columns[column], expected_columns[column])
+
+    results = {}
+    for name, func in (
+        ('per_record', lambda: per_record_path(service, records)),
+        ('columnar', lambda: columnar_path(records)),
+    ):
+        timings = timeit.repeat(func, number=1, repeat=repeat)
+        results[name] = {
+            'median_us': float(np.median(timings) * 1e6),
+            'p99_us': float(np.quantile(timings, 0.99) * 1e6),
+        }
+    results['speedup'] = results['per_record']['median_us'] / max(
+        results['columnar']['median_us'], 1e-9
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Microbenchmark of Kinesis record decoding.'
+    )
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument(
+        '--log-level',
+        default='WARNING',
+        help='Root log level of both paths, e.g. INFO to include per-shot logging',
+    )
+    args = parser.parse_args()
+
+    results = run(args.batch_size, args.repeat, args.log_level)
+    print(
+        json.dumps(
+            {'batch_size': args.batch_size, 'log_level': args.log_level, **results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Serving benchmark for ModelService on synthetic Kinesis batches.
+
+Each scenario (model x batch size x drift flush) sends synthetic base64
+events through ``lambda_handler`` and reports p50/p95/p99 latency per stage,
+as recorded by the handler's instrumentation, and end-to-end throughput.
+Results are written as JSON and compared with a stored baseline; a stage
+whose p50 got slower than the tolerance is flagged and the script exits with
+status 1.
+
+Timings depend on the machine, so baselines are not committed:
+``benchmarks/results/`` is git-ignored. Record one on each machine first,
+with ``make benchmark-baseline`` or ``--save-baseline``. Comparing against a
+baseline that does not exist exits with status 2.
+
+    python benchmarks/serving_bench.py --output benchmarks/results/latest.json \\
+        --baseline benchmarks/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import numpy as np
+from decode_bench import make_records
+
+import model
+from drift import DriftEngine
+from tree_engine import TreeEnsembleModel
+from instrumentation import MemoryExporter, Instrumentation
+
+BATCH_SIZES = (1, 10, 100, 500)
+MODELS = ('mock', 'xgboost', 'numpy')
+STAGES = ('decode', 'score', 'predict', 'publish', 'drift', 'total')
+PERCENTILES = (50, 95, 99)
+
+
+class MockModel:
+    accepts_columns = True
+
+    def predict(self, X):
+        return np.clip(np.asarray(X['distance_to_goal'], dtype=float) / 100, 0, 1)
+
+
+class BoosterModel:
+    """Small xgboost booster scored through a DMatrix, as mlflow.pyfunc does."""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict(self, X):
+        import xgboost as xgb  # pylint: disable=import-outside-toplevel
+
+        return self.booster.predict(xgb.DMatrix(X))
+
+
+class KinesisClientStub:
+    def put_records(self, StreamName, Records):
+        return {'FailedRecordCount': 0, 'Records': [{} for _ in Records]}
+
+
+def train_booster(seed=42, rows=5000):
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    import xgboost as xgb  # pylint: disable=import-outside-toplevel
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(
+        {
+            'angle_to_goal': rng.uniform(0, np.pi, rows),
+            'distance_to_goal': rng.uniform(0, 40, rows),
+        }
+    )
+    logit = 1.5 * X['angle_to_goal'] - 0.15 * X['distance_to_goal']
+    y = rng.uniform(size=rows) < 1 / (1 + np.exp(-logit))
+    params = {'max_depth': 4, 'objective': 'binary:logistic', 'seed': seed}
+    return xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=50)
+
+
+def create_model(name, booster=None):
+    if name == 'mock':
+        return MockModel()
+    if name == 'xgboost':
+        return BoosterModel(booster)
+    if name == 'numpy':
+        return TreeEnsembleModel.from_booster(booster)
+    raise ValueError(f"Unknown model: {name}")
+
+
+def create_service(serving_model, drift, exporter):
+    drift_engine = None
+    if drift:
+        rng = np.random.default_rng(0)
+        drift_engine = DriftEngine.from_columns(
+            {
+                'distance_to_goal': rng.uniform(0, 40, 2000),
+                'angle_to_goal': rng.uniform(0, np.pi, 2000),
+                'prediction': rng.uniform(0, 1, 2000),
+            }
+        )
+    publisher = model.KinesisBatchPublisher(KinesisClientStub(), 'predictions')
+    return model.ModelService(
+        serving_model,
+        None,
+        'bench',
+        callbacks=[publisher],
+        drift_engine=drift_engine,
+        instrumentation=Instrumentation(exporter),
+        # With drift on, every invocation ends with a drift flush
+        drift_threshold=1 if drift else None,
+    )
+
+
+def run_invocation(service, exporter, event):
+    """Run ``lambda_handler`` once; returns its stage timings in nanoseconds."""
+    service.lambda_handler(event)
+    # The drift evaluation exports its own record before the invocation's
+    (record,) = [
+        record for record in exporter.records if record['operation'] == 'invocation'
+    ]
+    exporter.records.clear()
+    return {stage: record['timings'].get(stage, 0) for stage in STAGES}
+
+
+def summarize(samples, batch_size):
+    summary = {}
+    for stage in STAGES:
+        values = np.asarray([sample[stage] for sample in samples]) / 1e3
+        summary[stage] = {
+            f'p{q}_us': float(np.percentile(values, q)) for q in PERCENTILES
+        }
+    total_seconds = sum(sample['total'] for sample in samples) / 1e9
+    summary['throughput_rps'] = batch_size * len(samples) / max(total_seconds, 1e-9)
+    return summary
+
+
+def run_scenario(serving_model, batch_size, drift, iterations, warmup):
+    exporter = MemoryExporter()
+    service = create_service(serving_model, drift, exporter)
+    event = {'Records': make_records(batch_size)}
+    for _ in range(warmup):
+        run_invocation(service, exporter, event)
+    samples = [run_invocation(service, exporter, event) for _ in range(iterations)]
+    return summarize(samples, batch_size)
+
+
+def run(models, batch_sizes, iterations, warmup):
+    booster = train_booster() if set(models) & {'xgboost', 'numpy'} else None
+    results = {}
+    for model_name in models:
+        serving_model = create_model(model_name, booster)
+        for batch_size in batch_sizes:
+            for drift in (False, True):
+                name = (
+                    f"{model_name}/batch={batch_size}/drift={'on' if drift else 'off'}"
+                )
+                results[name] = run_scenario(
+                    serving_model, batch_size, drift, iterations, warmup
+                )
+                print(
+                    f"{name:<32} p50 {results[name]['total']['p50_us']:>10.1f} us"
+                    f"  {results[name]['throughput_rps']:>12.0f} records/s"
+                )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Scenario stages whose p50 is more than ``tolerance`` slower than baseline."""
+    regressions = []
+    for name, scenario in results.items():
+        if name not in baseline:
+            continue
+        for stage in STAGES:
+            if stage not in baseline[name]:
+                continue
+            before = baseline[name][stage]['p50_us']
+            after = scenario[stage]['p50_us']
+            # Sub-microsecond stages are all noise
+            if before >= 1.0 and after > before * (1 + tolerance):
+                regressions.append(
+                    {
+                        'scenario': name,
+                        'stage': stage,
+                        'baseline_p50_us': before,
+                        'p50_us': after,
+                        'change': after / before - 1,
+                    }
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serving benchmark for ModelService on synthetic Kinesis batches.'
+    )
+    parser.add_argument('--models', nargs='+', default=list(MODELS), choices=MODELS)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=list(BATCH_SIZES))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', default='benchmarks/results/latest.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument(
+        '--save-baseline', action='store_true', help='also write --baseline'
+    )
+    args = parser.parse_args()
+
+    if args.baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        print(
+            f"No baseline at {args.baseline}. Baselines are machine-specific and "
+            "not committed (benchmarks/results/ is git-ignored); record one "
+            "with 'make benchmark-baseline' or --save-baseline.",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+
+    # The service logs at INFO on every batch, as it does in the Lambda
+    logging.getLogger().setLevel(logging.INFO)
+
+    results = run(args.models, args.batch_sizes, args.iterations, args.warmup)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'iterations': args.iterations,
+        'scenarios': results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'wt', encoding='utf-8') as f_out:
+        json.dump(report, f_out, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline and args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'wt', encoding='utf-8') as f_out:
+            json.dump(report, f_out, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, 'rt', encoding='utf-8') as f_in:
+            baseline = json.load(f_in)['scenarios']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['scenario']} {regression['stage']}: "
+                f"{regression['baseline_p50_us']:.1f} -> "
+                f"{regression['p50_us']:.1f} us (+{regression['change']:.0%})"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+import numpy as np
+
+DRIFT_COLUMNS = ('distance_to_goal', 'angle_to_goal', 'prediction')
+QUANTILE_COLUMN = 'distance_to_goal'
+PREDICTION_COLUMN = 'prediction'
+
+PROFILE_BINS = 100
+# Bins for window columns that have no reference to borrow edges from
+DEFAULT_EDGES = {
+    'distance_to_goal': np.linspace(0.0, 120.0, 241),
+    'angle_to_goal': np.linspace(0.0, np.pi, 181),
+    'prediction': np.linspace(0.0, 1.0, 101),
+}
+# Evidently's defaults for numerical columns: K-S test on small references,
+# normed Wasserstein distance on large ones
+KS_MAX_REFERENCE_SIZE = 1000
+KS_THRESHOLD = 0.05
+WASSERSTEIN_THRESHOLD = 0.1
+
+
+def ks_p_value(statistic, n, m):
+    """Asymptotic two-sample Kolmogorov-Smirnov p-value."""
+    if n == 0 or m == 0:
+        return 1.0
+    en = np.sqrt(n * m / (n + m))
+    lam = (en + 0.12 + 0.11 / en) * statistic
+    if lam < 1e-3:
+        return 1.0
+    j = np.arange(1, 101)
+    terms = 2 * (-1.0) ** (j - 1) * np.exp(-2 * j**2 * lam**2)
+    return float(np.clip(terms.sum(), 0.0, 1.0))
+
+
+class ColumnSketch:  # pylint: disable=too-many-instance-attributes
+    """
+    Mergeable histogram sketch of one numeric column.
+
+    Values are counted into bins delimited by ``edges`` (plus one open bin on
+    each side), missing values are counted separately, and min, max, sum and
+    sum of squares are tracked, so quantiles, CDF-based tests and moments can
+    be answered from O(bins) state. An update costs O(batch).
+    """
+
+    __slots__ = ('edges', 'counts', 'missing', 'count', 'min', 'max', 'sum', 'sumsq')
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.missing = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    @classmethod
+    def from_values(cls, values, bins=PROFILE_BINS):
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        if present.size:
+            edges = np.unique(np.quantile(present, np.linspace(0, 1, bins + 1)))
+        else:
+            edges = np.array([0.0])
+        sketch = cls(edges)
+        sketch.update(values)
+        return sketch
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        present = values[~missing] if missing.any() else values
+        self.missing += int(missing.sum())
+        if not present.size:
+            return
+        self.counts += np.bincount(
+            np.searchsorted(self.edges, present, side='right'),
+            minlength=len(self.counts),
+        )
+        self.count += len(present)
+        self.min = min(self.min, float(present.min()))
+        self.max = max(self.max, float(present.max()))
+        self.sum += float(present.sum())
+        self.sumsq += float(np.dot(present, present))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Only sketches with the same bin edges can be merged")
+        self.counts += other.counts
+        self.missing += other.missing
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        return self
+
+    def empty_like(self):
+        return ColumnSketch(self.edges)
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.sum / self.count
+        variance = (self.sumsq - self.count * mean**2) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def cdf(self):
+        """Share of present values strictly below each bin edge."""
+        if self.count == 0:
+            return np.zeros(len(self.edges))
+        return np.cumsum(self.counts)[:-1] / self.count
+
+    def bin_bounds(self, index):
+        low = self.edges[index - 1] if index > 0 else self.min
+        high = self.edges[index] if index < len(self.edges) else self.max
+        return max(low, self.min), min(high, self.max)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target, side='left'))
+        low, high = self.bin_bounds(index)
+        below = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - below) / self.counts[index] if self.counts[index] else 0
+        return float(low + (high - low) * min(max(fraction, 0.0), 1.0))
+
+    def to_dict(self):
+        return {
+            'edges': self.edges.tolist(),
+            'counts': self.counts.tolist(),
+            'missing': self.missing,
+            'count': self.count,
+            'min': None if self.count == 0 else self.min,
+            'max': None if self.count == 0 else self.max,
+            'sum': self.sum,
+            'sumsq': self.sumsq,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['edges'])
+        sketch.counts = np.asarray(data['counts'], dtype=np.int64)
+        sketch.missing = int(data['missing'])
+        sketch.count = int(data['count'])
+        sketch.min = np.inf if data['min'] is None else float(data['min'])
+        sketch.max = -np.inf if data['max'] is None else float(data['max'])
+        sketch.sum = float(data['sum'])
+        sketch.sumsq = float(data['sumsq'])
+        return sketch
+
+
+def ks_statistic(reference, current):
+    return float(np.abs(reference.cdf() - current.cdf()).max(initial=0.0))
+
+
+def wasserstein_distance(reference, current):
+    """W1 distance between two sketches, integrating |F_ref - F_cur| over bins."""
+    gap = np.abs(reference.cdf() - current.cdf())
+    edges = reference.edges
+    distance = float(np.sum((gap[:-1] + gap[1:]) / 2 * np.diff(edges)))
+    # Mass outside the reference edges, bounded by the observed extremes
+    low = min(reference.min, current.min)
+    high = max(reference.max, current.max)
+    if low < edges[0]:
+        distance += gap[0] * (edges[0] - low)
+    if high > edges[-1]:
+        distance += gap[-1] * (high - edges[-1])
+    return distance
+
+
+class DriftWindow:
+    """Sketches of the current window, binned like the reference profile."""
+
+    def __init__(self, reference):
+        self.sketches = {
+            column: (
+                reference[column].empty_like()
+                if column in reference
+                else ColumnSketch(DEFAULT_EDGES[column])
+            )
+            for column in DRIFT_COLUMNS
+        }
+        self.rows = 0
+
+    def update(self, columns):
+        for column, sketch in self.sketches.items():
+            sketch.update(columns[column])
+        self.rows += len(columns[PREDICTION_COLUMN])
+
+    def merge(self, other):
+        for column, sketch in self.sketches.items():
+            sketch.merge(other.sketches[column])
+        self.rows += other.rows
+        return self
+
+    def missing_values(self):
+        return sum(sketch.missing for sketch in self.sketches.values())
+
+
+class DriftEngine:
+    """
+    Incremental replacement for the Evidently drift report.
+
+    ``update`` folds each scored batch into the current window in O(batch);
+    ``evaluate`` compares the window with the reference sketches in O(bins)
+    and returns the metrics written to ``opt_metrics``.
+    """
+
+    def __init__(self, reference_profile):
+        self.reference = {
+            column: ColumnSketch.from_dict(data)
+            for column, data in reference_profile['columns'].items()
+            if column in DRIFT_COLUMNS
+        }
+        self.window = DriftWindow(self.reference)
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(build_reference_profile(columns))
+
+    def update(self, columns):
+        self.window.update(columns)
+
+    def take_window(self):
+        """Hand over the current window and start a new one."""
+        window, self.window = self.window, DriftWindow(self.reference)
+        return window
+
+    def column_drift(self, column, window):
+        reference = self.reference[column]
+        current = window.sketches[column]
+        if reference.count <= KS_MAX_REFERENCE_SIZE:
+            statistic = ks_statistic(reference, current)
+            score = ks_p_value(statistic, reference.count, current.count)
+            return score, bool(score < KS_THRESHOLD)
+        score = wasserstein_distance(reference, current) / max(reference.std, 0.001)
+        return float(score), bool(score > WASSERSTEIN_THRESHOLD)
+
+    def evaluate(self, window=None):
+        window = window or self.window
+        drift = {
+            column: self.column_drift(column, window)
+            for column in self.reference
+            if window.sketches[column].count
+        }
+
+        cells = window.rows * len(DRIFT_COLUMNS)
+        return {
+            'prediction_drift': drift.get(PREDICTION_COLUMN, (None, False))[0],
+            'num_drifted_columns': sum(detected for _, detected in drift.values()),
+            'share_missing_values': window.missing_values() / cells if cells else 0.0,
+            'distance_to_goal_quantile': window.sketches[QUANTILE_COLUMN].quantile(0.5),
+        }
+
+
+def build_reference_profile(columns, bins=PROFILE_BINS):
+    """
+    Summarize reference columns into the sketches used by ``DriftEngine``.
+
+    Besides the sketch state, each column records a few quantiles and its
+    missing-value rate so the profile can be read on its own.
+    """
+    profile_columns = {}
+    for column, values in columns.items():
+        sketch = ColumnSketch.from_values(values, bins=bins)
+        total = sketch.count + sketch.missing
+        profile_columns[column] = {
+            **sketch.to_dict(),
+            'quantiles': {
+                str(q): sketch.quantile(q) for q in (0.05, 0.25, 0.5, 0.75, 0.95)
+            },
+            'missing_rate': sketch.missing / total if total else 0.0,
+        }
+    return {'columns': profile_columns}
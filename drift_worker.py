@@ -0,0 +1,114 @@
+import queue
+import atexit
+import signal
+import logging
+import threading
+
+logger = logging.getLogger()
+
+_STOP = object()
+
+
+class DriftWorker:
+    """
+    Background thread that runs drift jobs off the request path.
+
+    Jobs are zero-argument callables (evaluate a window, write its metrics).
+    The hand-off queue is bounded: when it is full the window is dropped and
+    counted rather than blocking the invocation that produced it.
+    """
+
+    def __init__(self, max_queue_size=4):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped_windows = 0
+        self.processed_windows = 0
+        self.failed_windows = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='drift-worker', daemon=True
+                )
+                self.thread.start()
+
+    def submit(self, job):
+        self.start()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.dropped_windows += 1
+            logger.warning(
+                "Drift queue full, dropped window (%s dropped so far)",
+                self.dropped_windows,
+            )
+            return False
+        return True
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is _STOP:
+                    return
+                job()
+                self.processed_windows += 1
+            except Exception as e:
+                self.failed_windows += 1
+                logger.error("Drift monitoring failed: %s", e)
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout=None):
+        """Wait until every queued window is processed; False on timeout."""
+        with self.queue.all_tasks_done:
+            return self.queue.all_tasks_done.wait_for(
+                lambda: self.queue.unfinished_tasks == 0, timeout=timeout
+            )
+
+    def stop(self, timeout=None):
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'dropped_windows': self.dropped_windows,
+            'processed_windows': self.processed_windows,
+            'failed_windows': self.failed_windows,
+        }
+
+    def install_shutdown_hooks(self, timeout=5.0, after_flush=None):
+        """
+        Flush pending windows when the process exits or receives SIGTERM.
+
+        ``after_flush`` runs once the queue is drained, e.g. to flush the
+        metrics sink the jobs write to.
+        """
+
+        def flush_all():
+            self.flush(timeout)
+            if after_flush is not None:
+                after_flush()
+
+        atexit.register(flush_all)
+
+        previous_handler = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            logger.info("SIGTERM received, flushing drift queue: %s", self.stats())
+            flush_all()
+            if callable(previous_handler):
+                previous_handler(signum, frame)
+            elif previous_handler != signal.SIG_IGN:
+                raise SystemExit(0)
+
+        try:
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            # Signal handlers can only be installed from the main thread
+            logger.debug("Could not install SIGTERM handler for the drift worker")
@@ -26,12 +26,30 @@ resource "aws_lambda_function_event_invoke_config" "kinesis_lambda_event" {
   maximum_retry_attempts       = 0
 }
 
+resource "aws_sqs_queue" "kinesis_failures" {
+  name                      = "${var.lambda_function_name}-failures"
+  message_retention_seconds = 1209600
+}
+
 resource "aws_lambda_event_source_mapping" "kinesis_mapping" {
-  event_source_arn  = var.source_stream_arn
-  function_name     = aws_lambda_function.kinesis_lambda.arn
-  starting_position = "LATEST"
+  event_source_arn        = var.source_stream_arn
+  function_name           = aws_lambda_function.kinesis_lambda.arn
+  starting_position       = "LATEST"
+  // Records that fail to score are returned in batchItemFailures instead of failing the batch.
+  // Malformed records are skipped by the handler, so they never block the shard.
+  function_response_types = ["ReportBatchItemFailures"]
+  // Give up on a failing batch after a few retries, splitting it to isolate the bad records,
+  // and send its metadata to the failure queue instead of retrying it forever
+  maximum_retry_attempts         = var.maximum_retry_attempts
+  bisect_batch_on_function_error = true
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.kinesis_failures.arn
+    }
+  }
   depends_on = [
-    aws_iam_role_policy_attachment.kinesis_processing
+    aws_iam_role_policy_attachment.kinesis_processing,
+    aws_iam_role_policy.inline_lambda_policy
   ]
   // enabled           = var.lambda_event_source_mapping_enabled
   // batch_size        = var.lambda_event_source_mapping_batch_size
@@ -27,3 +27,8 @@ variable "lambda_function_name" {
 variable "image_uri" {
   description = "ECR image uri"
 }
+
+variable "maximum_retry_attempts" {
+  description = "Retries of a failing Kinesis batch before it is sent to the failure queue"
+  default     = 3
+}
@@ -0,0 +1,190 @@
+import sys
+import json
+import time
+import logging
+
+logger = logging.getLogger()
+
+DEFAULT_NAMESPACE = 'xgoals'
+
+
+class Stage:
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter_ns() - self.start
+        timings = self.record.timings
+        timings[self.name] = timings.get(self.name, 0) + elapsed
+        return False
+
+
+class MetricsRecord:
+    """Stage timings (ns) and counters collected for one operation."""
+
+    __slots__ = ('instrumentation', 'operation', 'timings', 'counters', 'start')
+
+    def __init__(self, instrumentation, operation):
+        self.instrumentation = instrumentation
+        self.operation = operation
+        self.timings = {}
+        self.counters = {}
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings['total'] = time.perf_counter_ns() - self.start
+        self.instrumentation.export(self)
+        return False
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        self.counters[name] = value
+
+
+class NullRecord:
+    """Stand-in used when instrumentation is off; every call is a no-op."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def stage(self, name):
+        return self
+
+    def count(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+
+NULL_RECORD = NullRecord()
+
+
+class Instrumentation:
+    """
+    Per-operation stage timers and counters handed to a pluggable exporter.
+
+    ``record(operation)`` returns a context manager; stages are timed with
+    ``perf_counter_ns`` inside it and the finished record is passed to
+    ``exporter`` on exit.
+    """
+
+    enabled = True
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def record(self, operation='invocation'):
+        return MetricsRecord(self, operation)
+
+    def export(self, record):
+        try:
+            self.exporter(record)
+        except Exception as e:
+            logger.warning("Could not export metrics: %s", e)
+
+
+class NullInstrumentation:
+    enabled = False
+
+    def record(self, operation='invocation'):
+        return NULL_RECORD
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+def record_values(record):
+    values = {f'{name}_us': ns / 1000 for name, ns in record.timings.items()}
+    values.update(record.counters)
+    return values
+
+
+class EMFExporter:
+    """
+    Writes each record as a CloudWatch Embedded Metric Format log line.
+
+    Lambda forwards stdout to CloudWatch Logs, which extracts the metrics
+    without any API call on the request path.
+    """
+
+    def __init__(self, namespace=DEFAULT_NAMESPACE, stream=None):
+        self.namespace = namespace
+        self.stream = stream
+
+    def __call__(self, record):
+        values = record_values(record)
+        metrics = [
+            {'Name': name, 'Unit': 'Microseconds' if name.endswith('_us') else 'Count'}
+            for name in values
+        ]
+        line = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [
+                    {
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Operation']],
+                        'Metrics': metrics,
+                    }
+                ],
+            },
+            'Operation': record.operation,
+            **values,
+        }
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(line) + '\n')
+
+
+class LoggingExporter:
+    def __call__(self, record):
+        logger.info("%s metrics: %s", record.operation, record_values(record))
+
+
+class MemoryExporter:
+    """Keeps exported records in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(
+            {
+                'operation': record.operation,
+                'timings': dict(record.timings),
+                'counters': dict(record.counters),
+            }
+        )
+
+
+EXPORTERS = {'emf': EMFExporter, 'log': LoggingExporter, 'memory': MemoryExporter}
+
+
+def create_instrumentation(mode):
+    if mode in (None, '', 'off'):
+        return NULL_INSTRUMENTATION
+    if mode not in EXPORTERS:
+        raise ValueError(f"Unknown instrumentation mode: {mode}")
+    return Instrumentation(EXPORTERS[mode]())
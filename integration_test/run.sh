@@ -53,7 +53,8 @@ DEST_DIR="model"
 
 # Define the S3 path and copy model data from S3 to the destination directory
 S3_PATH="s3://${S3_BUCKET}/${S3_PREFIX}/${RUN_ID}/artifacts/model/"
-aws s3 cp --recursive $S3_PATH $DEST_DIR
+# sync only fetches the files that changed since the last run
+aws s3 sync $S3_PATH $DEST_DIR
 
 
 
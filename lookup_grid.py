@@ -0,0 +1,176 @@
+import numpy as np
+
+GRID_ARTIFACT_NAME = 'model_grid.npz'
+
+# Wyscout pitches are 105m x 68m, so no shot is further than ~111m from goal
+DISTANCE_RANGE = (0.0, 120.0)
+ANGLE_RANGE = (0.0, np.pi)
+DISTANCE_POINTS = 481  # 0.25m steps
+ANGLE_POINTS = 181  # 1 degree steps
+
+BUILD_CHUNK_SIZE = 8192
+
+
+def predict_columns(model, columns):
+    if getattr(model, 'accepts_columns', False):
+        return np.asarray(model.predict(columns), dtype=np.float64)
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    return np.asarray(model.predict(pd.DataFrame(columns)), dtype=np.float64)
+
+
+def predict_points(model, distance, angle):
+    """Score flat arrays of feature values with any serving model, in chunks."""
+    predictions = np.empty(len(distance), dtype=np.float64)
+    for start in range(0, len(distance), BUILD_CHUNK_SIZE):
+        stop = start + BUILD_CHUNK_SIZE
+        predictions[start:stop] = predict_columns(
+            model,
+            {
+                'distance_to_goal': distance[start:stop],
+                'angle_to_goal': angle[start:stop],
+            },
+        )
+    return predictions
+
+
+def interpolation_weights(axis, values):
+    step = axis[1] - axis[0]
+    # Missing values get a dummy position here and are resolved by the caller
+    position = np.nan_to_num((np.clip(values, axis[0], axis[-1]) - axis[0]) / step)
+    index = np.clip(np.floor(position).astype(np.intp), 0, len(axis) - 2)
+    return index, position - index
+
+
+class LookupGridModel:
+    """
+    Dense (distance_to_goal, angle_to_goal) response surface of a model.
+
+    Shots are scored by bilinear interpolation over the grid, so serving needs
+    no model call at all. Inputs outside the grid are clamped to its edges.
+    Missing values use the model's own answer for a missing feature, which is
+    stored as one extra grid line per feature at build time.
+    """
+
+    accepts_columns = True
+
+    def __init__(self, distance_axis, angle_axis, surfaces, error_bounds=None):
+        self.distance_axis = np.asarray(distance_axis, dtype=np.float64)
+        self.angle_axis = np.asarray(angle_axis, dtype=np.float64)
+        self.values = np.asarray(surfaces['values'], dtype=np.float64)
+        self.missing_distance = np.asarray(
+            surfaces['missing_distance'], dtype=np.float64
+        )
+        self.missing_angle = np.asarray(surfaces['missing_angle'], dtype=np.float64)
+        self.missing_both = float(surfaces['missing_both'])
+        self.error_bounds = error_bounds or {}
+
+    @classmethod
+    def build(
+        cls,
+        model,
+        distance_points=DISTANCE_POINTS,
+        angle_points=ANGLE_POINTS,
+        distance_range=DISTANCE_RANGE,
+        angle_range=ANGLE_RANGE,
+    ):
+        """Evaluate ``model`` once on every grid point and measure the error."""
+        distance_axis = np.linspace(*distance_range, distance_points)
+        angle_axis = np.linspace(*angle_range, angle_points)
+        distance, angle = np.meshgrid(distance_axis, angle_axis, indexing='ij')
+
+        nan_angle = np.full(distance_points, np.nan)
+        nan_distance = np.full(angle_points, np.nan)
+        surfaces = {
+            'values': predict_points(model, distance.ravel(), angle.ravel()).reshape(
+                distance_points, angle_points
+            ),
+            'missing_distance': predict_points(model, nan_distance, angle_axis),
+            'missing_angle': predict_points(model, distance_axis, nan_angle),
+            'missing_both': predict_points(
+                model, np.array([np.nan]), np.array([np.nan])
+            )[0],
+        }
+
+        grid = cls(distance_axis, angle_axis, surfaces)
+        grid.error_bounds = grid.measure_error(model)
+        return grid
+
+    def measure_error(self, model, samples=20000, seed=42):
+        """Compare the grid with ``model`` on random in-range shots."""
+        rng = np.random.default_rng(seed)
+        distance = rng.uniform(self.distance_axis[0], self.distance_axis[-1], samples)
+        angle = rng.uniform(self.angle_axis[0], self.angle_axis[-1], samples)
+
+        expected = predict_points(model, distance, angle)
+        actual = self.predict({'distance_to_goal': distance, 'angle_to_goal': angle})
+        abs_error = np.abs(actual - expected)
+
+        return {
+            'distance_step': float(self.distance_axis[1] - self.distance_axis[0]),
+            'angle_step': float(self.angle_axis[1] - self.angle_axis[0]),
+            'samples': samples,
+            'max_abs_error': float(abs_error.max()),
+            'mean_abs_error': float(abs_error.mean()),
+            'p99_abs_error': float(np.quantile(abs_error, 0.99)),
+        }
+
+    def predict(self, X):
+        distance = np.asarray(X['distance_to_goal'], dtype=np.float64)
+        angle = np.asarray(X['angle_to_goal'], dtype=np.float64)
+        missing_distance = np.isnan(distance)
+        missing_angle = np.isnan(angle)
+
+        i, td = interpolation_weights(self.distance_axis, distance)
+        j, ta = interpolation_weights(self.angle_axis, angle)
+
+        values = self.values
+        predictions = (
+            values[i, j] * (1 - td) * (1 - ta)
+            + values[i + 1, j] * td * (1 - ta)
+            + values[i, j + 1] * (1 - td) * ta
+            + values[i + 1, j + 1] * td * ta
+        )
+
+        if missing_distance.any() or missing_angle.any():
+            only_distance = missing_distance & ~missing_angle
+            only_angle = missing_angle & ~missing_distance
+            predictions[only_distance] = (
+                self.missing_distance[j] * (1 - ta) + self.missing_distance[j + 1] * ta
+            )[only_distance]
+            predictions[only_angle] = (
+                self.missing_angle[i] * (1 - td) + self.missing_angle[i + 1] * td
+            )[only_angle]
+            predictions[missing_distance & missing_angle] = self.missing_both
+
+        return predictions
+
+    def save(self, path):
+        np.savez(
+            path,
+            distance_axis=self.distance_axis,
+            angle_axis=self.angle_axis,
+            values=self.values,
+            missing_distance=self.missing_distance,
+            missing_angle=self.missing_angle,
+            missing_both=np.array(self.missing_both),
+            error_bound_names=np.array(list(self.error_bounds)),
+            error_bound_values=np.array(list(self.error_bounds.values()), dtype=float),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            arrays = dict(npz)
+        error_bounds = dict(
+            zip(
+                [str(name) for name in arrays.pop('error_bound_names')],
+                arrays.pop('error_bound_values').tolist(),
+            )
+        )
+        return cls(
+            arrays.pop('distance_axis'),
+            arrays.pop('angle_axis'),
+            arrays,
+            error_bounds=error_bounds,
+        )
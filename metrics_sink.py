@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger()
+
+DEFAULT_DSN = "host=db port=5432 dbname=test user=postgres password=example"
+DEFAULT_SPOOL_PATH = '/tmp/opt_metrics_spool.jsonl'
+
+METRIC_FIELDS = (
+    'prediction_drift',
+    'num_drifted_columns',
+    'share_missing_values',
+    'distance_to_goal_quantile',
+)
+
+create_table_statement = """
+CREATE TABLE IF NOT EXISTS opt_metrics(
+    timestamp TIMESTAMP,
+    prediction_drift FLOAT,
+    num_drifted_columns INTEGER,
+    share_missing_values FLOAT,
+    distance_to_goal_quantile float
+)
+"""
+
+insert_statement = """
+INSERT INTO opt_metrics (
+    timestamp,
+    prediction_drift,
+    num_drifted_columns,
+    share_missing_values,
+    distance_to_goal_quantile
+)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+def get_metrics_dsn():
+    return os.getenv('METRICS_DB_DSN', DEFAULT_DSN)
+
+
+def psycopg2_connect(dsn):
+    import psycopg2  # pylint: disable=import-outside-toplevel
+
+    return psycopg2.connect(dsn, connect_timeout=3)
+
+
+def prep_db(dsn=None, connect=psycopg2_connect):
+    logger.debug('Preparing the database...')
+    # pylint: disable=import-outside-toplevel
+    from psycopg2.extensions import make_dsn, parse_dsn
+
+    dsn = dsn or get_metrics_dsn()
+    database = parse_dsn(dsn).get('dbname', 'test')
+
+    # Connect to the default 'postgres' database to check if the target exists
+    with connect(make_dsn(dsn, dbname='postgres')) as conn:
+        conn.autocommit = (
+            True  # Enable autocommit mode to execute the CREATE DATABASE command
+        )
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname=%s", (database,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{database}";')
+
+    # Now, connect to the target database and create the table
+    with connect(dsn) as conn:
+        with conn.cursor() as cur:
+            cur.execute(create_table_statement)
+
+
+class MetricsSink:  # pylint: disable=too-many-instance-attributes
+    """
+    Write-behind sink for ``opt_metrics`` rows over one reused connection.
+
+    Rows are buffered and inserted with a single ``executemany`` once
+    ``batch_size`` rows are pending or ``flush_interval`` seconds have passed;
+    the interval is enforced by a timer, so a partial batch is written even if
+    no further row arrives. The default batch size of 1 writes every row as
+    soon as it is produced.
+    A failed flush drops the connection (the next flush reconnects) and spools
+    the rows to a local JSON-lines file, which is replayed first on the next
+    successful flush, so callers never wait on an unreachable database.
+    With ``prepare_db`` set, the database and table are created by the first
+    flush instead of at startup.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        dsn=None,
+        connect=psycopg2_connect,
+        batch_size=1,
+        flush_interval=60.0,
+        spool_path=DEFAULT_SPOOL_PATH,
+        *,
+        prepare_db=False,
+    ):
+        self.dsn = dsn or get_metrics_dsn()
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.prepare_db = prepare_db
+        self.conn = None
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.timer = None
+        self.lock = threading.RLock()
+        self.written_rows = 0
+        self.spooled_rows = 0
+        self.corrupt_rows = 0
+        self.failed_flushes = 0
+        self.connections = 0
+
+    def write(self, metrics):
+        row = (datetime.datetime.utcnow(),) + tuple(
+            metrics[field] for field in METRIC_FIELDS
+        )
+        with self.lock:
+            self.buffer.append(row)
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+            if len(self.buffer) >= self.batch_size or due:
+                self.flush()
+            else:
+                self.schedule_flush()
+
+    def schedule_flush(self):
+        """Arm a timer that flushes the pending rows when the interval ends."""
+        if self.timer is not None and self.timer.is_alive():
+            return
+        delay = self.flush_interval - (time.monotonic() - self.last_flush)
+        self.timer = threading.Timer(max(delay, 0), self.flush_if_due)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush_if_due(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+        if self.buffer:
+            self.schedule_flush()
+
+    def connection(self):
+        if self.prepare_db:
+            prep_db(self.dsn, connect=self.connect)
+            self.prepare_db = False
+        if self.conn is None or self.conn.closed:
+            self.conn = self.connect(self.dsn)
+            self.connections += 1
+        return self.conn
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.close()
+                except Exception as e:
+                    logger.debug("Error closing metrics connection: %s", e)
+                self.conn = None
+
+    def flush(self):
+        """Insert spooled and buffered rows; returns False if they were spooled."""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            try:
+                spooled = self.read_spool()
+            except OSError as e:
+                # The spool stays in place and is retried on the next flush
+                logger.warning("Could not read metrics spool: %s", e)
+                spooled = []
+            rows = spooled + self.buffer
+            if not rows:
+                return True
+            try:
+                conn = self.connection()
+                with conn.cursor() as cur:
+                    cur.executemany(insert_statement, rows)
+                conn.commit()
+            except Exception as e:
+                logger.warning("Could not write %s metric rows: %s", len(rows), e)
+                self.failed_flushes += 1
+                self.close()
+                self.append_spool(self.buffer)
+                self.buffer = []
+                return False
+
+            if spooled:
+                os.remove(self.spool_path)
+            elif self.spool_path and os.path.exists(self.spool_path):
+                # Only unreadable lines were left, and they are quarantined
+                if not os.path.getsize(self.spool_path):
+                    os.remove(self.spool_path)
+            self.written_rows += len(rows)
+            self.buffer = []
+            logger.info("Saved %s drift metric rows to database", len(rows))
+            return True
+
+    def read_spool(self):
+        """
+        Rows of the spool file.
+
+        Lines that cannot be parsed, e.g. one truncated by a crash mid-write,
+        are moved to ``<spool_path>.corrupt`` so they cannot block later
+        flushes.
+        """
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        rows, valid_lines, corrupt_lines = [], [], []
+        with open(self.spool_path, 'rt', encoding='utf-8', errors='replace') as f_in:
+            for line in f_in:
+                try:
+                    row = json.loads(line)
+                    rows.append(
+                        (datetime.datetime.fromisoformat(row[0]),) + tuple(row[1:])
+                    )
+                except (ValueError, TypeError, IndexError, KeyError):
+                    corrupt_lines.append(line.rstrip('\n') + '\n')
+                    continue
+                valid_lines.append(line)
+        if corrupt_lines:
+            logger.warning(
+                "Moving %s unreadable metric rows to %s.corrupt",
+                len(corrupt_lines),
+                self.spool_path,
+            )
+            with open(self.spool_path + '.corrupt', 'at', encoding='utf-8') as f_out:
+                f_out.writelines(corrupt_lines)
+            with open(self.spool_path, 'wt', encoding='utf-8') as f_out:
+                f_out.writelines(valid_lines)
+            self.corrupt_rows += len(corrupt_lines)
+        return rows
+
+    def append_spool(self, rows):
+        if not self.spool_path or not rows:
+            return
+        with open(self.spool_path, 'at', encoding='utf-8') as f_out:
+            for row in rows:
+                f_out.write(json.dumps([row[0].isoformat(), *row[1:]]) + '\n')
+        self.spooled_rows += len(rows)
+
+    def stats(self):
+        return {
+            'pending_rows': len(self.buffer),
+            'written_rows': self.written_rows,
+            'spooled_rows': self.spooled_rows,
+            'corrupt_rows': self.corrupt_rows,
+            'failed_flushes': self.failed_flushes,
+            'connections': self.connections,
+        }
@@ -1,76 +1,84 @@
 import os
 import json
+import time
+import atexit
 import base64
 import logging
-import datetime
+import functools
+import threading
+import contextlib
 
 import boto3
-import mlflow
-import pandas as pd
-import psycopg2
-from evidently import ColumnMapping
-from mlflow.tracking import MlflowClient
-from evidently.report import Report
-from evidently.metrics import (
-    ColumnDriftMetric,
-    DatasetDriftMetric,
-    ColumnQuantileMetric,
-    DatasetMissingValuesMetric,
-)
+import numpy as np
+
+from drift import DRIFT_COLUMNS, DriftEngine
+from lookup_grid import GRID_ARTIFACT_NAME, LookupGridModel
+from ring_buffer import RingBuffer
+from tree_engine import ARTIFACT_NAME, TreeEnsembleModel
+from drift_worker import DriftWorker
+from metrics_sink import DEFAULT_SPOOL_PATH, MetricsSink, prep_db
+from shot_geometry import FEATURE_NAMES, shot_features
+from artifact_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ArtifactCache
+from model_reloader import ModelReloader
+from record_decoder import decode_records
+from instrumentation import NULL_RECORD, NULL_INSTRUMENTATION, create_instrumentation
+from sink_dispatcher import SinkDispatcher
+from prediction_cache import PredictionCache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 BUFFER_THRESHOLD = 10  # Adjust based on your preference
-
-create_table_statement = """
-CREATE TABLE IF NOT EXISTS opt_metrics(
-    timestamp TIMESTAMP,
-    prediction_drift FLOAT,
-    num_drifted_columns INTEGER,
-    share_missing_values FLOAT,
-    distance_to_goal_quantile float
+FEATURE_COLUMNS = list(FEATURE_NAMES)
+REFERENCE_PROFILE_NAME = 'reference_profile.json'
+REFERENCE_DATA_NAME = 'reference_data.parquet'
+# Artifacts next to the MLflow model that only some configurations read
+OPTIONAL_ARTIFACTS = frozenset(
+    (ARTIFACT_NAME, GRID_ARTIFACT_NAME, REFERENCE_PROFILE_NAME, REFERENCE_DATA_NAME)
 )
-"""
 
 
-column_mapping = ColumnMapping(
-    prediction='prediction',
-    numerical_features=['distance_to_goal', 'angle_to_goal'],
-    categorical_features=[],
-    target=None,
-)
-report = Report(
-    metrics=[
-        ColumnDriftMetric(column_name='prediction'),
-        DatasetDriftMetric(),
-        DatasetMissingValuesMetric(),
-        ColumnQuantileMetric(column_name='distance_to_goal', quantile=0.5),
-    ]
-)
+def partition_keys(prediction_events):
+    """Partition keys of the events, as the Kinesis sinks set them."""
+    return [str(event['prediction']['shot_id']) for event in prediction_events]
 
 
-def prep_db():
-    logger.debug('Preparing the database...')
+def slice_columns(columns, start, stop):
+    return {column: values[start:stop] for column, values in columns.items()}
 
-    # Connect to the default 'postgres' database to check if 'test' exists
-    with psycopg2.connect(
-        "host=db port=5432 dbname=postgres user=postgres password=example"
-    ) as conn:
-        conn.autocommit = (
-            True  # Enable autocommit mode to execute the CREATE DATABASE command
-        )
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1 FROM pg_database WHERE datname='test'")
-            if cur.fetchone() is None:
-                cur.execute("CREATE DATABASE test;")
 
-    # Now, connect to the 'test' database and create the table
-    with psycopg2.connect(
-        "host=db port=5432 dbname=test user=postgres password=example"
-    ) as conn:
-        with conn.cursor() as cur:
-            cur.execute(create_table_statement)
+# mlflow, pandas, Evidently and psycopg2 are imported on first use: the hot
+# path of the numpy and grid engines needs none of them, and importing them
+# dominates cold starts
+# pylint: disable=import-outside-toplevel
+
+
+@functools.lru_cache(maxsize=None)
+def get_drift_report():
+    from evidently import ColumnMapping
+    from evidently.report import Report
+    from evidently.metrics import (
+        ColumnDriftMetric,
+        DatasetDriftMetric,
+        ColumnQuantileMetric,
+        DatasetMissingValuesMetric,
+    )
+
+    column_mapping = ColumnMapping(
+        prediction='prediction',
+        numerical_features=['distance_to_goal', 'angle_to_goal'],
+        categorical_features=[],
+        target=None,
+    )
+    report = Report(
+        metrics=[
+            ColumnDriftMetric(column_name='prediction'),
+            DatasetDriftMetric(),
+            DatasetMissingValuesMetric(),
+            ColumnQuantileMetric(column_name='distance_to_goal', quantile=0.5),
+        ]
+    )
+    return report, column_mapping
 
 
 def get_production_run_id(model_name="xgboost"):
@@ -79,6 +87,9 @@ def get_production_run_id(model_name="xgboost"):
     if not TRACKING_SERVER_HOST:
         raise ValueError("MLFLOW_TRACKING_SERVER_HOST environment variable is not set!")
 
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
     mlflow.set_tracking_uri(f"http://{TRACKING_SERVER_HOST}:5000")
 
     client = MlflowClient()
@@ -98,14 +109,147 @@ def get_model_location(run_id):
     return model_location
 
 
+def download_artifact(artifact_path, local_dir='/tmp/artifacts'):
+    if not artifact_path.startswith('s3://'):
+        return artifact_path
+    bucket, key = artifact_path[len('s3://') :].split('/', 1)
+    local_path = os.path.join(local_dir, key)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    boto3.client('s3').download_file(bucket, key, local_path)
+    return local_path
+
+
+def load_lookup_grid(model_path):
+    try:
+        grid_path = download_artifact(os.path.join(model_path, GRID_ARTIFACT_NAME))
+        grid = LookupGridModel.load(grid_path)
+        logger.info("Loaded lookup grid from: %s", grid_path)
+    except Exception as e:
+        logger.warning("No exported lookup grid (%s), building it at init", e)
+        source_model = load_model(model_path, os.getenv('GRID_SOURCE_ENGINE', 'pyfunc'))
+        grid = LookupGridModel.build(source_model)
+
+    logger.info(
+        "Lookup grid resolution %sx%s, error bounds: %s",
+        len(grid.distance_axis),
+        len(grid.angle_axis),
+        grid.error_bounds,
+    )
+    return grid
+
+
+def load_model(model_path, model_engine=None):
+    model_engine = model_engine or os.getenv('MODEL_ENGINE', 'pyfunc')
+    if model_engine == 'numpy':
+        # Flat tree arrays exported at training time, scored without xgboost
+        tree_path = download_artifact(os.path.join(model_path, ARTIFACT_NAME))
+        logger.info("Loading NumPy tree engine from: %s", tree_path)
+        return TreeEnsembleModel.load(tree_path)
+    if model_engine == 'grid':
+        # Bilinear interpolation over the precomputed response surface
+        return load_lookup_grid(model_path)
+    if model_engine != 'pyfunc':
+        raise ValueError(f"Unknown MODEL_ENGINE: {model_engine}")
+    import mlflow.pyfunc
+
+    return mlflow.pyfunc.load_model(model_path)
+
+
+def load_reference_profile(model_path):
+    profile_path = download_artifact(os.path.join(model_path, REFERENCE_PROFILE_NAME))
+    logger.info("Loading reference profile from: %s", profile_path)
+    with open(profile_path, 'rt', encoding='utf-8') as f_in:
+        return json.load(f_in)
+
+
+def create_artifact_cache():
+    if os.getenv('ARTIFACT_CACHE', 'True') != 'True':
+        return None
+    return ArtifactCache(
+        root=os.getenv('ARTIFACT_CACHE_DIR', DEFAULT_CACHE_DIR),
+        max_bytes=int(os.getenv('ARTIFACT_CACHE_MAX_BYTES', str(DEFAULT_MAX_BYTES))),
+    )
+
+
+def required_artifacts(model_engine, drift_engine, available=None):
+    """
+    Optional artifacts the serving configuration reads.
+
+    The sketch drift engine reads the reference profile. Runs trained before
+    the profile existed only have the reference data, so when ``available``,
+    the run's artifact names, lacks the profile, the reference data is read
+    instead, as ``load_model_and_reference_data`` does.
+    """
+    if model_engine == 'numpy':
+        names = [ARTIFACT_NAME]
+    elif model_engine == 'grid':
+        names = [GRID_ARTIFACT_NAME]
+    else:
+        names = []
+    if drift_engine == 'sketch' and (
+        available is None or REFERENCE_PROFILE_NAME in available
+    ):
+        names.append(REFERENCE_PROFILE_NAME)
+    else:
+        names.append(REFERENCE_DATA_NAME)
+    return names
+
+
+def fetch_model_artifacts(
+    artifact_cache, model_path, run_id, model_engine, drift_engine
+):
+    """Cache the artifacts the configuration needs; returns the local model dir."""
+    if model_engine not in ('numpy', 'grid'):
+        # The pyfunc flavour reads the MLflow model directory, so it gets
+        # every artifact except the optional ones it does not use
+        def skipped(available):
+            names = required_artifacts(model_engine, drift_engine, available)
+            return OPTIONAL_ARTIFACTS.difference(names)
+
+        return artifact_cache.fetch_directory(model_path, run_id, exclude=skipped)
+    if not model_path.startswith('s3://'):
+        return model_path
+    for name in required_artifacts(model_engine, drift_engine):
+        try:
+            local_path = artifact_cache.fetch(os.path.join(model_path, name), run_id)
+        except Exception as e:
+            if name != REFERENCE_PROFILE_NAME:
+                raise
+            logger.warning("No reference profile (%s), caching reference data", e)
+            local_path = artifact_cache.fetch(
+                os.path.join(model_path, REFERENCE_DATA_NAME), run_id
+            )
+    return os.path.dirname(local_path)
+
+
 def load_model_and_reference_data(run_id):
     logger.debug('Loading model and reference data for run ID: %s', run_id)
     model_path = get_model_location(run_id)
+    model_engine = os.getenv('MODEL_ENGINE', 'pyfunc')
+    drift_engine = os.getenv('DRIFT_ENGINE', 'sketch')
+    artifact_cache = create_artifact_cache()
+    if artifact_cache is not None:
+        try:
+            model_path = fetch_model_artifacts(
+                artifact_cache, model_path, run_id, model_engine, drift_engine
+            )
+            logger.info("Artifact cache stats: %s", artifact_cache.stats())
+        except Exception as e:
+            logger.warning("Artifact cache unavailable (%s), reading from S3", e)
     logger.info("Loading model from: %s", model_path)
-    model = mlflow.pyfunc.load_model(model_path)
+    model = load_model(model_path, model_engine)
 
-    reference_data_path = os.path.join(model_path, 'reference_data.parquet')
+    if drift_engine == 'sketch':
+        # The streaming drift engine only needs the small training profile
+        try:
+            return model, load_reference_profile(model_path)
+        except Exception as e:
+            logger.warning("No reference profile (%s), using reference data", e)
+
+    reference_data_path = os.path.join(model_path, REFERENCE_DATA_NAME)
     logger.info("Loading reference data from: %s", reference_data_path)
+    import pandas as pd
+
     reference_data = pd.read_parquet(reference_data_path)
 
     return model, reference_data
@@ -117,33 +261,159 @@ def base64_decode(encoded_data):
     return shot_event
 
 
-class ModelService:
-    def __init__(self, model, reference_data, model_version=None, callbacks=None):
+class ModelService:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        model,
+        reference_data,
+        model_version=None,
+        callbacks=None,
+        *,
+        cache=None,
+        drift_engine=None,
+        drift_worker=None,
+        metrics_sink=None,
+        dispatcher=None,
+        score_chunk_size=None,
+        data_buffer=None,
+        instrumentation=None,
+        drift_threshold=BUFFER_THRESHOLD,
+    ):
         self.model = model
         self.reference_data = reference_data
         self.model_version = model_version
         self.callbacks = callbacks or []
-        self.data_buffer = []
+        self.cache = cache
+        self.drift_engine = drift_engine
+        self.drift_worker = drift_worker
+        self.metrics_sink = metrics_sink
+        self.dispatcher = dispatcher
+        self.score_chunk_size = score_chunk_size
+        self.data_buffer = data_buffer if data_buffer is not None else RingBuffer()
+        self.init_timings = {}
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        # Rows that trigger a drift evaluation; None turns monitoring off
+        self.drift_threshold = drift_threshold
+        self.metrics_record = NULL_RECORD
+        self.reloader = None
+        self.staged_model = None
+        self.swap_lock = threading.Lock()
 
     def prepare_features(self, shot):
         logger.info("Preparing features for shot")
         features = {}
+        if 'distance_to_goal' not in shot and 'positions' in shot:
+            origin = shot['positions'][0]
+            distance, angle = shot_features(origin['x'], origin['y'])
+            features['distance_to_goal'] = float(distance)
+            features['angle_to_goal'] = float(angle)
+            return features
         features['distance_to_goal'] = shot['distance_to_goal']
         features['angle_to_goal'] = shot['angle_to_goal']
         return features
 
     def predict(self, features):
+        if self.cache is not None:
+            return self.predict_batch([features])[0]
+        import pandas as pd
+
         df = pd.DataFrame([features])
         pred = self.model.predict(df)
         logger.info("Prediction: %s", pred[0])
         return float(pred[0])
 
-    def monitor_drift(self):
-        logger.debug('Buffer threshold reached. Starting drift monitoring...')
-        logger.info("Monitoring drift")
-        current_data = pd.DataFrame(self.data_buffer)
+    def predict_batch(self, features_batch):
+        """Predictions for a list of feature dicts."""
+        columns = {
+            column: np.array(
+                [features[column] for features in features_batch], dtype=np.float64
+            )
+            for column in FEATURE_COLUMNS
+        }
+        return self.predict_columns(columns).tolist()
+
+    def predict_columns(self, columns):
+        """Predictions, as a float64 array, for a dict of feature arrays."""
+        if len(columns[FEATURE_COLUMNS[0]]) == 0:
+            return np.empty(0)
+        if self.cache is not None:
+            predictions = self.cache.get_or_predict_columns(
+                self.model_version, columns, self.score_batch
+            )
+            logger.debug("Prediction cache stats: %s", self.cache.stats())
+            return np.asarray(predictions, dtype=np.float64)
+        return self.score_batch(columns)
+
+    def score_batch(self, columns):
+        with self.metrics_record.stage('predict'):
+            return self.call_model(columns, self.model)
+
+    def call_model(self, columns, model):
+        # One columnar feature matrix and a single model call for the whole batch
+        if getattr(model, 'accepts_columns', False):
+            preds = model.predict(columns)
+        else:
+            import pandas as pd
+
+            preds = model.predict(
+                pd.DataFrame({column: columns[column] for column in FEATURE_COLUMNS})
+            )
+        logger.info("Predicted %s shots in one batch", len(columns[FEATURE_COLUMNS[0]]))
+        return np.asarray(preds, dtype=np.float64)
+
+    def prewarm(self, batch_size=2, model=None):
+        """
+        Score a dummy batch so the model's lazy setup runs before real traffic.
+
+        The batch bypasses the prediction cache, drift monitoring and sinks.
+        """
+        columns = {
+            'distance_to_goal': np.full(batch_size, 10.0),
+            'angle_to_goal': np.full(batch_size, 0.5),
+        }
+        self.call_model(columns, model or self.model)
+
+    def stage_model(self, model, reference_data, model_version, drift_engine=None):
+        """
+        Hand over a fully loaded model; the next invocation swaps it in.
+
+        Called from the reloader thread. The swap itself happens on the request
+        path, before any record is scored, so a batch never mixes versions.
+        """
+        self.prewarm(model=model)
+        with self.swap_lock:
+            self.staged_model = {
+                'model': model,
+                'reference_data': reference_data,
+                'model_version': model_version,
+                'drift_engine': drift_engine,
+            }
+
+    def swap_staged_model(self):
+        with self.swap_lock:
+            staged, self.staged_model = self.staged_model, None
+        if staged is None:
+            return False
+
+        previous_version = self.model_version
+        self.model = staged['model']
+        self.reference_data = staged['reference_data']
+        self.model_version = staged['model_version']
+        # Drift windows are only comparable with the reference they were built on
+        self.drift_engine = staged['drift_engine']
+        self.data_buffer.clear()
+        logger.info(
+            "Swapped model version %s for %s", previous_version, self.model_version
+        )
+        return True
+
+    def run_drift_report(self, current_rows):
+        import pandas as pd
+
+        current_data = pd.DataFrame(current_rows)
 
         logger.info("Running report for drift check")
+        report, column_mapping = get_drift_report()
 
         report.run(
             reference_data=self.reference_data,
@@ -152,103 +422,268 @@ class ModelService:
         )
 
         result = report.as_dict()
+        logger.debug("Drift report: %s", result)
+
+        return {
+            'prediction_drift': result['metrics'][0]['result']['drift_share'],
+            'num_drifted_columns': result['metrics'][1]['result'][
+                'number_of_drifted_columns'
+            ],
+            'share_missing_values': result['metrics'][2]['result']['current'][
+                'share_of_missing_values'
+            ],
+            'distance_to_goal_quantile': result['metrics'][3]['result']['current'][
+                'value'
+            ],
+        }
+
+    def drift_window_size(self):
+        if self.drift_engine is not None:
+            return self.drift_engine.window.rows
+        return self.data_buffer.pending
+
+    def take_drift_window(self):
+        """Detach the current drift window; cheap enough for the request path."""
+        if self.drift_engine is not None:
+            return self.drift_engine.take_window()
+        # Views are only safe while nothing is appended, i.e. when run inline
+        return self.data_buffer.take_window(copy=self.drift_worker is not None)
+
+    def process_drift_window(self, window, drift_engine=None):
+        # Usually runs on the drift worker, so it is reported on its own
+        with self.instrumentation.record('drift_window') as record:
+            self.evaluate_drift_window(window, drift_engine, record)
+
+    def evaluate_drift_window(self, window, drift_engine, record):
+        drift_engine = drift_engine or self.drift_engine
+        with record.stage('evaluate'):
+            if drift_engine is not None:
+                logger.info("Evaluating streaming drift sketches")
+                metrics = drift_engine.evaluate(window)
+            else:
+                metrics = self.run_drift_report(window)
+
+        logger.info("Prediction drift: %s", metrics['prediction_drift'])
+        logger.info("Number of drifted columns: %s", metrics['num_drifted_columns'])
+        logger.info("Share of missing values: %s", metrics['share_missing_values'])
+        logger.info(
+            "Distance to goal 50th percentile: %s",
+            metrics['distance_to_goal_quantile'],
+        )
 
-        prediction_drift = result['metrics'][0]['result']['drift_share']
-        num_drifted_columns = result['metrics'][1]['result'][
-            'number_of_drifted_columns'
-        ]
-        share_missing_values = result['metrics'][2]['result']['current'][
-            'share_of_missing_values'
-        ]
-        distance_to_goal_quantile = result['metrics'][3]['result']['current']['value']
-        print(result)
-        print(
-            "Quantile value for distance_to_goal column (quantile=0.5):",
-            distance_to_goal_quantile,
+        if self.metrics_sink is not None:
+            with record.stage('db_insert'):
+                self.metrics_sink.write(metrics)
+
+    def monitor_drift(self):
+        logger.debug('Buffer threshold reached. Starting drift monitoring...')
+        logger.info("Monitoring drift")
+        window = self.take_drift_window()
+
+        if self.drift_worker is None:
+            self.process_drift_window(window)
+            return
+
+        # Evaluation and the database write run on the background worker
+        # Bound to the current engine in case the model is swapped meanwhile
+        self.drift_worker.submit(
+            functools.partial(self.process_drift_window, window, self.drift_engine)
         )
-        logger.info("Prediction drift: %s", prediction_drift)
-        logger.info("Number of drifted columns: %s", num_drifted_columns)
-        logger.info("Share of missing values: %s", share_missing_values)
-        logger.info("Distance to goal 50th percentile: %s", distance_to_goal_quantile)
-
-        # insert_query = (
-        #     "INSERT INTO opt_metrics ("
-        #     "    timestamp, prediction_drift, num_drifted_columns, "
-        #     "    share_missing_values, distance_to_goal_quantile"
-        #     ") VALUES (%s, %s, %s, %s, %s)"
-        # )
-
-        logger.debug('Inserting drift metrics into database...')
-        with psycopg2.connect(
-            "host=db port=5432 dbname=test user=postgres password=example",  # autocommit=True
-        ) as conn:
-            with conn.cursor() as cur:
-                insert_statement = """
-                INSERT INTO opt_metrics (
-                    timestamp, 
-                    prediction_drift, 
-                    num_drifted_columns, 
-                    share_missing_values, 
-                    distance_to_goal_quantile
-                )
-                VALUES (%s, %s, %s, %s, %s)
-                """
-                cur.execute(
-                    insert_statement,
-                    (
-                        datetime.datetime.utcnow(),
-                        prediction_drift,
-                        num_drifted_columns,
-                        share_missing_values,
-                        distance_to_goal_quantile,
-                    ),
+        logger.debug("Drift worker stats: %s", self.drift_worker.stats())
+
+    def score_events(self, shot_ids, columns):
+        predictions = self.predict_columns(columns)
+        prediction_events = []
+
+        drift_columns = {
+            'distance_to_goal': columns['distance_to_goal'],
+            'angle_to_goal': columns['angle_to_goal'],
+            'prediction': predictions,
+        }
+        if self.drift_engine is not None:
+            # Folded into the streaming sketches in O(batch)
+            self.drift_engine.update(drift_columns)
+        else:
+            # Copied into the preallocated ring buffer columns
+            self.data_buffer.extend(drift_columns)
+            logger.debug(
+                'Adding predictions to data buffer. Buffer size: %s',
+                len(self.data_buffer),
+            )
+
+        for shot_id, prediction in zip(shot_ids, predictions.tolist()):
+            prediction_event = {
+                'model': 'xgoals_prediction_model',
+                'version': self.model_version,
+                'prediction': {'shot_xgoals': prediction, 'shot_id': shot_id},
+            }
+
+            prediction_events.append(prediction_event)
+
+        return prediction_events
+
+    def score_isolated(self, shot_ids, columns, sequence_numbers, failed):
+        """
+        Score a chunk; if that fails, score its records one by one.
+
+        Sequence numbers of the records that cannot be scored go to ``failed``.
+        """
+        try:
+            return self.score_events(shot_ids, columns)
+        except Exception as e:
+            logger.warning("Scoring a chunk failed (%s), isolating records", e)
+
+        prediction_events = []
+        for index, (shot_id, sequence_number) in enumerate(
+            zip(shot_ids, sequence_numbers)
+        ):
+            try:
+                prediction_events.extend(
+                    self.score_events(
+                        [shot_id], slice_columns(columns, index, index + 1)
+                    )
                 )
-        logger.info("Saved drift metrics to database")
+            except Exception as e:
+                logger.warning("Failed to score record %s: %s", sequence_number, e)
+                failed.append(sequence_number)
+        return prediction_events
+
+    def publish(self, prediction_events):
+        """
+        Hand a chunk of prediction events to the sinks.
+
+        With a dispatcher this returns at once with one future per sink,
+        which ``finish_publishing`` checks. Inline sinks run here and any
+        exception propagates.
+        """
+        if self.dispatcher is not None:
+            return self.dispatcher.publish(self.callbacks, prediction_events)
+        for prediction_event in prediction_events:
+            for callback in self.callbacks:
+                callback(prediction_event)
+        return []
+
+    def finish_publishing(self, deliveries):
+        """
+        Wait for the sinks; returns the partition keys that were not published.
+
+        ``deliveries`` pairs the futures ``publish`` returned with their chunk.
+        A chunk whose sink failed or timed out counts as unpublished as a
+        whole; batching sinks report the entries they could not send.
+        """
+        failed_keys = set()
+        if self.dispatcher is not None:
+            self.dispatcher.join(self.callbacks)
+            for chunk_futures, chunk_events in deliveries:
+                for future in chunk_futures:
+                    if not future.done() or future.exception() is not None:
+                        failed_keys.update(partition_keys(chunk_events))
+                    else:
+                        failed_keys.update(
+                            entry['PartitionKey'] for entry in future.result() or []
+                        )
+            return failed_keys
+        # Batching callbacks publish everything collected for this invocation
+        for callback in self.callbacks:
+            flush = getattr(callback, 'flush', None)
+            if flush is not None:
+                failed_keys.update(entry['PartitionKey'] for entry in flush() or [])
+        return failed_keys
 
     def lambda_handler(self, event):
+        with self.instrumentation.record() as metrics:
+            self.metrics_record = metrics
+            try:
+                return self.handle_event(event, metrics)
+            finally:
+                self.metrics_record = NULL_RECORD
+
+    def handle_event(self, event, metrics):
         try:
+            self.swap_staged_model()
             predictions_events = []
-
-            for record in event['Records']:
-                encoded_data = record['kinesis']['data']
-                shot_event = base64_decode(encoded_data)
-                shot = shot_event['shot']
-                shot_id = shot_event['shot_id']
-
-                features = self.prepare_features(shot)
-                prediction = self.predict(features)
-
-                self.data_buffer.append(
-                    {
-                        'distance_to_goal': shot['distance_to_goal'],
-                        'angle_to_goal': shot['angle_to_goal'],
-                        'prediction': prediction,
-                    }
-                )
-                logger.debug(
-                    'Adding prediction to data buffer. Buffer size: %s',
-                    len(self.data_buffer) + 1,
+            cache_hits = self.cache.hits if self.cache is not None else 0
+
+            # Only records that failed to score or publish are reported back
+            # to Kinesis for a retry. A malformed record would fail again on
+            # every retry and block its shard, so it is logged and skipped.
+            failed_records = []
+            deliveries = []
+            failed_keys = set()
+
+            with metrics.stage('decode'):
+                batch = decode_records(event['Records'])
+                valid_indexes = batch.valid_indexes().tolist()
+                shot_ids = [batch.shot_ids[index] for index in valid_indexes]
+                sequence_numbers = [
+                    batch.sequence_numbers[index] for index in valid_indexes
+                ]
+                columns = batch.feature_columns()
+            for index, reason in batch.errors.items():
+                logger.warning(
+                    "Skipping invalid record %s: %s",
+                    batch.sequence_numbers[index],
+                    reason,
                 )
 
-                prediction_event = {
-                    'model': 'xgoals_prediction_model',
-                    'version': self.model_version,
-                    'prediction': {'shot_xgoals': prediction, 'shot_id': shot_id},
-                }
-
-                for callback in self.callbacks:
-                    callback(prediction_event)
-
-                predictions_events.append(prediction_event)
-
-            if len(self.data_buffer) >= BUFFER_THRESHOLD:
-                self.monitor_drift()
-                self.data_buffer = []  # Clear the buffer
-
-            return {'predictions': predictions_events}
+            chunk_size = self.score_chunk_size or len(shot_ids) or 1
+            for start in range(0, len(shot_ids), chunk_size):
+                stop = start + chunk_size
+                with metrics.stage('score'):
+                    chunk_events = self.score_isolated(
+                        shot_ids[start:stop],
+                        slice_columns(columns, start, stop),
+                        sequence_numbers[start:stop],
+                        failed_records,
+                    )
+                # With a dispatcher this returns at once, so the next chunk is
+                # scored while this one is being published
+                with metrics.stage('publish'):
+                    try:
+                        deliveries.append((self.publish(chunk_events), chunk_events))
+                    except Exception as e:
+                        logger.error("Failed to publish a chunk: %s", e)
+                        failed_keys.update(partition_keys(chunk_events))
+                predictions_events.extend(chunk_events)
+
+            with metrics.stage('publish'):
+                failed_keys.update(self.finish_publishing(deliveries))
+            unpublished = [
+                sequence_number
+                for shot_id, sequence_number in zip(shot_ids, sequence_numbers)
+                if str(shot_id) in failed_keys and sequence_number not in failed_records
+            ]
+            failed_records.extend(unpublished)
+
+            metrics.set('records', len(batch))
+            metrics.set('rejected_records', len(batch.errors))
+            metrics.set('failed_records', len(failed_records))
+            metrics.set('unpublished_records', len(unpublished))
+            metrics.set('buffer_size', self.drift_window_size())
+            if self.cache is not None:
+                metrics.set('cache_hits', self.cache.hits - cache_hits)
+
+            if (
+                self.drift_threshold is not None
+                and self.drift_window_size() >= self.drift_threshold
+            ):
+                with metrics.stage('drift'):
+                    self.monitor_drift()  # Also clears the buffer
+
+            return {
+                'predictions': predictions_events,
+                'batchItemFailures': [
+                    {'itemIdentifier': sequence_number}
+                    for sequence_number in failed_records
+                ],
+            }
         except Exception as e:
+            # Raising fails the whole batch, so Kinesis retries it (bisecting
+            # it and finally sending it to the failure queue). A response
+            # without batchItemFailures would acknowledge every record.
             logger.error("Error processing event: %s", e)
-            return {"error": f"Failed to process event. Error: {e}"}
+            metrics.set('errors', 1)
+            raise
 
 
 class KinesisCallback:
@@ -266,6 +701,108 @@ class KinesisCallback:
         )
 
 
+class KinesisBatchPublisher:
+    """
+    Collects an invocation's prediction events and sends them with PutRecords.
+
+    Events are buffered by ``__call__`` (so the publisher is used as a
+    callback) and sent by ``flush`` in chunks within the PutRecords limits.
+    Entries rejected by Kinesis are retried with exponential backoff; the
+    ones that still fail are logged, returned and counted in ``failed_count``.
+    """
+
+    max_records = 500
+    max_request_bytes = 5 * 1024 * 1024
+
+    def __init__(
+        self,
+        kinesis_client,
+        prediction_stream_name,
+        max_retries=3,
+        backoff_seconds=0.1,
+        sleep=time.sleep,
+    ):
+        self.kinesis_client = kinesis_client
+        self.prediction_stream_name = prediction_stream_name
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self.pending = []
+        self.failed_count = 0
+
+    def __call__(self, prediction_event):
+        shot_id = prediction_event['prediction']['shot_id']
+        self.pending.append(
+            {
+                'Data': json.dumps(prediction_event).encode('utf-8'),
+                'PartitionKey': str(shot_id),
+            }
+        )
+
+    def chunks(self, records):
+        chunk, chunk_bytes = [], 0
+        for record in records:
+            record_bytes = len(record['Data']) + len(record['PartitionKey'].encode())
+            if chunk and (
+                len(chunk) == self.max_records
+                or chunk_bytes + record_bytes > self.max_request_bytes
+            ):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(record)
+            chunk_bytes += record_bytes
+        if chunk:
+            yield chunk
+
+    def put_chunk(self, records):
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            try:
+                response = self.kinesis_client.put_records(
+                    StreamName=self.prediction_stream_name, Records=records
+                )
+            except Exception as e:
+                logger.warning("PutRecords call failed: %s", e)
+                errors = [{'ErrorCode': type(e).__name__, 'ErrorMessage': str(e)}]
+                errors *= len(records)
+                continue
+            if not response.get('FailedRecordCount'):
+                return []
+            # Only the rejected entries are sent again
+            rejected = [
+                (record, result)
+                for record, result in zip(records, response['Records'])
+                if 'ErrorCode' in result
+            ]
+            records = [record for record, _ in rejected]
+            errors = [result for _, result in rejected]
+
+        return [
+            {
+                'PartitionKey': record['PartitionKey'],
+                'ErrorCode': error.get('ErrorCode'),
+                'ErrorMessage': error.get('ErrorMessage'),
+            }
+            for record, error in zip(records, errors)
+        ]
+
+    def flush(self):
+        records, self.pending = self.pending, []
+        failed = []
+        for chunk in self.chunks(records):
+            failed.extend(self.put_chunk(chunk))
+        if failed:
+            logger.error(
+                "Failed to publish %s of %s prediction records: %s",
+                len(failed),
+                len(records),
+                failed,
+            )
+            self.failed_count += len(failed)
+        return failed
+
+
 def create_kinesis_client():
     endpoint_url = os.getenv('KINESIS_ENDPOINT_URL')
     if endpoint_url is None:
@@ -273,25 +810,163 @@ def create_kinesis_client():
     return boto3.client('kinesis', endpoint_url=endpoint_url)
 
 
+def create_prediction_cache():
+    cache_size = int(os.getenv('PREDICTION_CACHE_SIZE', '0'))
+    if cache_size <= 0:
+        return None
+    precision = int(os.getenv('PREDICTION_CACHE_PRECISION', '2'))
+    logger.info(
+        "Prediction cache enabled: %s entries, %s decimal places",
+        cache_size,
+        precision,
+    )
+    return PredictionCache(maxsize=cache_size, precision=precision)
+
+
+def create_drift_engine(reference_data):
+    if os.getenv('DRIFT_ENGINE', 'sketch') != 'sketch':
+        logger.info("Using the Evidently report for drift monitoring")
+        return None
+    if isinstance(reference_data, dict):
+        logger.info("Using streaming drift sketches with the reference profile")
+        return DriftEngine(reference_data)
+    reference_columns = {
+        column: reference_data[column].to_numpy()
+        for column in DRIFT_COLUMNS
+        if column in reference_data
+    }
+    logger.info(
+        "Using streaming drift sketches with reference columns: %s",
+        list(reference_columns),
+    )
+    return DriftEngine.from_columns(reference_columns)
+
+
+def create_metrics_sink(prepare_db=False):
+    return MetricsSink(
+        batch_size=int(os.getenv('METRICS_BATCH_SIZE', '1')),
+        flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '60')),
+        spool_path=os.getenv('METRICS_SPOOL_PATH', DEFAULT_SPOOL_PATH),
+        prepare_db=prepare_db,
+    )
+
+
+def create_drift_worker(metrics_sink):
+    if os.getenv('DRIFT_WORKER', 'True') != 'True':
+        atexit.register(metrics_sink.flush)
+        return None
+    drift_worker = DriftWorker(max_queue_size=int(os.getenv('DRIFT_QUEUE_SIZE', '4')))
+    drift_worker.install_shutdown_hooks(after_flush=metrics_sink.flush)
+    return drift_worker
+
+
+def create_data_buffer():
+    window_size = int(os.getenv('DRIFT_WINDOW_SIZE', '0'))
+    return RingBuffer(
+        capacity=max(int(os.getenv('DRIFT_BUFFER_CAPACITY', '1024')), window_size),
+        window_size=window_size or None,
+    )
+
+
+def create_sink_dispatcher():
+    if os.getenv('SINK_DISPATCHER', 'True') != 'True':
+        return None
+    return SinkDispatcher(
+        max_workers=int(os.getenv('SINK_WORKERS', '4')),
+        max_pending=int(os.getenv('SINK_MAX_PENDING', '16')),
+        timeout=float(os.getenv('SINK_TIMEOUT', '5')),
+    )
+
+
+def load_model_version(run_id):
+    model, reference_data = load_model_and_reference_data(run_id)
+    return {
+        'model': model,
+        'reference_data': reference_data,
+        'drift_engine': create_drift_engine(reference_data),
+    }
+
+
+def create_model_reloader(model_service):
+    if os.getenv('MODEL_RELOAD', 'True') != 'True':
+        return None
+    reloader = ModelReloader(
+        model_service,
+        lookup_version=get_production_run_id,
+        load_version=load_model_version,
+        poll_interval=float(os.getenv('MODEL_POLL_INTERVAL', '60')),
+    )
+    reloader.start()
+    return reloader
+
+
+class InitTimer:
+    """Wall-clock time of each named init phase, in milliseconds."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+
 def init(prediction_stream_name: str, test_run: bool):
     logger.debug('Model Service initialization started...')
+    timer = InitTimer()
+    # With LAZY_INIT the database is prepared by the first metrics flush
+    lazy_init = os.getenv('LAZY_INIT', 'True') == 'True'
     # setup_database()
-    prep_db()  # Initialize the database
-    run_id = get_production_run_id()
-    model, reference_data = load_model_and_reference_data(run_id)
+    metrics_sink = create_metrics_sink(prepare_db=lazy_init)
+    if not lazy_init:
+        with timer.phase('prep_db'):
+            prep_db(metrics_sink.dsn)  # Initialize the database
+    with timer.phase('registry'):
+        run_id = get_production_run_id()
+    with timer.phase('load_model'):
+        model, reference_data = load_model_and_reference_data(run_id)
 
     callbacks = []
     if not test_run:
         kinesis_client = create_kinesis_client()
-        kinesis_callback = KinesisCallback(kinesis_client, prediction_stream_name)
-        callbacks.append(kinesis_callback.put_record)
+        if os.getenv('KINESIS_BATCH_PUBLISH', 'True') == 'True':
+            callbacks.append(
+                KinesisBatchPublisher(kinesis_client, prediction_stream_name)
+            )
+        else:
+            kinesis_callback = KinesisCallback(kinesis_client, prediction_stream_name)
+            callbacks.append(kinesis_callback.put_record)
+
+    with timer.phase('subsystems'):
+        drift_engine = create_drift_engine(reference_data)
+        drift_worker = create_drift_worker(metrics_sink)
+        dispatcher = create_sink_dispatcher() if callbacks else None
 
     model_service = ModelService(
         model=model,
         reference_data=reference_data,
         model_version=run_id,
         callbacks=callbacks,
+        cache=create_prediction_cache(),
+        drift_engine=drift_engine,
+        drift_worker=drift_worker,
+        metrics_sink=metrics_sink,
+        dispatcher=dispatcher,
+        score_chunk_size=int(os.getenv('SCORE_CHUNK_SIZE', '100')),
+        data_buffer=create_data_buffer(),
+        instrumentation=create_instrumentation(os.getenv('INSTRUMENTATION', 'emf')),
     )
+    if os.getenv('PREWARM', 'True') == 'True':
+        with timer.phase('prewarm'):
+            model_service.prewarm()
+
+    model_service.reloader = create_model_reloader(model_service)
+    model_service.init_timings = timer.timings
     logger.debug('Model Service initialization completed.')
     logger.info("Initialized ModelService with model version: %s", run_id)
+    logger.info("Init phase timings (ms): %s", timer.timings)
     return model_service
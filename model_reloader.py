@@ -0,0 +1,116 @@
+import random
+import logging
+import threading
+
+logger = logging.getLogger()
+
+
+class ModelReloader:  # pylint: disable=too-many-instance-attributes
+    """
+    Background thread that follows the Production version in the registry.
+
+    Every ``poll_interval`` seconds (with some jitter, so a fleet of
+    containers does not hit the registry in lockstep) the Production run ID is
+    looked up with ``lookup_version()``. When it differs from the
+    version being served, ``load_version(run_id)`` loads the new model on this
+    thread and the result is staged on the service, which swaps it in at the
+    start of its next invocation. A version that fails to load, e.g. on an S3
+    timeout, is retried with exponential backoff: after the n-th failure in a
+    row it is skipped for ``2 ** (n - 1)`` polls, at most ``max_skipped_polls``.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        service,
+        lookup_version,
+        load_version,
+        poll_interval=60.0,
+        jitter=0.1,
+        *,
+        max_skipped_polls=16,
+    ):
+        self.service = service
+        self.lookup_version = lookup_version
+        self.load_version = load_version
+        self.poll_interval = poll_interval
+        self.jitter = jitter
+        self.max_skipped_polls = max_skipped_polls
+        self.failed_version = None
+        self.failed_attempts = 0
+        self.skipped_polls = 0
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self.run, name='model-reloader', daemon=True
+            )
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self):
+        while not self.stop_event.wait(self.next_delay()):
+            self.poll_once()
+
+    def next_delay(self):
+        return self.poll_interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def poll_once(self):
+        """Load the Production version if it changed; True when one was staged."""
+        try:
+            run_id = self.lookup_version()
+        except Exception as e:
+            logger.warning("Could not look up the Production model: %s", e)
+            return False
+
+        if run_id == self.service.model_version:
+            return False
+        staged = self.service.staged_model
+        if staged is not None and staged['model_version'] == run_id:
+            return False
+        if run_id == self.failed_version and self.skipped_polls > 0:
+            self.skipped_polls -= 1
+            return False
+
+        logger.info("Production model changed to %s, loading it", run_id)
+        try:
+            loaded = self.load_version(run_id)
+            self.service.stage_model(model_version=run_id, **loaded)
+        except Exception as e:
+            if run_id != self.failed_version:
+                self.failed_version = run_id
+                self.failed_attempts = 0
+            self.failed_attempts += 1
+            self.skipped_polls = min(
+                2 ** (self.failed_attempts - 1), self.max_skipped_polls
+            )
+            self.failed_reloads += 1
+            logger.error(
+                "Failed to load model version %s (attempt %s), retrying in %s polls: %s",
+                run_id,
+                self.failed_attempts,
+                self.skipped_polls + 1,
+                e,
+            )
+            return False
+
+        self.failed_version = None
+        self.failed_attempts = 0
+        self.reloads += 1
+        return True
+
+    def stats(self):
+        return {
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'failed_version': self.failed_version,
+            'failed_attempts': self.failed_attempts,
+        }
@@ -0,0 +1,153 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_COLUMNS = ('distance_to_goal', 'angle_to_goal')
+
+
+class PredictionCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Size-bounded LRU cache of predictions keyed on quantized shot features.
+
+    Features are rounded to ``precision`` decimal places, so shots from the
+    same spot share an entry. The cache belongs to one model version and is
+    emptied as soon as it is used with a different one.
+    """
+
+    def __init__(self, maxsize=4096, precision=2, columns=CACHE_COLUMNS):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.precision = precision
+        self.columns = tuple(columns)
+        self.model_version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, features):
+        try:
+            key = tuple(
+                round(float(features[column]), self.precision)
+                for column in self.columns
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+        # NaN never compares equal, so missing values are not cacheable
+        if any(math.isnan(value) for value in key):
+            return None
+        return key
+
+    def check_version(self, model_version):
+        if model_version != self.model_version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.model_version = model_version
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def column_keys(self, columns):
+        """Keys of the rows of a dict of equally long feature columns."""
+        rounded = [
+            [
+                round(value, self.precision)
+                for value in np.asarray(columns[column]).tolist()
+            ]
+            for column in self.columns
+        ]
+        return [
+            None if any(math.isnan(value) for value in key) else key
+            for key in zip(*rounded)
+        ]
+
+    def get_or_predict(self, model_version, features_batch, predict_batch):
+        """
+        Return predictions for ``features_batch``, scoring only cache misses.
+
+        Misses are deduplicated and sent to ``predict_batch`` in one call.
+        """
+        keys = [self.key(features) for features in features_batch]
+        return self.resolve(
+            model_version,
+            keys,
+            lambda indexes: predict_batch([features_batch[index] for index in indexes]),
+        )
+
+    def get_or_predict_columns(self, model_version, columns, predict_columns):
+        """
+        Like ``get_or_predict`` for a dict of feature arrays.
+
+        ``predict_columns`` receives the rows of the misses as a dict of arrays.
+        """
+        return self.resolve(
+            model_version,
+            self.column_keys(columns),
+            lambda indexes: predict_columns(
+                {column: values[indexes] for column, values in columns.items()}
+            ),
+        )
+
+    def resolve(self, model_version, keys, predict_indexes):
+        self.check_version(model_version)
+
+        predictions = [None] * len(keys)
+        pending = {}
+        uncacheable = []
+        for index, key in enumerate(keys):
+            if key is None:
+                uncacheable.append(index)
+                continue
+            if key in pending:
+                # Repeated within the batch: served by the first occurrence
+                pending[key].append(index)
+                self.hits += 1
+                continue
+            value = self.get(key)
+            if value is None:
+                pending[key] = [index]
+            else:
+                predictions[index] = value
+
+        miss_indexes = [indexes[0] for indexes in pending.values()] + uncacheable
+        if miss_indexes:
+            scored = predict_indexes(miss_indexes)
+            for index, value in zip(miss_indexes, scored):
+                predictions[index] = value
+                key = keys[index]
+                if key is not None:
+                    self.put(key, value)
+                    for duplicate in pending[key][1:]:
+                        predictions[duplicate] = value
+
+        return predictions
+
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
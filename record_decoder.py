@@ -0,0 +1,133 @@
+import json
+import math
+import binascii
+
+import numpy as np
+
+from shot_geometry import shot_features
+
+FEATURE_FIELDS = ('distance_to_goal', 'angle_to_goal')
+
+
+class DecodedBatch:
+    """
+    Columnar view of a Kinesis batch.
+
+    ``distance_to_goal`` and ``angle_to_goal`` are float64 arrays (NaN for a
+    missing feature) and ``shot_ids`` a list, all aligned with the input
+    records. ``valid`` masks the records that decoded cleanly; ``errors`` maps
+    the index of every other record to the reason it was rejected.
+    """
+
+    __slots__ = (
+        'shot_ids',
+        'distance_to_goal',
+        'angle_to_goal',
+        'valid',
+        'errors',
+        'sequence_numbers',
+    )
+
+    def __init__(self, size):
+        self.shot_ids = [None] * size
+        self.distance_to_goal = np.full(size, np.nan)
+        self.angle_to_goal = np.full(size, np.nan)
+        self.valid = np.zeros(size, dtype=bool)
+        self.errors = {}
+        self.sequence_numbers = [None] * size
+
+    def __len__(self):
+        return len(self.shot_ids)
+
+    def valid_indexes(self):
+        return np.flatnonzero(self.valid)
+
+    def feature_columns(self):
+        """Feature arrays of the valid records, in record order."""
+        if self.valid.all():
+            return {
+                'distance_to_goal': self.distance_to_goal,
+                'angle_to_goal': self.angle_to_goal,
+            }
+        return {
+            'distance_to_goal': self.distance_to_goal[self.valid],
+            'angle_to_goal': self.angle_to_goal[self.valid],
+        }
+
+
+def feature_value(shot, field):
+    value = shot[field]
+    # float is by far the common case and needs no further checks
+    if type(value) is float:  # pylint: disable=unidiomatic-typecheck
+        return value
+    if value is None:
+        return math.nan
+    # bool is an int subclass but never a valid coordinate
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"{field} must be a number, got {type(value).__name__}")
+    return value
+
+
+def shot_origin(shot):
+    """Wyscout ``x, y`` of a raw shot given as ``positions`` instead of features."""
+    origin = shot['positions'][0]
+    return feature_value(origin, 'x'), feature_value(origin, 'y')
+
+
+def decode_records(records):
+    """
+    Decode ``event['Records']`` straight into a ``DecodedBatch``.
+
+    The payload is base64-decoded and parsed as UTF-8 JSON; decoding the
+    bytes to str first is faster than letting ``json.loads`` detect the
+    encoding. Each record is validated on its own: a
+    missing field, bad base64 or JSON, or a non-numeric feature marks only
+    that record invalid. Features are collected in lists and converted to
+    arrays once per batch.
+
+    A shot without ``distance_to_goal`` may carry raw Wyscout ``positions``
+    instead; their features are computed with ``shot_features`` in one pass
+    over the batch, as the training pipeline does.
+    """
+    size = len(records)
+    batch = DecodedBatch(size)
+    distance = [math.nan] * size
+    angle = [math.nan] * size
+    valid = [False] * size
+    shot_ids = batch.shot_ids
+    sequence_numbers = batch.sequence_numbers
+    errors = batch.errors
+    a2b_base64, loads = binascii.a2b_base64, json.loads
+    raw_indexes, raw_x, raw_y = [], [], []
+    for index, record in enumerate(records):
+        kinesis = record.get('kinesis') or {}
+        sequence_numbers[index] = kinesis.get('sequenceNumber')
+        try:
+            shot_event = loads(a2b_base64(kinesis['data']).decode('utf-8'))
+            shot = shot_event['shot']
+            shot_id = shot_event['shot_id']
+            if 'distance_to_goal' not in shot and 'positions' in shot:
+                x, y = shot_origin(shot)
+                raw_indexes.append(index)
+                raw_x.append(x)
+                raw_y.append(y)
+            else:
+                distance[index] = feature_value(shot, 'distance_to_goal')
+                angle[index] = feature_value(shot, 'angle_to_goal')
+        except KeyError as e:
+            errors[index] = f"missing field {e}"
+            continue
+        except (TypeError, ValueError, IndexError, binascii.Error) as e:
+            # ValueError covers JSON and UTF-8 decoding errors
+            errors[index] = f"{type(e).__name__}: {e}"
+            continue
+        shot_ids[index] = shot_id
+        valid[index] = True
+    batch.distance_to_goal = np.array(distance, dtype=np.float64)
+    batch.angle_to_goal = np.array(angle, dtype=np.float64)
+    batch.valid = np.array(valid, dtype=bool)
+    if raw_indexes:
+        batch.distance_to_goal[raw_indexes], batch.angle_to_goal[raw_indexes] = (
+            shot_features(raw_x, raw_y)
+        )
+    return batch
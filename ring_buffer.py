@@ -0,0 +1,109 @@
+import numpy as np
+
+from drift import DRIFT_COLUMNS
+
+
+class RingBuffer:
+    """
+    Fixed-capacity columnar buffer of the most recent scored shots.
+
+    Each column is a preallocated float64 array of twice the capacity and
+    every row is written to both halves, so the last ``n`` rows are always one
+    contiguous slice and ``window`` returns views instead of copies. Appends
+    write into the arrays in place and never allocate.
+
+    ``pending`` counts the rows added since the last ``take_window``. With
+    ``window_size`` unset the windows tumble: each one holds only the pending
+    rows. Otherwise every window holds the last ``window_size`` rows, so
+    consecutive windows overlap and span invocations.
+    """
+
+    __slots__ = (
+        'columns',
+        'capacity',
+        'window_size',
+        'arrays',
+        'cursor',
+        'size',
+        'pending',
+    )
+
+    def __init__(self, capacity=1024, window_size=None, columns=DRIFT_COLUMNS):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if window_size is not None and not 0 < window_size <= capacity:
+            raise ValueError("window_size must be between 1 and capacity")
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self.window_size = window_size
+        self.arrays = {column: np.full(2 * capacity, np.nan) for column in self.columns}
+        self.cursor = 0
+        self.size = 0
+        self.pending = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        window = self.window(self.size)
+        for index in range(self.size):
+            yield {column: float(values[index]) for column, values in window.items()}
+
+    def append(self, row):
+        cursor, capacity = self.cursor, self.capacity
+        for column, values in self.arrays.items():
+            values[cursor] = values[cursor + capacity] = row[column]
+        self.advance(1)
+
+    def extend(self, columns):
+        """Append a batch given as a dict of equally long columns."""
+        n = len(columns[self.columns[0]])
+        if n == 0:
+            return
+        # Only the newest rows fit
+        skip = max(n - self.capacity, 0)
+        n -= skip
+        cursor, capacity = self.cursor, self.capacity
+        head = min(n, capacity - cursor)
+        for column, values in self.arrays.items():
+            batch = columns[column]
+            values[cursor : cursor + head] = batch[skip : skip + head]
+            values[cursor + capacity : cursor + capacity + head] = batch[
+                skip : skip + head
+            ]
+            if head < n:
+                values[: n - head] = batch[skip + head :]
+                values[capacity : capacity + n - head] = batch[skip + head :]
+        self.advance(n)
+
+    def advance(self, n):
+        self.cursor = (self.cursor + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.pending = min(self.pending + n, self.capacity)
+
+    def window(self, n=None):
+        """Views of the last ``n`` rows, valid until the buffer is next written."""
+        n = self.size if n is None else min(n, self.size)
+        stop = self.cursor + self.capacity
+        return {
+            column: values[stop - n : stop] for column, values in self.arrays.items()
+        }
+
+    def take_window(self, copy=False):
+        """
+        Return the current drift window and start counting a new one.
+
+        Pass ``copy=True`` when the window is used after further appends,
+        e.g. by a background worker.
+        """
+        size = self.pending if self.window_size is None else self.window_size
+        window = self.window(size)
+        self.pending = 0
+        if copy:
+            return {column: values.copy() for column, values in window.items()}
+        return window
+
+    def clear(self):
+        self.cursor = 0
+        self.size = 0
+        self.pending = 0
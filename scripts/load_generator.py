@@ -0,0 +1,339 @@
+"""
+Load generator for the prediction service.
+
+Replays recorded shot events (a Lambda test event such as
+``integration_test/event.json`` or a JSON-lines file of shot events) or
+synthetic ones as Kinesis batches, either against the Lambda runtime emulator
+or an in-process ``ModelService``.
+
+Closed loop: ``--concurrency`` workers each send their next batch as soon as
+the previous one returns. Open loop: batches are started at ``--rate`` per
+second regardless of how fast the service answers, and latency is measured
+from the scheduled start so queueing delay is not hidden.
+
+    python scripts/load_generator.py --target http://localhost:8080 \\
+        --mode open --rate 50 --duration 30 --batch-size 100
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent import futures
+from collections import Counter
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INVOCATIONS_PATH = '/2015-03-31/functions/function/invocations'
+
+
+def load_shot_events(path):
+    """Shot events from a Lambda Kinesis test event or a JSON-lines file."""
+    with open(path, 'rt', encoding='utf-8') as f_in:
+        content = f_in.read()
+    try:
+        document = json.loads(content)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(document, dict) and 'Records' in document:
+        return [
+            json.loads(base64.b64decode(record['kinesis']['data']))
+            for record in document['Records']
+        ]
+    return document if isinstance(document, list) else [document]
+
+
+def synthetic_shot_events(count, seed=42):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'shot': {
+                'distance_to_goal': float(rng.uniform(2, 40)),
+                'angle_to_goal': float(rng.uniform(0.05, 1.5)),
+            },
+            'shot_id': shot_id,
+        }
+        for shot_id in range(count)
+    ]
+
+
+class EventFactory:
+    """Cycles through shot events and packs them into Kinesis batches."""
+
+    def __init__(self, shot_events, batch_size):
+        self.shot_events = shot_events
+        self.batch_size = batch_size
+        self.position = 0
+        self.sequence_number = 0
+        self.lock = threading.Lock()
+
+    def next_event(self):
+        with self.lock:
+            records = []
+            for _ in range(self.batch_size):
+                shot_event = self.shot_events[self.position % len(self.shot_events)]
+                self.position += 1
+                self.sequence_number += 1
+                data = base64.b64encode(json.dumps(shot_event).encode('utf-8'))
+                records.append(
+                    {
+                        'kinesis': {
+                            'partitionKey': str(shot_event.get('shot_id')),
+                            'sequenceNumber': str(self.sequence_number),
+                            'data': data.decode('utf-8'),
+                        },
+                        'eventSource': 'aws:kinesis',
+                    }
+                )
+        return {'Records': records}
+
+
+class HttpTarget:
+    """The Lambda runtime interface emulator, e.g. the integration test image."""
+
+    def __init__(self, url, timeout=30.0):
+        if not url.endswith(INVOCATIONS_PATH):
+            url = url.rstrip('/') + INVOCATIONS_PATH
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, event):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class InProcessTarget:
+    """Calls ``ModelService.lambda_handler`` directly, without the network."""
+
+    def __init__(self, shot_events, model_path=None):
+        sys.path.insert(0, PROJECT_ROOT)
+        # pylint: disable=import-outside-toplevel,import-error
+        import model
+        from drift import DriftEngine
+
+        if model_path:
+            serving_model = model.load_model(model_path)
+        else:
+            serving_model = ConstantModel()
+
+        # The replayed shots serve as drift reference, as training data would.
+        # They are decoded as the handler decodes them, so shots given as raw
+        # positions get their features and invalid ones are left out.
+        records = EventFactory(shot_events, len(shot_events)).next_event()['Records']
+        columns = model.decode_records(records).feature_columns()
+        service = model.ModelService(serving_model, None, 'load-test')
+        columns['prediction'] = service.predict_columns(columns)
+        service.drift_engine = DriftEngine.from_columns(columns)
+        self.service = service
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        # One handler at a time, as in a single Lambda execution environment
+        with self.lock:
+            return self.service.lambda_handler(event)
+
+
+class ConstantModel:
+    accepts_columns = True
+
+    def predict(self, X):
+        return np.full(len(X['distance_to_goal']), 0.1)
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.requests = 0
+        self.errors = 0
+        self.records = 0
+        self.failed_records = 0
+        self.exceptions = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, latency, response, batch_size):
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+            self.records += batch_size
+            # A handler that raised answers with the Lambda error payload
+            if not isinstance(response, dict) or 'errorMessage' in response:
+                self.errors += 1
+                return
+            self.failed_records += len(response.get('batchItemFailures', []))
+
+    def add_error(self, latency, batch_size):
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+            self.records += batch_size
+            self.errors += 1
+
+    def add_exception(self, error, batch_size):
+        """A request that raised an unexpected exception; it has no latency."""
+        with self.lock:
+            self.requests += 1
+            self.records += batch_size
+            self.errors += 1
+            self.exceptions[type(error).__name__] += 1
+
+    def summary(self, elapsed):
+        latencies = np.asarray(self.latencies) * 1000
+        requests = self.requests
+        percentiles = {
+            f'p{q}_ms': float(np.percentile(latencies, q)) if latencies.size else None
+            for q in (50, 90, 95, 99)
+        }
+        return {
+            'requests': requests,
+            'records': self.records,
+            'errors': self.errors,
+            'error_rate': self.errors / requests if requests else 0.0,
+            'failed_records': self.failed_records,
+            'exceptions': dict(self.exceptions),
+            'elapsed_s': elapsed,
+            'throughput_rps': requests / elapsed if elapsed else 0.0,
+            'throughput_records_per_s': self.records / elapsed if elapsed else 0.0,
+            **percentiles,
+            'max_ms': float(latencies.max()) if latencies.size else None,
+        }
+
+
+def send(target, event, results, scheduled_at):
+    batch_size = len(event['Records'])
+    try:
+        response = target(event)
+    except (OSError, urllib.error.URLError, ValueError):
+        results.add_error(time.perf_counter() - scheduled_at, batch_size)
+        return
+    results.add(time.perf_counter() - scheduled_at, response, batch_size)
+
+
+def run_closed_loop(target, factory, concurrency, duration, max_requests):
+    results = Results()
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests]
+    lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            event = factory.next_event()
+            try:
+                send(target, event, results, time.perf_counter())
+            except Exception as e:
+                results.add_exception(e, len(event['Records']))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.summary(time.perf_counter() - start)
+
+
+def run_open_loop(  # pylint: disable=too-many-arguments
+    target, factory, rate, duration, max_requests, *, poisson=False, workers=64
+):
+    results = Results()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    scheduled_at = start
+    pending = {}
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while scheduled_at < start + duration and (
+            max_requests is None or len(pending) < max_requests
+        ):
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            event = factory.next_event()
+            future = executor.submit(send, target, event, results, scheduled_at)
+            pending[future] = len(event['Records'])
+            interval = rng.expovariate(rate) if poisson else 1.0 / rate
+            scheduled_at += interval
+    elapsed = time.perf_counter() - start
+    # send only handles transport errors; anything else surfaces here
+    for future, batch_size in pending.items():
+        error = future.exception()
+        if error is not None:
+            results.add_exception(error, batch_size)
+    return results.summary(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load generator for the prediction service.'
+    )
+    parser.add_argument(
+        '--target',
+        default='inprocess',
+        help="'inprocess' or the Lambda emulator URL, e.g. http://localhost:8080",
+    )
+    parser.add_argument('--model-path', help='model to load for the in-process target')
+    parser.add_argument('--events', help='recorded Lambda event or JSON-lines file')
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=10.0, help='batches per second')
+    parser.add_argument('--poisson', action='store_true', help='random arrivals')
+    parser.add_argument('--workers', type=int, default=64, help='open-loop threads')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, default=None)
+    parser.add_argument('--output', help='write the summary as JSON')
+    args = parser.parse_args()
+
+    shot_events = (
+        load_shot_events(args.events) if args.events else synthetic_shot_events(10000)
+    )
+    factory = EventFactory(shot_events, args.batch_size)
+    if args.target == 'inprocess':
+        target = InProcessTarget(shot_events, args.model_path)
+    else:
+        target = HttpTarget(args.target)
+
+    if args.mode == 'closed':
+        summary = run_closed_loop(
+            target, factory, args.concurrency, args.duration, args.requests
+        )
+    else:
+        summary = run_open_loop(
+            target,
+            factory,
+            args.rate,
+            args.duration,
+            args.requests,
+            poisson=args.poisson,
+            workers=args.workers,
+        )
+
+    summary = {
+        'mode': args.mode,
+        'target': args.target,
+        'batch_size': args.batch_size,
+        **summary,
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'wt', encoding='utf-8') as f_out:
+            json.dump(summary, f_out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import numpy as np
+
+# Wyscout coordinates are percentages of a 105 x 68 m pitch, attacking
+# towards x = 100
+PITCH_LENGTH = 105
+PITCH_WIDTH = 68
+GOAL_WIDTH = 7.32
+
+# Model features in the order the booster is trained on and scored with
+FEATURE_NAMES = ('angle_to_goal', 'distance_to_goal')
+
+
+def shot_features(x, y):
+    """
+    Distance (m) and angle (rad) to goal for shots taken at Wyscout ``x, y``.
+
+    Works on scalars or arrays in one vectorized pass and returns float64
+    arrays. The angle is the one the goal mouth subtends at the shot location,
+    folded into ``(0, pi]``.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Same operation order as the original feature code, so values match bit
+    # for bit
+    dx = (100 - x) * PITCH_LENGTH / 100
+    dy = np.abs(y - 50) * PITCH_WIDTH / 100
+    squared = dx**2 + dy**2
+    distance = np.sqrt(squared)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.arctan(GOAL_WIDTH * dx / (squared - (GOAL_WIDTH / 2) ** 2))
+    angle = np.where(angle > 0, angle, angle + np.pi)
+    return distance, angle
+
+
+def positions_xy(positions):
+    """Origin ``x`` and ``y`` arrays of Wyscout ``positions`` lists."""
+    x = np.fromiter((cell[0]['x'] for cell in positions), np.float64, len(positions))
+    y = np.fromiter((cell[0]['y'] for cell in positions), np.float64, len(positions))
+    return x, y
@@ -0,0 +1,117 @@
+import time
+import logging
+import threading
+from concurrent import futures
+
+logger = logging.getLogger()
+
+
+class SinkDispatcher:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs prediction sinks (callbacks) on a bounded thread pool.
+
+    Every sink gets its own lane: the chunks handed to one sink are delivered
+    in submission order, while different sinks run concurrently and overlap
+    with scoring of the next chunk. At most ``max_pending`` chunks may be in
+    flight, beyond that ``publish`` blocks until a lane catches up. ``join``
+    flushes batching sinks and waits for every lane, giving up on a sink after
+    its ``publish_timeout`` (or the dispatcher's ``timeout``).
+    """
+
+    def __init__(self, max_workers=4, max_pending=16, timeout=5.0):
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='sink'
+        )
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+        self.lanes = {}
+        self.lock = threading.Lock()
+        self.published_chunks = 0
+        self.failed_chunks = 0
+        self.timed_out_sinks = 0
+        self.backpressure_waits = 0
+
+    def submit(self, sink, job):
+        # pylint: disable=consider-using-with
+        # The slot is released by the job's done callback, not in this scope
+        if not self.slots.acquire(blocking=False):
+            self.backpressure_waits += 1
+            self.slots.acquire()
+
+        with self.lock:
+            previous = self.lanes.get(sink)
+
+            def run_in_lane():
+                # Chunks of one sink run in order: wait for the previous one.
+                # Jobs start in FIFO order, so the previous one is already running.
+                if previous is not None:
+                    futures.wait([previous])
+                try:
+                    result = job()
+                except Exception as e:
+                    self.failed_chunks += 1
+                    logger.error("Prediction sink %r failed: %s", sink, e)
+                    raise
+                self.published_chunks += 1
+                return result
+
+            future = self.executor.submit(run_in_lane)
+            future.add_done_callback(lambda _: self.slots.release())
+            self.lanes[sink] = future
+        return future
+
+    def publish(self, sinks, prediction_events):
+        """
+        Deliver a chunk to every sink; returns one future per sink.
+
+        A future fails if its sink raised; otherwise its result is what the
+        sink's ``flush`` returned, e.g. the entries a batching sink could not
+        send.
+        """
+        deliveries = []
+        for sink in sinks:
+
+            def deliver(sink=sink):
+                for prediction_event in prediction_events:
+                    sink(prediction_event)
+                # Batching sinks send each chunk as soon as it is delivered
+                flush = getattr(sink, 'flush', None)
+                if flush is not None:
+                    return flush()
+                return None
+
+            deliveries.append(self.submit(sink, deliver))
+        return deliveries
+
+    def join(self, sinks):
+        """Wait until every lane has delivered its chunks; False on a timeout."""
+        with self.lock:
+            lanes = {sink: self.lanes.get(sink) for sink in sinks}
+
+        completed = True
+        start = time.monotonic()
+        for sink, future in lanes.items():
+            if future is None:
+                continue
+            timeout = getattr(sink, 'publish_timeout', self.timeout)
+            remaining = max(timeout - (time.monotonic() - start), 0.0)
+            # A failed sink is already logged and counted by its lane
+            done, _ = futures.wait([future], timeout=remaining)
+            if not done:
+                self.timed_out_sinks += 1
+                completed = False
+                logger.warning(
+                    "Prediction sink %r did not finish within %ss", sink, timeout
+                )
+        return completed
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def stats(self):
+        return {
+            'published_chunks': self.published_chunks,
+            'failed_chunks': self.failed_chunks,
+            'timed_out_sinks': self.timed_out_sinks,
+            'backpressure_waits': self.backpressure_waits,
+        }
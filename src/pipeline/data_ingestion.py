@@ -1,9 +1,186 @@
 import os
+import re
+import json
+import time
+import hashlib
+from concurrent import futures
 
 import pandas as pd
 import requests
 from prefect import task
 
+TIMEOUT_SECONDS = 10
+CHUNK_SIZE = 64 * 1024
+META_SUFFIX = '.meta'
+PART_SUFFIX = '.part'
+
+# Characters read per step when streaming an events file
+READ_CHUNK_SIZE = 1 << 20
+SHOT_FIELDS = ('subEventName', 'positions', 'tags')
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def url_filename(url):
+    # Extract filename from the URL
+    filename = url.split("/")[-1].split("?")[0]
+    if ".json" in filename:
+        filename = filename.split(".json")[0] + ".json"
+    return filename
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_meta(path):
+    try:
+        with open(path + META_SUFFIX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(path, meta):
+    with open(path + META_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def is_complete(path, meta):
+    """
+    The local copy matches the size and checksum recorded when it was saved.
+
+    The file is only hashed again when its mtime differs from the sidecar's,
+    so a current copy is not read on every run.
+    """
+    if not os.path.exists(path) or meta.get('size') != os.path.getsize(path):
+        return False
+    if meta.get('sha256') and meta.get('mtime_ns') == os.stat(path).st_mtime_ns:
+        return True
+    return meta.get('sha256') == file_sha256(path)
+
+
+def content_range_size(response):
+    """Object size from a ``Content-Range: bytes */<size>`` header, if any."""
+    size = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(size) if size.isdigit() else None
+
+
+def discard_part(part_path):
+    for stale in (part_path, part_path + META_SUFFIX):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def finalize(part_path, path, etag):
+    os.replace(part_path, path)
+    os.remove(part_path + META_SUFFIX)
+    write_meta(
+        path,
+        {
+            'etag': etag,
+            'size': os.path.getsize(path),
+            'sha256': file_sha256(path),
+            'mtime_ns': os.stat(path).st_mtime_ns,
+        },
+    )
+
+
+def fetch(session, url, path, timeout):
+    """
+    One download attempt; returns True if the local copy was already current.
+
+    A complete local file is revalidated with If-None-Match, and a partial
+    ``.part`` file is resumed with a Range request guarded by If-Range. A
+    ``.part`` the server will not resume from is finalized if it already
+    holds the whole object, and otherwise discarded and fetched from byte 0.
+    """
+    meta = read_meta(path)
+    part_path = path + PART_SUFFIX
+    headers = {}
+    complete = is_complete(path, meta)
+    if complete and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+
+    part_meta = read_meta(part_path)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if not complete and offset and part_meta.get('etag'):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = part_meta['etag']
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            return True
+        if 'Range' in headers and 400 <= r.status_code < 500:
+            # e.g. 416 for a .part that was fully written before the rename
+            if r.status_code == 416 and content_range_size(r) == offset:
+                finalize(part_path, path, part_meta['etag'])
+                return False
+            discard_part(part_path)
+            return fetch(session, url, path, timeout)
+        r.raise_for_status()
+        etag = r.headers.get('ETag')
+        if complete and etag and etag == meta.get('etag'):
+            # The server ignored If-None-Match but reports the same object
+            return True
+
+        mode = 'ab' if r.status_code == 206 else 'wb'
+        if mode == 'wb':
+            offset = 0
+        write_meta(part_path, {'etag': etag})
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+        expected_size = r.headers.get('Content-Length')
+        if expected_size is not None:
+            expected_size = offset + int(expected_size)
+            if os.path.getsize(part_path) != expected_size:
+                raise IOError(f"Incomplete download of {os.path.basename(path)}")
+
+    finalize(part_path, path, etag)
+    return False
+
+
+def download_file(  # pylint: disable=too-many-arguments
+    url,
+    save_path="data/raw/",
+    session=None,
+    *,
+    retries=3,
+    backoff=1.0,
+    timeout=TIMEOUT_SECONDS,
+):
+    """
+    Download ``url`` into ``save_path`` unless the local copy is current.
+
+    Failed attempts are retried with exponential backoff and resume from the
+    bytes already on disk.
+
+    :return: str, Path to the downloaded file.
+    """
+    os.makedirs(save_path, exist_ok=True)
+    path = os.path.join(save_path, url_filename(url))
+    session = session or requests.Session()
+
+    for attempt in range(retries + 1):
+        try:
+            if fetch(session, url, path, timeout):
+                print(f"Skipping {os.path.basename(path)}, local copy is current")
+            else:
+                print(f"Downloaded {os.path.basename(path)}")
+            return path
+        except (requests.RequestException, IOError) as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+            print(f"Download of {os.path.basename(path)} failed ({e}), retrying...")
+            time.sleep(delay)
+    return path
+
 
 @task
 def download_from_url_to_path(url, save_path="data/raw/"):
@@ -14,42 +191,89 @@ def download_from_url_to_path(url, save_path="data/raw/"):
     :param save_path: str, The path to the directory where data should be saved.
     :return: str, Path to the downloaded file.
     """
+    return download_file(url, save_path)
 
-    # Extract filename from the URL
-    filename = url.split("/")[-1].split("?")[0]
-    if ".json" in filename:
-        filename = filename.split(".json")[0] + ".json"
 
-    TIMEOUT_SECONDS = 10
+@task
+def download_urls(urls, save_path="data/raw/", max_workers=4):
+    """
+    Download several URLs concurrently with a bounded pool of workers.
 
-    # Use requests to download the file
-    with requests.get(url, stream=True, timeout=TIMEOUT_SECONDS) as r:
-        r.raise_for_status()
+    :param urls: list, The URLs to download.
+    :param save_path: str, The path to the directory where data should be saved.
+    :param max_workers: int, The maximum number of concurrent downloads.
+    :return: list, Paths to the downloaded files, in the order of ``urls``.
+    """
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda url: download_file(url, save_path), urls))
 
-        # Create a directory if it doesn't exist
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
 
-        # Save the file to the directory
-        with open(os.path.join(save_path, filename), 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the elements of the top-level JSON array in ``f`` one at a time.
 
-    return os.path.join(save_path, filename)
+    The file is read ``chunk_size`` characters at a time and each element is
+    parsed with ``JSONDecoder.raw_decode``, so only the unparsed tail of the
+    buffer is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("Expected a JSON array of events")
+    pos = 1
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Buffer exhausted", buffer, pos)
+            element, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The element continues in the next chunk
+            more = f.read(chunk_size)
+            if not more:
+                raise
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield element
+
+
+def read_shot_events(filepath, columns, chunk_size=READ_CHUNK_SIZE):
+    """Append the shot-relevant fields of every shot event to ``columns``."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for event in iter_json_array(f, chunk_size):
+            if event.get('subEventName') == 'Shot':
+                for field in SHOT_FIELDS:
+                    columns[field].append(event.get(field))
 
 
 @task
-def read_data(directory):
+def read_data(directory, stream=False, chunk_size=READ_CHUNK_SIZE):
     """
     Read data from the directory.
+
+    :param directory: str, The directory containing the JSON event files.
+    :param stream: bool, Parse the files incrementally and keep only shot
+        events and the fields the feature step needs, so that peak memory is
+        bounded by ``chunk_size`` rather than by the file sizes.
+    :param chunk_size: int, Characters read per step in streaming mode.
+    :return: pd.DataFrame, The events read from all files.
     """
     print(f"Reading data from directory: {directory}...")
-    data = pd.DataFrame()
-    for filename in os.listdir(directory):
+    frames = []
+    columns = {field: [] for field in SHOT_FIELDS}
+    for filename in sorted(os.listdir(directory)):
         if filename.endswith('.json'):
             filepath = os.path.join(directory, filename)
             print(f"Reading file: {filename}...")
-            data_temp = pd.read_json(filepath)
-            data = pd.concat([data, data_temp], ignore_index=True)
+            if stream:
+                read_shot_events(filepath, columns, chunk_size)
+            else:
+                frames.append(pd.read_json(filepath))
     print(f"Finished reading data from directory: {directory}.")
-    return data
+    if stream:
+        return pd.DataFrame(columns)
+    # A single concat instead of one per file
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
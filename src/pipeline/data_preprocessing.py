@@ -3,7 +3,12 @@ import pandas as pd
 import xgboost as xgb
 from prefect import task
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction import DictVectorizer
+
+from shot_geometry import FEATURE_NAMES, positions_xy, shot_features
+
+# Bump whenever filter_and_transform_shot_data changes its output, so that
+# cached datasets built by the old code are not reused
+FEATURE_VERSION = 1
 
 
 @task
@@ -19,33 +24,8 @@ def filter_and_transform_shot_data(data):
     # Filter out shot events
     shot_df = df[df['subEventName'] == 'Shot'].copy()
 
-    shot_df["X"] = shot_df['positions'].apply(
-        lambda cell: (100 - cell[0]['x']) * 105 / 100
-    )
-    shot_df["Y"] = shot_df['positions'].apply(lambda cell: cell[0]['y'] * 68 / 100)
-    shot_df["C"] = shot_df['positions'].apply(
-        lambda cell: abs(cell[0]['y'] - 50) * 68 / 100
-    )
-    shot_df['distance_to_goal'] = np.sqrt(shot_df['X'] ** 2 + shot_df['C'] ** 2)
-    shot_df['angle_to_goal'] = np.where(
-        np.arctan(
-            7.32
-            * shot_df['X']
-            / (shot_df['X'] ** 2 + shot_df['C'] ** 2 - (7.32 / 2) ** 2)
-        )
-        > 0,
-        np.arctan(
-            7.32
-            * shot_df['X']
-            / (shot_df['X'] ** 2 + shot_df['C'] ** 2 - (7.32 / 2) ** 2)
-        ),
-        np.arctan(
-            7.32
-            * shot_df['X']
-            / (shot_df['X'] ** 2 + shot_df['C'] ** 2 - (7.32 / 2) ** 2)
-        )
-        + np.pi,
-    )
+    x, y = positions_xy(shot_df['positions'].tolist())
+    shot_df['distance_to_goal'], shot_df['angle_to_goal'] = shot_features(x, y)
     shot_df['is_goal'] = (
         shot_df['tags']
         .apply(lambda tags: any(tag['id'] == 101 for tag in tags))
@@ -68,34 +48,35 @@ def split_data(df):
     return df_train, df_val, df_test
 
 
+def feature_matrix(df):
+    """C-contiguous float32 matrix of the model features, in ``FEATURE_NAMES`` order."""
+    X = np.empty((len(df), len(FEATURE_NAMES)), dtype=np.float32)
+    for i, name in enumerate(FEATURE_NAMES):
+        X[:, i] = df[name].to_numpy(dtype=np.float32, na_value=np.nan)
+    return X
+
+
+def to_dmatrix(df):
+    X = feature_matrix(df)
+    y = df['is_goal'].to_numpy(dtype=np.float32)
+    return xgb.DMatrix(X, label=y, feature_names=list(FEATURE_NAMES))
+
+
 @task
 def preprocess_data(df_train, df_val, df_test):
-    """Preprocess data by separating the target variable and converting to DMatrix."""
+    """
+    Preprocess data by separating the target variable and converting to DMatrix.
 
-    print("Preprocessing data...")
-    y_train, y_val, y_test = (
-        df_train['is_goal'].values,
-        df_val['is_goal'].values,
-        df_test['is_goal'].values,
-    )
-    X_train, X_val, X_test = (
-        df_train.drop(columns='is_goal'),
-        df_val.drop(columns='is_goal'),
-        df_test.drop(columns='is_goal'),
-    )
+    The matrices are built straight from float32 feature columns with
+    ``FEATURE_NAMES`` as feature names, the order the serving side scores in.
 
-    print("Vectorizing data...")
+    :return: tuple, The train, validation and test matrices.
+    """
 
-    dv = DictVectorizer(sparse=False)
-    X_train, X_val, X_test = (
-        dv.fit_transform(X_train.to_dict(orient='records')),
-        dv.transform(X_val.to_dict(orient='records')),
-        dv.transform(X_test.to_dict(orient='records')),
-    )
+    print("Preprocessing data...")
+    dtrain = to_dmatrix(df_train)
+    dval = to_dmatrix(df_val)
+    dtest = to_dmatrix(df_test)
 
     print("Data preprocessing completed.")
-    return (
-        xgb.DMatrix(X_train, label=y_train, feature_names=dv.feature_names_),
-        xgb.DMatrix(X_val, label=y_val, feature_names=dv.feature_names_),
-        xgb.DMatrix(X_test, label=y_test, feature_names=dv.feature_names_),
-    )
+    return dtrain, dval, dtest
@@ -0,0 +1,90 @@
+import os
+import shutil
+import hashlib
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from prefect import task
+
+from data_ingestion import read_meta, file_sha256
+from data_preprocessing import FEATURE_VERSION
+
+DATASET_CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", "data/processed/")
+
+
+def raw_file_digest(path):
+    """SHA-256 of a raw file, from its download sidecar when that is current."""
+    meta = read_meta(path)
+    if meta.get('sha256') and meta.get('size') == os.path.getsize(path):
+        return meta['sha256']
+    return file_sha256(path)
+
+
+def dataset_fingerprint(directory, feature_version=FEATURE_VERSION):
+    """
+    Fingerprint of the raw JSON files in ``directory`` and the feature code.
+
+    Covers the same files ``read_data`` reads, so a changed, added or removed
+    file or a new ``FEATURE_VERSION`` yields a different key.
+    """
+    digest = hashlib.sha256(f"features-v{feature_version}".encode())
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            path = os.path.join(directory, filename)
+            digest.update(f"\n{filename}:{raw_file_digest(path)}".encode())
+    return digest.hexdigest()
+
+
+def cache_path(fingerprint, cache_dir=DATASET_CACHE_DIR):
+    return os.path.join(cache_dir, f"shots_{fingerprint[:16]}.parquet")
+
+
+@task
+def load_cached_dataset(fingerprint, cache_dir=DATASET_CACHE_DIR):
+    """
+    Load the processed shot dataset cached under ``fingerprint``.
+
+    :param fingerprint: str, Key returned by ``dataset_fingerprint``.
+    :param cache_dir: str, The directory holding the cached datasets.
+    :return: pd.DataFrame or None, The dataset, or None on a cache miss.
+    """
+    path = cache_path(fingerprint, cache_dir)
+    if not os.path.exists(path):
+        print(f"Dataset cache miss: {os.path.basename(path)}")
+        return None
+    try:
+        table = pq.read_table(path, memory_map=True)
+    except (OSError, pa.ArrowException) as e:
+        print(f"Dataset cache miss: {os.path.basename(path)} is unreadable ({e})")
+        return None
+    print(f"Dataset cache hit: {os.path.basename(path)} ({table.num_rows} shots)")
+    return table.to_pandas()
+
+
+@task
+def save_cached_dataset(df, fingerprint, cache_dir=DATASET_CACHE_DIR):
+    """
+    Write the processed shot dataset to the cache as Parquet.
+
+    The file is written under a temporary name and renamed into place, so an
+    interrupted run never leaves a truncated entry behind.
+
+    :param df: pd.DataFrame, The processed shot dataset.
+    :param fingerprint: str, Key returned by ``dataset_fingerprint``.
+    :param cache_dir: str, The directory holding the cached datasets.
+    :return: str, Path to the cached file.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(fingerprint, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Cached processed dataset as {os.path.basename(path)}")
+    return path
+
+
+def clear_dataset_cache(cache_dir=DATASET_CACHE_DIR):
+    """Remove every cached dataset."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"Cleared dataset cache in {cache_dir}")
@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import mlflow
+from prefect import task
+from mlflow.tracking import MlflowClient
+
+from lookup_grid import GRID_ARTIFACT_NAME, LookupGridModel
+from tree_engine import ARTIFACT_NAME, TreeEnsembleModel
+
+
+def load_tree_model(run_id):
+    booster = mlflow.xgboost.load_model(f"runs:/{run_id}/model")
+    return TreeEnsembleModel.from_booster(booster)
+
+
+def log_model_artifact(run_id, artifact_name, save):
+    """Save an artifact with ``save(path)`` and log it next to the MLflow model."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, artifact_name)
+        save(local_path)
+        MlflowClient().log_artifact(run_id, local_path, artifact_path="model")
+    return f"model/{artifact_name}"
+
+
+@task(log_prints=True)
+def export_tree_arrays(run_id):
+    """
+    Export the booster of an MLflow run as a flat NumPy tree-array artifact.
+
+    The artifact is logged next to the MLflow model so the serving side can
+    score with ``TreeEnsembleModel`` instead of loading xgboost through pyfunc.
+
+    :param run_id: str, The ID of the MLflow run that produced the model.
+    :return: str, Artifact path of the exported tree arrays.
+    """
+    print(f"Exporting tree arrays for run ID: {run_id}...")
+    tree_model = load_tree_model(run_id)
+    print(
+        f"Compiled {len(tree_model.roots)} trees with {len(tree_model.feature)} "
+        f"nodes (max depth {tree_model.max_depth})"
+    )
+
+    artifact_path = log_model_artifact(run_id, ARTIFACT_NAME, tree_model.save)
+    print("Tree arrays exported successfully.")
+    return artifact_path
+
+
+@task(log_prints=True)
+def export_lookup_grid(run_id):
+    """
+    Export the (distance_to_goal, angle_to_goal) lookup grid of an MLflow run.
+
+    The grid's resolution and its error against the real model are logged as
+    metrics of the run, so the accuracy of the grid serving mode is on record.
+
+    :param run_id: str, The ID of the MLflow run that produced the model.
+    :return: str, Artifact path of the exported grid.
+    """
+    print(f"Building lookup grid for run ID: {run_id}...")
+    grid = LookupGridModel.build(load_tree_model(run_id))
+    print(f"Lookup grid error bounds: {grid.error_bounds}")
+
+    client = MlflowClient()
+    for name, value in grid.error_bounds.items():
+        client.log_metric(run_id, f"grid_{name}", value)
+
+    artifact_path = log_model_artifact(run_id, GRID_ARTIFACT_NAME, grid.save)
+    print("Lookup grid exported successfully.")
+    return artifact_path
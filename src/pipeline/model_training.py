@@ -1,133 +1,340 @@
 import os
+import json
+import tempfile
+import multiprocessing
 from datetime import date
+from concurrent import futures
 
+import numpy as np
 import mlflow
 import pandas as pd
 import xgboost as xgb
 from prefect import task
-from hyperopt import STATUS_OK, Trials, hp, tpe, fmin, space_eval
+from hyperopt import STATUS_OK, Trials, hp, tpe, base, fmin, space_eval
 from hyperopt.pyll import scope
+from hyperopt.utils import coarse_utcnow
 from sklearn.metrics import roc_auc_score
 from prefect.artifacts import create_markdown_artifact
 
+from drift import build_reference_profile
 
-@task(log_prints=True)
-def hyperopt_train(dtrain, dval):
-    """Use Hyperopt to optimize XGBoost hyperparameters."""
+REFERENCE_PROFILE_NAME = "reference_profile.json"
 
-    def objective(params):
-        """Objective function for Hyperopt's fmin function."""
-        print(f"Training with params: {params}")
-
-        print(f"Number of rows in training data: {dtrain.num_row()}")
-        print(f"Number of rows in validation data: {dval.num_row()}")
-
-        # Start an MLflow run to keep track of experiments
-        with mlflow.start_run():
-            # Set metadata for the current run
-            mlflow.set_tag("model", "xgboost")
-            mlflow.log_params(params)
-
-            # Train an XGBoost model
-            booster = xgb.train(
-                params=params,
-                dtrain=dtrain,
-                num_boost_round=1000,
-                evals=[(dval, 'validation')],
-                early_stopping_rounds=50,
-                verbose_eval=False,
-            )
-            print(f"Number of boosting rounds: {booster.best_iteration}")
+# Length of tpe.suggest's random startup phase, whose suggestions do not
+# depend on earlier results
+N_STARTUP_JOBS = 20
 
-            y_train_pred = booster.predict(dtrain)
-            print(f"First 10 predictions for training: {y_train_pred[:10]}")
+# Define the search space for the hyperparameters
+SEARCH_SPACE = {
+    'max_depth': scope.int(hp.quniform('max_depth', 4, 100, 1)),
+    'learning_rate': hp.loguniform('learning_rate', -3, -1),
+    'reg_alpha': hp.loguniform('reg_alpha', -6, -2),
+    'reg_lambda': hp.loguniform('reg_lambda', -7, -2),
+    'min_child_weight': hp.loguniform('min_child_weight', -1, 3),
+    'objective': 'binary:logistic',
+    'seed': 42,
+}
 
-            # Predict on validation data and calculate the AUC
-            y_val_pred = booster.predict(dval)
-            print(f"First 10 predictions for validation: {y_val_pred[:10]}")
+# Training matrices of a trial worker process, set by init_trial_worker
+TRIAL_DATA = {}
 
-            auc = roc_auc_score(dval.get_label(), y_val_pred)
-            print(f"Evaluation AUC: {auc}")
 
-            # Log AUC as a metric in MLflow
-            mlflow.log_metric("auc", auc)
+def dmatrix_columns(dmatrix):
+    """Dense feature columns of a DMatrix keyed by feature name, NaN if missing."""
+    data = dmatrix.get_data()
+    dense = np.full(data.shape, np.nan)
+    rows = np.repeat(np.arange(data.shape[0]), np.diff(data.indptr))
+    dense[rows, data.indices] = data.data
+    return {name: dense[:, i] for i, name in enumerate(dmatrix.feature_names)}
 
-            # Log the trained model to MLflow
-            mlflow.xgboost.log_model(booster, artifact_path="model")
 
-            # Save the reference data (training data) as a Parquet file
-            reference_data_path = "reference_data.parquet"
-            dtrain_df = pd.DataFrame(dtrain.get_label(), columns=["label"])
-            dtrain_df.to_parquet(reference_data_path)
+def log_auc_report(auc):
+    markdown__auc_report = f"""# AUC Report
 
-            # Log the reference data to MLflow
-            mlflow.log_artifact(reference_data_path, artifact_path="model")
+    ## Summary
 
-            markdown__auc_report = f"""# AUC Report
+    XGoals Prediction
 
-            ## Summary
+    ## AUC XGBoost Model
 
-            XGoals Prediction
+    | Region    | AUC |
+    |:----------|-------:|
+    | {date.today()} | {auc:.2f} |
+    """
 
-            ## AUC XGBoost Model
+    create_markdown_artifact(key="xgoals-model-report", markdown=markdown__auc_report)
 
-            | Region    | AUC |
-            |:----------|-------:|
-            | {date.today()} | {auc:.2f} |
-            """
 
-            create_markdown_artifact(
-                key="xgoals-model-report", markdown=markdown__auc_report
-            )
+def train_trial(params, dtrain, dval):
+    """
+    Train one booster with ``params`` and log it in its own MLflow run.
+
+    :return: dict, The hyperopt result, including the ``run_id`` of the trial.
+    """
+    print(f"Training with params: {params}")
+
+    print(f"Number of rows in training data: {dtrain.num_row()}")
+    print(f"Number of rows in validation data: {dval.num_row()}")
+
+    # Start an MLflow run to keep track of experiments
+    with mlflow.start_run() as run, tempfile.TemporaryDirectory() as tmp_dir:
+        # Set metadata for the current run
+        mlflow.set_tag("model", "xgboost")
+        mlflow.log_params(params)
+
+        # Train an XGBoost model
+        booster = xgb.train(
+            params=params,
+            dtrain=dtrain,
+            num_boost_round=1000,
+            evals=[(dval, 'validation')],
+            early_stopping_rounds=50,
+            verbose_eval=False,
+        )
+        print(f"Number of boosting rounds: {booster.best_iteration}")
+
+        y_train_pred = booster.predict(dtrain)
+        print(f"First 10 predictions for training: {y_train_pred[:10]}")
+
+        # Predict on validation data and calculate the AUC
+        y_val_pred = booster.predict(dval)
+        print(f"First 10 predictions for validation: {y_val_pred[:10]}")
+
+        auc = roc_auc_score(dval.get_label(), y_val_pred)
+        print(f"Evaluation AUC: {auc}")
+
+        # Log AUC as a metric in MLflow
+        mlflow.log_metric("auc", auc)
 
-            # Return negative AUC as the objective function is minimized
-        return {'loss': -auc, 'status': STATUS_OK, 'auc_value': auc}
+        # Log the trained model to MLflow
+        mlflow.xgboost.log_model(booster, artifact_path="model")
 
-    # Define the search space for the hyperparameters
-    print("Setting up hyperparameter search space...")
+        # Save the reference data (training data) as a Parquet file. Files go
+        # to a per-trial directory so concurrent trials do not overwrite them.
+        reference_data_path = os.path.join(tmp_dir, "reference_data.parquet")
+        dtrain_df = pd.DataFrame(dtrain.get_label(), columns=["label"])
+        dtrain_df.to_parquet(reference_data_path)
 
-    search_space = {
-        'max_depth': scope.int(hp.quniform('max_depth', 4, 100, 1)),
-        'learning_rate': hp.loguniform('learning_rate', -3, -1),
-        'reg_alpha': hp.loguniform('reg_alpha', -6, -2),
-        'reg_lambda': hp.loguniform('reg_lambda', -7, -2),
-        'min_child_weight': hp.loguniform('min_child_weight', -1, 3),
-        'objective': 'binary:logistic',
-        'seed': 42,
+        # Log the reference data to MLflow
+        mlflow.log_artifact(reference_data_path, artifact_path="model")
+
+        # Save a compact reference profile of the training features and
+        # predictions, which the serving side loads for drift monitoring
+        reference_profile = build_reference_profile(
+            {**dmatrix_columns(dtrain), "prediction": y_train_pred}
+        )
+        reference_profile_path = os.path.join(tmp_dir, REFERENCE_PROFILE_NAME)
+        with open(reference_profile_path, "w", encoding="utf-8") as f_out:
+            json.dump(reference_profile, f_out)
+        mlflow.log_artifact(reference_profile_path, artifact_path="model")
+
+    # Return negative AUC as the objective function is minimized
+    return {
+        'loss': -auc,
+        'status': STATUS_OK,
+        'auc_value': auc,
+        'run_id': run.info.run_id,
     }
 
-    # Use fmin function from Hyperopt to find the best hyperparameters
-    print("Starting hyperparameter optimization...")
+
+def matrix_payload(dmatrix):
+    """Picklable data, labels and feature names of a DMatrix."""
+    return dmatrix.get_data(), dmatrix.get_label(), dmatrix.feature_names
+
+
+def init_trial_worker(train, val, tracking_uri, experiment_id):
+    """Rebuild the training matrices and MLflow setup in a trial worker process."""
+    data, label, feature_names = train
+    TRIAL_DATA['train'] = xgb.DMatrix(data, label=label, feature_names=feature_names)
+    data, label, feature_names = val
+    TRIAL_DATA['val'] = xgb.DMatrix(data, label=label, feature_names=feature_names)
+    mlflow.set_tracking_uri(tracking_uri)
+    mlflow.set_experiment(experiment_id=experiment_id)
+
+
+def run_trial(params):
+    return train_trial(params, TRIAL_DATA['train'], TRIAL_DATA['val'])
+
+
+def suggest_trial(trials, domain, rstate):
+    """
+    Enqueue the next TPE suggestion exactly as ``fmin`` does for one trial.
+
+    One seed is drawn from ``rstate`` per trial, so the suggestions follow
+    the same stream as a serial ``fmin`` with the same ``rstate``.
+    """
+    new_ids = trials.new_trial_ids(1)
+    trials.refresh()
+    docs = tpe.suggest(new_ids, domain, trials, rstate.integers(2**31 - 1))
+    trials.insert_trial_docs(docs)
+    trials.refresh()
+    return next(doc for doc in trials.trials if doc['tid'] == new_ids[0])
+
+
+def trial_params(doc, search_space):
+    vals = {label: values[0] for label, values in doc['misc']['vals'].items() if values}
+    return space_eval(search_space, vals)
+
+
+def record_trial(trials, doc, result):
+    doc['state'] = base.JOB_STATE_DONE
+    doc['result'] = result
+    doc['refresh_time'] = coarse_utcnow()
+    trials.refresh()
+
+
+def parallel_search(  # pylint: disable=too-many-arguments
+    evaluate,
+    search_space,
+    max_evals,
+    executor,
+    *,
+    seed=42,
+    startup_params=None,
+    params=None,
+    on_result=None,
+):
+    """
+    TPE search that evaluates the random startup trials concurrently.
+
+    The first ``N_STARTUP_JOBS`` suggestions do not depend on any result, so
+    they are all enqueued up front and evaluated on ``executor``. Every later
+    suggestion depends on all earlier results and is evaluated on its own.
+    Suggestions are drawn with ``fmin``'s seed stream, so for the same
+    ``seed`` and ``max_evals`` the trials and their parameters are those of a
+    serial ``fmin(rstate=np.random.default_rng(seed))``.
+
+    :param evaluate: callable, Picklable function of the trial parameters
+        returning the hyperopt result dict.
+    :param executor: concurrent.futures.Executor, Pool the trials run on.
+    :param startup_params: dict, Extra parameters for the concurrent startup
+        trials, e.g. a per-trial ``nthread``.
+    :param params: dict, Extra parameters for the trials that run alone.
+    :param on_result: callable, Called with each result as it is recorded.
+    :return: hyperopt.Trials, The finished trials.
+    """
+    domain = base.Domain(evaluate, search_space)
+    rstate = np.random.default_rng(seed)
     trials = Trials()
-    best_result = fmin(
-        fn=objective,
-        space=search_space,
-        algo=tpe.suggest,
-        max_evals=50,
-        trials=trials,
+
+    def submit(doc, extra_params):
+        doc['state'] = base.JOB_STATE_RUNNING
+        doc['book_time'] = coarse_utcnow()
+        trial_args = {**trial_params(doc, search_space), **(extra_params or {})}
+        return executor.submit(evaluate, trial_args)
+
+    startup = [
+        suggest_trial(trials, domain, rstate)
+        for _ in range(min(N_STARTUP_JOBS, max_evals))
+    ]
+    pending = {submit(doc, startup_params): doc for doc in startup}
+    for future in futures.as_completed(pending):
+        record_trial(trials, pending[future], future.result())
+        if on_result:
+            on_result(pending[future]['result'])
+
+    for _ in range(len(startup), max_evals):
+        doc = suggest_trial(trials, domain, rstate)
+        record_trial(trials, doc, submit(doc, params).result())
+        if on_result:
+            on_result(doc['result'])
+    return trials
+
+
+def best_trial(trials):
+    """The successful trial with the lowest loss; ties go to the earliest one."""
+    return min(
+        (trial for trial in trials.trials if trial['result']['status'] == STATUS_OK),
+        key=lambda trial: (trial['result']['loss'], trial['tid']),
     )
-    best_auc = max(trial['result']['auc_value'] for trial in trials.trials)
+
+
+@task(log_prints=True)
+def hyperopt_train(  # pylint: disable=too-many-arguments
+    dtrain, dval, *, max_evals=50, seed=42, workers=1, threads_per_trial=None
+):
+    """
+    Use Hyperopt to optimize XGBoost hyperparameters.
+
+    With ``workers`` above 1 the search runs on a local process pool (see
+    ``parallel_search``) and each concurrent trial trains with
+    ``threads_per_trial`` xgboost threads, by default an equal share of the
+    CPUs. Every trial logs its own MLflow run, and the best run is picked from
+    this search's trials only, so both modes return the same run for a fixed
+    ``seed`` and ``max_evals``.
+
+    :param max_evals: int, The number of trials.
+    :param seed: int, Seed of the TPE suggestions.
+    :param workers: int, The number of trials run concurrently.
+    :param threads_per_trial: int, xgboost threads of each concurrent trial.
+    :return: tuple, The optimal parameters and the run ID of the best model.
+    """
+
+    def objective(params):
+        """Objective function for Hyperopt's fmin function."""
+        result = train_trial(params, dtrain, dval)
+        log_auc_report(result['auc_value'])
+        return result
+
+    def on_result(result):
+        log_auc_report(result['auc_value'])
+
+    # Use fmin function from Hyperopt to find the best hyperparameters
+    print("Starting hyperparameter optimization...")
+    if workers > 1:
+        threads_per_trial = threads_per_trial or max(
+            1, (os.cpu_count() or 1) // workers
+        )
+        # Spawned workers do not inherit the experiment the caller set with
+        # mlflow.set_experiment, so its ID is passed to them
+        experiment_id = (
+            mlflow.tracking.fluent._get_experiment_id()  # pylint: disable=protected-access
+        )
+        print(
+            f"Running trials on {workers} worker processes with "
+            f"{threads_per_trial} xgboost threads each..."
+        )
+        with futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_trial_worker,
+            initargs=(
+                matrix_payload(dtrain),
+                matrix_payload(dval),
+                mlflow.get_tracking_uri(),
+                experiment_id,
+            ),
+        ) as executor:
+            trials = parallel_search(
+                run_trial,
+                SEARCH_SPACE,
+                max_evals,
+                executor,
+                seed=seed,
+                startup_params={'nthread': threads_per_trial},
+                params={'nthread': threads_per_trial * workers},
+                on_result=on_result,
+            )
+    else:
+        trials = Trials()
+        fmin(
+            fn=objective,
+            space=SEARCH_SPACE,
+            algo=tpe.suggest,
+            max_evals=max_evals,
+            trials=trials,
+            rstate=np.random.default_rng(seed),
+        )
+
+    best = best_trial(trials)
+    best_auc = best['result']['auc_value']
 
     # Log the best AUC achieved during hyperparameter optimization
     print(f"Best AUC achieved during optimization: {best_auc}")
 
     # Extract the optimal parameters and the run_id of the best model
-    optimal_params = space_eval(search_space, best_result)
-
-    # After the hyperparameter optimization
-    client = mlflow.tracking.MlflowClient()
-    MLFLOW_EXPERIMENT_NAME = os.environ.get("MLFLOW_EXPERIMENT_NAME")
-    if not MLFLOW_EXPERIMENT_NAME:
-        raise ValueError("MLFLOW_EXPERIMENT_NAME environment variable is not set!")
-    experiment_id = client.get_experiment_by_name(MLFLOW_EXPERIMENT_NAME).experiment_id
-
-    best_run = client.search_runs(
-        experiment_ids=[experiment_id],
-        filter_string="",
-        order_by=["metric.auc DESC"],
-        max_results=1,
-    )[0]
-    best_run_id = best_run.info.run_id
+    optimal_params = trial_params(best, SEARCH_SPACE)
+    best_run_id = best['result']['run_id']
 
     # Log the best run ID
     print(f"Best run ID: {best_run_id}")
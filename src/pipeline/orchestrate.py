@@ -8,7 +8,14 @@ import mlflow
 from prefect import flow
 
 # from prefect_aws import S3Bucket
-from data_ingestion import read_data, download_from_url_to_path  # load_data_from_s3
+from data_ingestion import read_data, download_urls  # load_data_from_s3
+from model_export import export_lookup_grid, export_tree_arrays
+from dataset_cache import (
+    dataset_fingerprint,
+    clear_dataset_cache,
+    load_cached_dataset,
+    save_cached_dataset,
+)
 from model_registry import register_model_in_mlflow
 from model_training import hyperopt_train
 
@@ -21,16 +28,20 @@ from data_preprocessing import (
 
 
 @flow
-def main_flow_s3(config_path):
+def main_flow_s3(config_path, refresh_cache=False, workers=1):
     """
     Main Prefect flow for orchestrating the training pipeline.
 
     This flow:
     1. Sets up MLflow tracking.
-    2. Loads data from an S3 bucket.
-    3. Reads and preprocesses the data.
+    2. Downloads the data files concurrently, skipping unchanged ones.
+    3. Loads the processed shot data from the dataset cache, or reads and
+       transforms the raw data and caches the result.
     4. Splits the data into training, validation, and test sets.
-    5. Trains a model using hyperparameter optimization.
+    5. Trains a model using hyperparameter optimization, running trials on
+       ``workers`` processes when it is above 1.
+    6. Exports the best model as NumPy tree arrays and a lookup grid, then
+       registers it.
     """
 
     print("Setting up MLflow tracking...")
@@ -57,17 +68,24 @@ def main_flow_s3(config_path):
     if not urls:
         raise ValueError("S3_PRESIGNED_URLS are not provided in the config!")
 
-    # Loop through the URLs and download each one
-    for url in urls:
-        download_from_url_to_path(url)
+    # Download the URLs concurrently, skipping files that are already current
+    download_urls(urls, data_path)
+
+    # Reuse the processed shot data if the raw files and feature code are unchanged.
+    if refresh_cache:
+        clear_dataset_cache()
+    fingerprint = dataset_fingerprint(data_path)
+    shot_data = load_cached_dataset(fingerprint)
 
-    # Read the raw data from the downloaded path.
-    print("Reading raw data...")
-    raw_data = read_data(data_path)
+    if shot_data is None:
+        # Read the raw data from the downloaded path.
+        print("Reading raw data...")
+        raw_data = read_data(data_path, stream=True)
 
-    # Filter and transform the raw data to retain only shot events.
-    print("Filtering and transforming raw data...")
-    shot_data = filter_and_transform_shot_data(raw_data)
+        # Filter and transform the raw data to retain only shot events.
+        print("Filtering and transforming raw data...")
+        shot_data = filter_and_transform_shot_data(raw_data)
+        save_cached_dataset(shot_data, fingerprint)
 
     # Split the data into training, validation, and test sets.
     print("Splitting data into training, validation, and test sets...")
@@ -81,7 +99,15 @@ def main_flow_s3(config_path):
 
     # Train the model using hyperparameter optimization with Hyperopt.
     print("Training model using hyperparameter optimization...")
-    _, best_run_id = hyperopt_train(dtrain, dval)
+    _, best_run_id = hyperopt_train(dtrain, dval, workers=workers)
+
+    # Export the best booster as flat tree arrays for the NumPy serving engine.
+    print("Exporting the best model as NumPy tree arrays...")
+    export_tree_arrays(best_run_id)
+
+    # Precompute the model's response surface for the lookup-grid serving mode.
+    print("Exporting the lookup grid of the best model...")
+    export_lookup_grid(best_run_id)
 
     # Register the best model in MLflow Model Registry.
     print("Registering the best model in MLflow Model Registry....")
@@ -96,5 +122,18 @@ if __name__ == "__main__":
         '--config', required=True, help="Path to the configuration file"
     )
 
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help="Clear the processed dataset cache before running",
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Number of hyperparameter trials to run in parallel",
+    )
+
     args = parser.parse_args()
-    main_flow_s3(args.config)
+    main_flow_s3(args.config, args.refresh_cache, args.workers)
@@ -4,4 +4,7 @@ DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 source "$DIR/../../config.env"
 CONFIG_PATH="$DIR/../../config.json"
 
+# Shared serving modules (e.g. tree_engine.py) live in the project root
+export PYTHONPATH="$DIR/../..${PYTHONPATH:+:$PYTHONPATH}"
+
 python src/pipeline/orchestrate.py --config "$CONFIG_PATH"
@@ -0,0 +1,208 @@
+import io
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import model
+from artifact_cache import ArtifactCache
+
+
+class S3Stub:
+    """In-memory bucket that counts downloads."""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.downloads = []
+
+    def etag(self, key):
+        return '"' + hashlib.md5(self.objects[key]).hexdigest() + '"'
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {
+            'Contents': [
+                {'Key': key, 'ETag': self.etag(key), 'Size': len(data)}
+                for key, data in sorted(self.objects.items())
+                if key.startswith(Prefix)
+            ]
+        }
+
+    def head_object(self, Bucket, Key):
+        return {'ETag': self.etag(Key)}
+
+    def download_file(self, bucket, key, path):
+        self.downloads.append(key)
+        with open(path, 'wb') as f_out:
+            f_out.write(self.objects[key])
+
+
+MODEL_PREFIX = '1/run-a/artifacts/model'
+
+
+def model_objects(run_id='run-a', payload=b'booster'):
+    prefix = f'1/{run_id}/artifacts/model'
+    return {
+        f'{prefix}/MLmodel': b'flavors: {}',
+        f'{prefix}/model.xgb': payload,
+        f'{prefix}/reference_data.parquet': b'parquet' * 10,
+        f'{prefix}/reference_profile.json': b'{}',
+        f'{prefix}/model_trees.npz': b'trees',
+        f'{prefix}/model_grid.npz': b'grid',
+    }
+
+
+def test_fetch_directory_downloads_once(tmp_path):
+    s3 = S3Stub(model_objects())
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+
+    local_dir = cache.fetch_directory(f's3://xgoals/{MODEL_PREFIX}', 'run-a')
+    assert len(s3.downloads) == 6
+    with open(os.path.join(local_dir, 'model.xgb'), 'rb') as f_in:
+        assert f_in.read() == b'booster'
+
+    # A second container start on the same host reuses the verified files
+    again = ArtifactCache(root=str(tmp_path), s3=s3)
+    assert again.fetch_directory(f's3://xgoals/{MODEL_PREFIX}/', 'run-a') == local_dir
+    assert len(s3.downloads) == 6
+    assert again.stats()['hits'] == 6
+
+
+def test_changed_or_corrupted_objects_are_downloaded_again(tmp_path):
+    s3 = S3Stub(model_objects())
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+    local_dir = cache.fetch_directory(f's3://xgoals/{MODEL_PREFIX}', 'run-a')
+
+    s3.objects[f'{MODEL_PREFIX}/model.xgb'] = b'retrained booster'
+    with open(os.path.join(local_dir, 'MLmodel'), 'wb') as f_out:
+        f_out.write(b'truncat')
+    s3.downloads.clear()
+
+    cache.fetch_directory(f's3://xgoals/{MODEL_PREFIX}', 'run-a')
+
+    assert sorted(s3.downloads) == [
+        f'{MODEL_PREFIX}/MLmodel',
+        f'{MODEL_PREFIX}/model.xgb',
+    ]
+    with open(os.path.join(local_dir, 'model.xgb'), 'rb') as f_in:
+        assert f_in.read() == b'retrained booster'
+
+
+def test_checksum_mismatch_leaves_no_file(tmp_path):
+    s3 = S3Stub(model_objects())
+    key = f'{MODEL_PREFIX}/model.xgb'
+    s3.etag = lambda key: '"' + hashlib.md5(b'something else').hexdigest() + '"'
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+
+    with pytest.raises(IOError):
+        cache.fetch(f's3://xgoals/{key}', 'run-a')
+
+    directory = tmp_path / 'run-a' / MODEL_PREFIX
+    assert not list(directory.iterdir())
+
+
+def test_least_recently_used_runs_are_evicted(tmp_path):
+    s3 = S3Stub({**model_objects('run-a'), **model_objects('run-b', b'x' * 100)})
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+
+    cache.fetch_directory('s3://xgoals/1/run-a/artifacts/model', 'run-a')
+    os.utime(tmp_path / 'run-a', (0, 0))
+    cache.max_bytes = 10 * cache.run_size('run-a')
+    cache.fetch_directory('s3://xgoals/1/run-b/artifacts/model', 'run-b')
+    assert (tmp_path / 'run-a').exists()
+
+    cache.max_bytes = cache.run_size('run-b')
+    cache.evict(keep='run-b')
+
+    assert not (tmp_path / 'run-a').exists()
+    assert (tmp_path / 'run-b').exists()
+    assert cache.stats()['evictions'] == 1
+
+
+def test_local_paths_are_returned_unchanged(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path), s3=S3Stub({}))
+
+    assert cache.fetch_directory('/app/model', 'run-a') == '/app/model'
+    assert cache.fetch('/app/model/model.xgb', 'run-a') == '/app/model/model.xgb'
+
+
+@pytest.mark.parametrize(
+    'model_engine, drift_engine, expected',
+    [
+        ('numpy', 'sketch', ['model_trees.npz', 'reference_profile.json']),
+        ('grid', 'evidently', ['model_grid.npz', 'reference_data.parquet']),
+        ('pyfunc', 'sketch', ['MLmodel', 'model.xgb', 'reference_profile.json']),
+    ],
+)
+def test_only_artifacts_the_engines_need_are_fetched(
+    tmp_path, model_engine, drift_engine, expected
+):
+    s3 = S3Stub(model_objects())
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+
+    local_dir = model.fetch_model_artifacts(
+        cache, f's3://xgoals/{MODEL_PREFIX}', 'run-a', model_engine, drift_engine
+    )
+
+    assert sorted(os.path.basename(key) for key in s3.downloads) == sorted(expected)
+    for name in expected:
+        assert os.path.exists(os.path.join(local_dir, name))
+
+
+@pytest.mark.parametrize(
+    'model_engine, expected',
+    [
+        ('numpy', ['model_trees.npz', 'reference_data.parquet']),
+        ('pyfunc', ['MLmodel', 'model.xgb', 'reference_data.parquet']),
+    ],
+)
+def test_runs_without_profile_fetch_reference_data(tmp_path, model_engine, expected):
+    objects = model_objects()
+    del objects[f'{MODEL_PREFIX}/reference_profile.json']
+    s3 = S3Stub(objects)
+    cache = ArtifactCache(root=str(tmp_path), s3=s3)
+
+    local_dir = model.fetch_model_artifacts(
+        cache, f's3://xgoals/{MODEL_PREFIX}', 'run-a', model_engine, 'sketch'
+    )
+
+    assert sorted(os.path.basename(key) for key in s3.downloads) == sorted(expected)
+    assert os.path.exists(os.path.join(local_dir, 'reference_data.parquet'))
+
+
+class ConstantModel:
+    accepts_columns = True
+
+    def predict(self, X):
+        return np.full(len(X['distance_to_goal']), 0.1)
+
+
+def test_load_run_without_profile_reads_cached_reference_data(tmp_path, monkeypatch):
+    grid_path = tmp_path / 'model_grid.npz'
+    model.LookupGridModel.build(ConstantModel(), 5, 5).save(str(grid_path))
+    reference = pd.DataFrame({'label': [0.0, 1.0]})
+    parquet = io.BytesIO()
+    reference.to_parquet(parquet)
+    s3 = S3Stub(
+        {
+            f'{MODEL_PREFIX}/model_grid.npz': grid_path.read_bytes(),
+            f'{MODEL_PREFIX}/reference_data.parquet': parquet.getvalue(),
+        }
+    )
+    cache = ArtifactCache(root=str(tmp_path / 'cache'), s3=s3)
+    monkeypatch.setattr(model, 'create_artifact_cache', lambda: cache)
+    monkeypatch.delenv('MODEL_LOCATION', raising=False)
+    monkeypatch.setenv('MODEL_BUCKET', 'xgoals')
+    monkeypatch.setenv('MLFLOW_EXPERIMENT_ID', '1')
+    monkeypatch.setenv('MODEL_ENGINE', 'grid')
+    monkeypatch.setenv('DRIFT_ENGINE', 'sketch')
+
+    serving_model, reference_data = model.load_model_and_reference_data('run-a')
+
+    assert isinstance(serving_model, model.LookupGridModel)
+    pd.testing.assert_frame_equal(reference_data, reference)
@@ -0,0 +1,243 @@
+import os
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pandas as pd
+import pytest
+
+from src.pipeline import data_ingestion
+from src.pipeline.data_ingestion import (
+    META_SUFFIX,
+    PART_SUFFIX,
+    read_data,
+    download_file,
+    download_urls,
+)
+from src.pipeline.data_preprocessing import filter_and_transform_shot_data
+
+PAYLOAD = b'{"events": [' + b', '.join(b'{"id": %d}' % i for i in range(20000)) + b']}'
+ETAG = '"v1"'
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with ETag, If-None-Match and Range/If-Range support."""
+
+    failures = 0
+    truncate = False
+    requests = []
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        cls = type(self)
+        cls.requests.append(dict(self.headers))
+        if cls.failures:
+            cls.failures -= 1
+            self.send_error(503)
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body, status = PAYLOAD, 200
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == ETAG:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            if start >= len(PAYLOAD):
+                # S3 answers a range past the end with 416
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(PAYLOAD)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body, status = PAYLOAD[start:], 206
+
+        self.send_response(status)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if cls.truncate:
+            # Drop the connection half-way through the body
+            cls.truncate = False
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(name="url")
+def fixture_url():
+    FileHandler.failures = 0
+    FileHandler.truncate = False
+    FileHandler.requests = []
+    server = HTTPServer(('127.0.0.1', 0), FileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/events.json?X-Amz-Signature=abc"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_file_writes_payload_and_meta(url, tmpdir):
+    path = download_file(url, tmpdir.strpath)
+
+    assert os.path.basename(path) == 'events.json'
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert os.path.exists(path + META_SUFFIX)
+    assert not os.path.exists(path + PART_SUFFIX)
+
+
+def test_download_file_skips_current_copy(url, tmpdir, monkeypatch):
+    path = download_file(url, tmpdir.strpath)
+    mtime = os.path.getmtime(path)
+
+    # The checksum comes from the sidecar while the file is unchanged
+    monkeypatch.setattr(data_ingestion, 'file_sha256', None)
+    download_file(url, tmpdir.strpath)
+
+    assert FileHandler.requests[-1]['If-None-Match'] == ETAG
+    assert os.path.getmtime(path) == mtime
+
+
+def test_download_file_refetches_modified_copy(url, tmpdir):
+    path = download_file(url, tmpdir.strpath)
+    with open(path, 'ab') as f:
+        f.write(b'corrupted')
+
+    download_file(url, tmpdir.strpath)
+
+    assert 'If-None-Match' not in FileHandler.requests[-1]
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_download_file_resumes_partial_download(url, tmpdir):
+    FileHandler.truncate = True
+
+    path = download_file(url, tmpdir.strpath, backoff=0)
+
+    # Only whole chunks of the truncated body reached the partial file
+    resumed = FileHandler.requests[-1]
+    assert resumed['Range'].startswith('bytes=')
+    assert resumed['Range'] != 'bytes=0-'
+    assert resumed['If-Range'] == ETAG
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def write_part(directory, payload):
+    part_path = os.path.join(directory, 'events.json' + PART_SUFFIX)
+    with open(part_path, 'wb') as f:
+        f.write(payload)
+    with open(part_path + META_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump({'etag': ETAG}, f)
+    return part_path
+
+
+def test_download_file_finalizes_complete_part_on_416(url, tmpdir):
+    part_path = write_part(tmpdir.strpath, PAYLOAD)
+
+    path = download_file(url, tmpdir.strpath, retries=0)
+
+    assert len(FileHandler.requests) == 1
+    assert FileHandler.requests[0]['Range'] == f'bytes={len(PAYLOAD)}-'
+    assert not os.path.exists(part_path)
+    assert not os.path.exists(part_path + META_SUFFIX)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+    # The finalized copy is current afterwards
+    download_file(url, tmpdir.strpath, retries=0)
+    assert FileHandler.requests[-1]['If-None-Match'] == ETAG
+
+
+def test_download_file_restarts_unresumable_part(url, tmpdir):
+    part_path = write_part(tmpdir.strpath, PAYLOAD + b'stale tail')
+
+    path = download_file(url, tmpdir.strpath, retries=0)
+
+    assert 'Range' in FileHandler.requests[0]
+    assert 'Range' not in FileHandler.requests[1]
+    assert not os.path.exists(part_path)
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+
+
+def test_download_file_retries_and_gives_up(url, tmpdir):
+    FileHandler.failures = 2
+    download_file(url, tmpdir.strpath, retries=2, backoff=0)
+    assert len(FileHandler.requests) == 3
+
+    FileHandler.failures = 5
+    with pytest.raises(Exception):
+        download_file(url, os.path.join(tmpdir.strpath, 'other'), backoff=0)
+
+
+def test_download_urls_keeps_order(url, tmpdir):
+    base = url.split('/events.json')[0]
+    urls = [f"{base}/part_{i}.json?X-Amz-Signature=abc" for i in range(6)]
+
+    paths = download_urls.fn(urls, tmpdir.strpath, max_workers=3)
+
+    assert [os.path.basename(path) for path in paths] == [
+        f"part_{i}.json" for i in range(6)
+    ]
+
+
+def make_events(count):
+    events = []
+    for i in range(count):
+        sub_event = 'Shot' if i % 3 == 0 else 'Simple pass'
+        events.append(
+            {
+                'eventId': i,
+                'subEventName': sub_event,
+                'eventName': 'Shot, "]" [x]' if sub_event == 'Shot' else 'Pass',
+                'positions': [{'y': 30 + i % 40, 'x': 60 + i % 39}, {'y': 0, 'x': 0}],
+                'tags': [{'id': 101}] if i % 9 == 0 else [{'id': 1801}],
+            }
+        )
+    return events
+
+
+def write_events(directory, count=2):
+    for i in range(count):
+        with open(
+            os.path.join(directory, f"events_{i}.json"), 'w', encoding='utf-8'
+        ) as f:
+            json.dump(make_events(300 + i), f, indent=1)
+
+
+def test_read_data_stream_keeps_only_shot_fields(tmpdir):
+    write_events(tmpdir.strpath)
+
+    result = read_data.fn(tmpdir.strpath, stream=True, chunk_size=97)
+
+    assert list(result.columns) == ['subEventName', 'positions', 'tags']
+    assert (result['subEventName'] == 'Shot').all()
+    assert len(result) == 100 + 101
+
+
+def test_read_data_stream_matches_full_read(tmpdir):
+    write_events(tmpdir.strpath)
+
+    full = filter_and_transform_shot_data.fn(read_data.fn(tmpdir.strpath))
+    streamed = filter_and_transform_shot_data.fn(
+        read_data.fn(tmpdir.strpath, stream=True, chunk_size=64)
+    )
+
+    pd.testing.assert_frame_equal(
+        full.reset_index(drop=True), streamed.reset_index(drop=True)
+    )
+
+
+def test_read_data_stream_rejects_non_array(tmpdir):
+    with open(os.path.join(tmpdir.strpath, 'events.json'), 'w', encoding='utf-8') as f:
+        f.write('{"key": ["value1", "value2"]}')
+
+    with pytest.raises(ValueError):
+        read_data.fn(tmpdir.strpath, stream=True)
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+# The pipeline modules import each other as top-level modules
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src', 'pipeline')
+)
+
+# pylint: disable=wrong-import-position,import-error
+from dataset_cache import (
+    cache_path,
+    clear_dataset_cache,
+    dataset_fingerprint,
+    load_cached_dataset,
+    save_cached_dataset,
+)
+
+
+def write_raw(directory, name, events):
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        json.dump(events, f)
+
+
+def make_shots(rows=50):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            'distance_to_goal': rng.uniform(2, 40, rows),
+            'angle_to_goal': rng.uniform(0.05, 1.5, rows),
+            'is_goal': rng.integers(0, 2, rows),
+        },
+        index=rng.permutation(rows) * 7,
+    )
+
+
+def test_fingerprint_tracks_raw_files_and_feature_version(tmpdir):
+    raw_dir = tmpdir.strpath
+    write_raw(raw_dir, 'events_a.json', [{'subEventName': 'Shot'}])
+    fingerprint = dataset_fingerprint(raw_dir)
+
+    assert dataset_fingerprint(raw_dir) == fingerprint
+    assert dataset_fingerprint(raw_dir, feature_version=-1) != fingerprint
+
+    write_raw(raw_dir, 'events_a.json', [{'subEventName': 'Free kick'}])
+    assert dataset_fingerprint(raw_dir) != fingerprint
+
+    changed = dataset_fingerprint(raw_dir)
+    write_raw(raw_dir, 'events_b.json', [])
+    assert dataset_fingerprint(raw_dir) != changed
+
+
+def test_cached_dataset_round_trip(tmpdir):
+    cache_dir = tmpdir.strpath
+    shots = make_shots()
+
+    assert load_cached_dataset.fn('abc' * 20, cache_dir) is None
+    save_cached_dataset.fn(shots, 'abc' * 20, cache_dir)
+    cached = load_cached_dataset.fn('abc' * 20, cache_dir)
+
+    pd.testing.assert_frame_equal(cached, shots.reset_index(drop=True))
+
+
+def test_unreadable_cache_entry_is_a_miss(tmpdir):
+    cache_dir = tmpdir.strpath
+    with open(cache_path('f' * 64, cache_dir), 'wb') as f:
+        f.write(b'not parquet')
+
+    assert load_cached_dataset.fn('f' * 64, cache_dir) is None
+
+
+def test_clear_dataset_cache(tmpdir):
+    cache_dir = os.path.join(tmpdir.strpath, 'processed')
+    save_cached_dataset.fn(make_shots(), 'e' * 64, cache_dir)
+
+    clear_dataset_cache(cache_dir)
+
+    assert load_cached_dataset.fn('e' * 64, cache_dir) is None
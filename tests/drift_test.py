@@ -0,0 +1,113 @@
+import numpy as np
+
+from drift import DriftEngine, ColumnSketch, ks_p_value
+
+
+def reference_columns(n=800, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'distance_to_goal': rng.gamma(4, 4, n),
+        'angle_to_goal': rng.uniform(0.1, 1.5, n),
+        'prediction': rng.beta(1, 8, n),
+    }
+
+
+def test_sketch_merge_matches_single_update():
+    values = np.random.default_rng(1).normal(20, 5, 1000)
+    reference = ColumnSketch.from_values(values)
+
+    merged = reference.empty_like()
+    for chunk in np.array_split(values, 7):
+        part = reference.empty_like()
+        part.update(chunk)
+        merged.merge(part)
+
+    single = reference.empty_like()
+    single.update(values)
+
+    np.testing.assert_array_equal(merged.counts, single.counts)
+    assert merged.count == single.count == 1000
+    assert merged.min == values.min()
+    assert merged.max == values.max()
+
+
+def test_sketch_quantile_and_missing():
+    values = np.random.default_rng(2).gamma(4, 4, 5000)
+    sketch = ColumnSketch.from_values(values)
+    sketch.update([np.nan, np.nan])
+
+    assert sketch.missing == 2
+    assert abs(sketch.quantile(0.5) - np.median(values)) < 0.5
+
+
+def test_sketch_round_trip():
+    sketch = ColumnSketch.from_values([1.0, 2.0, np.nan, 4.0], bins=4)
+
+    restored = ColumnSketch.from_dict(sketch.to_dict())
+
+    np.testing.assert_array_equal(restored.counts, sketch.counts)
+    assert restored.missing == 1
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+
+def test_ks_p_value_bounds():
+    assert ks_p_value(0.0, 100, 100) == 1.0
+    assert ks_p_value(0.5, 1000, 1000) < 1e-6
+
+
+def test_engine_detects_shifted_distance():
+    engine = DriftEngine.from_columns(reference_columns())
+    current = reference_columns(n=200, seed=3)
+    current['distance_to_goal'] = current['distance_to_goal'] + 10
+
+    engine.update(current)
+    metrics = engine.evaluate(engine.take_window())
+
+    assert metrics['num_drifted_columns'] >= 1
+    assert metrics['prediction_drift'] > 0.05
+    assert metrics['share_missing_values'] == 0.0
+    assert (
+        abs(
+            metrics['distance_to_goal_quantile']
+            - np.median(current['distance_to_goal'])
+        )
+        < 1.0
+    )
+
+
+def test_engine_window_is_updated_incrementally():
+    engine = DriftEngine.from_columns(reference_columns())
+    engine.update(
+        {
+            'distance_to_goal': [10.0, np.nan],
+            'angle_to_goal': [0.5, 0.4],
+            'prediction': [0.1, 0.2],
+        }
+    )
+    engine.update(
+        {'distance_to_goal': [12.0], 'angle_to_goal': [None], 'prediction': [0.3]}
+    )
+
+    window = engine.take_window()
+    metrics = engine.evaluate(window)
+
+    assert window.rows == 3
+    assert engine.window.rows == 0
+    assert metrics['share_missing_values'] == 2 / 9
+
+
+def test_engine_without_reference_columns():
+    engine = DriftEngine.from_columns({})
+    engine.update(
+        {
+            'distance_to_goal': [8.0, 12.0],
+            'angle_to_goal': [0.5, 0.4],
+            'prediction': [0.1, 0.2],
+        }
+    )
+
+    metrics = engine.evaluate()
+
+    assert metrics['prediction_drift'] is None
+    assert metrics['num_drifted_columns'] == 0
+    assert 8.0 <= metrics['distance_to_goal_quantile'] <= 12.0
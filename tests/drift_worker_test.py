@@ -0,0 +1,70 @@
+import threading
+
+from drift_worker import DriftWorker
+
+
+def test_worker_processes_jobs_in_background():
+    results = []
+    worker = DriftWorker()
+
+    for i in range(3):
+        assert worker.submit(lambda i=i: results.append(i))
+
+    assert worker.flush(timeout=5)
+    assert results == [0, 1, 2]
+    assert worker.stats() == {
+        'queue_depth': 0,
+        'dropped_windows': 0,
+        'processed_windows': 3,
+        'failed_windows': 0,
+    }
+    worker.stop(timeout=5)
+
+
+def test_worker_drops_windows_when_queue_is_full():
+    release = threading.Event()
+    started = threading.Event()
+    worker = DriftWorker(max_queue_size=1)
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+
+    worker.submit(blocking_job)
+    started.wait(5)
+    assert worker.submit(lambda: None)  # fills the queue
+    assert not worker.submit(lambda: None)
+
+    assert worker.stats()['queue_depth'] == 1
+    assert worker.stats()['dropped_windows'] == 1
+
+    release.set()
+    assert worker.flush(timeout=5)
+    worker.stop(timeout=5)
+
+
+def test_worker_counts_failed_jobs():
+    worker = DriftWorker()
+
+    def failing_job():
+        raise RuntimeError("database unreachable")
+
+    worker.submit(failing_job)
+    worker.submit(lambda: None)
+
+    assert worker.flush(timeout=5)
+    assert worker.stats()['failed_windows'] == 1
+    assert worker.stats()['processed_windows'] == 1
+    worker.stop(timeout=5)
+
+
+def test_flush_times_out_on_stuck_job():
+    release = threading.Event()
+    worker = DriftWorker()
+    worker.submit(lambda: release.wait(5))
+
+    assert not worker.flush(timeout=0.05)
+
+    release.set()
+    assert worker.flush(timeout=5)
+    worker.stop(timeout=5)
@@ -0,0 +1,64 @@
+import io
+import json
+
+from instrumentation import (
+    NULL_RECORD,
+    EMFExporter,
+    MemoryExporter,
+    Instrumentation,
+    create_instrumentation,
+)
+
+
+def test_record_accumulates_stages_and_counters():
+    exporter = MemoryExporter()
+    instrumentation = Instrumentation(exporter)
+
+    with instrumentation.record() as record:
+        for _ in range(2):
+            with record.stage('score'):
+                pass
+        record.count('records', 3)
+        record.count('records')
+        record.set('buffer_size', 7)
+
+    assert len(exporter.records) == 1
+    exported = exporter.records[0]
+    assert exported['operation'] == 'invocation'
+    assert set(exported['timings']) == {'score', 'total'}
+    assert exported['timings']['total'] >= exported['timings']['score'] >= 0
+    assert exported['counters'] == {'records': 4, 'buffer_size': 7}
+
+
+def test_emf_exporter_writes_cloudwatch_metrics():
+    stream = io.StringIO()
+    instrumentation = Instrumentation(EMFExporter(namespace='test', stream=stream))
+
+    with instrumentation.record('drift_window') as record:
+        with record.stage('db_insert'):
+            pass
+        record.set('records', 10)
+
+    line = json.loads(stream.getvalue())
+    [directive] = line['_aws']['CloudWatchMetrics']
+    assert directive['Namespace'] == 'test'
+    assert directive['Dimensions'] == [['Operation']]
+    units = {metric['Name']: metric['Unit'] for metric in directive['Metrics']}
+    assert units == {
+        'db_insert_us': 'Microseconds',
+        'total_us': 'Microseconds',
+        'records': 'Count',
+    }
+    assert line['Operation'] == 'drift_window'
+    assert line['records'] == 10
+
+
+def test_disabled_instrumentation_is_a_no_op():
+    instrumentation = create_instrumentation('off')
+
+    with instrumentation.record() as record:
+        with record.stage('score'):
+            record.count('records', 3)
+
+    assert not instrumentation.enabled
+    assert record is NULL_RECORD
@@ -0,0 +1,116 @@
+import json
+
+import model
+
+
+class KinesisClientStub:
+    """Records PutRecords calls and rejects the queued partition keys once each."""
+
+    def __init__(self, reject=(), fail_calls=0):
+        self.calls = []
+        self.reject = set(reject)
+        self.fail_calls = fail_calls
+
+    def put_records(self, StreamName, Records):
+        self.calls.append((StreamName, [r['PartitionKey'] for r in Records]))
+        if self.fail_calls:
+            self.fail_calls -= 1
+            raise ConnectionError('stream unavailable')
+        results = []
+        for record in Records:
+            if record['PartitionKey'] in self.reject:
+                self.reject.discard(record['PartitionKey'])
+                results.append(
+                    {
+                        'ErrorCode': 'ProvisionedThroughputExceededException',
+                        'ErrorMessage': 'Rate exceeded',
+                    }
+                )
+            else:
+                results.append({'SequenceNumber': '1', 'ShardId': 'shard-0'})
+        failed = sum('ErrorCode' in result for result in results)
+        return {'FailedRecordCount': failed, 'Records': results}
+
+
+def prediction_event(shot_id):
+    return {
+        'model': 'xgoals_prediction_model',
+        'version': 'Test123',
+        'prediction': {'shot_xgoals': 0.1, 'shot_id': shot_id},
+    }
+
+
+def test_flush_sends_one_request():
+    client = KinesisClientStub()
+    publisher = model.KinesisBatchPublisher(client, 'predictions')
+
+    for shot_id in range(3):
+        publisher(prediction_event(shot_id))
+
+    assert not publisher.flush()
+    assert client.calls == [('predictions', ['0', '1', '2'])]
+    assert not publisher.pending
+
+
+def test_flush_chunks_by_count_and_size():
+    client = KinesisClientStub()
+    publisher = model.KinesisBatchPublisher(client, 'predictions')
+    publisher.max_records = 2
+
+    for shot_id in range(5):
+        publisher(prediction_event(shot_id))
+    publisher.flush()
+
+    assert [keys for _, keys in client.calls] == [['0', '1'], ['2', '3'], ['4']]
+
+    record_bytes = len(json.dumps(prediction_event(0)).encode()) + 1
+    client.calls.clear()
+    publisher.max_records = 500
+    publisher.max_request_bytes = record_bytes * 2
+    for shot_id in range(3):
+        publisher(prediction_event(shot_id))
+    publisher.flush()
+
+    assert [keys for _, keys in client.calls] == [['0', '1'], ['2']]
+
+
+def test_flush_retries_only_failed_records():
+    client = KinesisClientStub(reject={'1'})
+    sleeps = []
+    publisher = model.KinesisBatchPublisher(
+        client, 'predictions', backoff_seconds=0.5, sleep=sleeps.append
+    )
+
+    for shot_id in range(3):
+        publisher(prediction_event(shot_id))
+
+    assert not publisher.flush()
+    assert [keys for _, keys in client.calls] == [['0', '1', '2'], ['1']]
+    assert sleeps == [0.5]
+
+
+def test_flush_returns_records_that_keep_failing():
+    client = KinesisClientStub(fail_calls=10)
+    sleeps = []
+    publisher = model.KinesisBatchPublisher(
+        client, 'predictions', max_retries=2, sleep=sleeps.append
+    )
+
+    publisher(prediction_event(7))
+    failed = publisher.flush()
+
+    assert len(client.calls) == 3
+    assert sleeps == [0.1, 0.2]
+    assert failed == [
+        {
+            'PartitionKey': '7',
+            'ErrorCode': 'ConnectionError',
+            'ErrorMessage': 'stream unavailable',
+        }
+    ]
+    assert publisher.failed_count == 1
+
+    # Only a count is kept across warm invocations, not the records
+    publisher(prediction_event(8))
+    publisher.flush()
+    assert publisher.failed_count == 2
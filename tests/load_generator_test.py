@@ -0,0 +1,158 @@
+import json
+import base64
+import threading
+from pathlib import Path
+
+import pytest
+
+from scripts.load_generator import (
+    Results,
+    EventFactory,
+    InProcessTarget,
+    run_open_loop,
+    run_closed_loop,
+    load_shot_events,
+    synthetic_shot_events,
+)
+
+
+class StubTarget:
+    """Answers every batch, failing its first record; optionally raises."""
+
+    def __init__(self, error=None, every=None):
+        self.events = []
+        self.error = error
+        self.every = every
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.events.append(event)
+            calls = len(self.events)
+        if self.error is not None and calls % self.every == 0:
+            raise self.error
+        first = event['Records'][0]['kinesis']['sequenceNumber']
+        return {'predictions': [], 'batchItemFailures': [{'itemIdentifier': first}]}
+
+
+def decode(record):
+    return json.loads(base64.b64decode(record['kinesis']['data']))
+
+
+def test_event_factory_cycles_through_shot_events():
+    shot_events = synthetic_shot_events(3)
+    factory = EventFactory(shot_events, batch_size=2)
+
+    first = factory.next_event()['Records']
+    second = factory.next_event()['Records']
+
+    assert [decode(record) for record in first + second] == (
+        shot_events + shot_events[:1]
+    )
+    assert [record['kinesis']['sequenceNumber'] for record in first + second] == [
+        '1',
+        '2',
+        '3',
+        '4',
+    ]
+    assert second[1]['kinesis']['partitionKey'] == '0'
+
+
+def test_load_shot_events_reads_lambda_test_event():
+    event_path = Path(__file__).parent.parent / 'integration_test' / 'event.json'
+    shot_events = load_shot_events(event_path)
+
+    assert shot_events[0]['shot_id'] == 123
+    assert shot_events[0]['shot']['distance_to_goal'] == 5.1
+
+
+def test_results_summary():
+    results = Results()
+    results.add(0.010, {'batchItemFailures': [{'itemIdentifier': '1'}]}, 10)
+    results.add(0.030, {'errorMessage': 'boom', 'errorType': 'RuntimeError'}, 10)
+    results.add_error(0.020, 10)
+    results.add_exception(RuntimeError('boom'), 10)
+
+    summary = results.summary(elapsed=2.0)
+
+    assert summary['requests'] == 4
+    assert summary['records'] == 40
+    assert summary['errors'] == 3
+    assert summary['error_rate'] == 0.75
+    assert summary['failed_records'] == 1
+    assert summary['exceptions'] == {'RuntimeError': 1}
+    assert summary['throughput_rps'] == 2.0
+    assert summary['throughput_records_per_s'] == 20.0
+    assert summary['p50_ms'] == pytest.approx(20.0)
+    assert summary['max_ms'] == pytest.approx(30.0)
+
+
+def test_results_summary_without_requests():
+    summary = Results().summary(elapsed=0.0)
+
+    assert summary['requests'] == 0
+    assert summary['error_rate'] == 0.0
+    assert summary['p99_ms'] is None
+    assert summary['max_ms'] is None
+
+
+def test_run_closed_loop_stops_after_max_requests():
+    target = StubTarget()
+    factory = EventFactory(synthetic_shot_events(10), batch_size=5)
+
+    summary = run_closed_loop(
+        target, factory, concurrency=3, duration=10.0, max_requests=7
+    )
+
+    assert len(target.events) == 7
+    assert summary['requests'] == 7
+    assert summary['records'] == 35
+    assert summary['failed_records'] == 7
+    assert summary['errors'] == 0
+
+
+def test_run_closed_loop_counts_unexpected_exceptions():
+    target = StubTarget(error=RuntimeError('boom'), every=2)
+    factory = EventFactory(synthetic_shot_events(10), batch_size=1)
+
+    summary = run_closed_loop(
+        target, factory, concurrency=2, duration=10.0, max_requests=6
+    )
+
+    assert summary['requests'] == 6
+    assert summary['errors'] == 3
+    assert summary['exceptions'] == {'RuntimeError': 3}
+
+
+def test_run_open_loop_counts_unexpected_exceptions():
+    target = StubTarget(error=KeyError('Records'), every=2)
+    factory = EventFactory(synthetic_shot_events(10), batch_size=2)
+
+    summary = run_open_loop(
+        target, factory, rate=1000.0, duration=10.0, max_requests=8, workers=4
+    )
+
+    assert len(target.events) == 8
+    assert summary['requests'] == 8
+    assert summary['records'] == 16
+    assert summary['errors'] == 4
+    assert summary['exceptions'] == {'KeyError': 4}
+    assert summary['failed_records'] == 4
+
+
+def test_in_process_target_accepts_raw_positions():
+    shot_events = synthetic_shot_events(4) + [
+        {'shot': {'positions': [{'x': 88, 'y': 40}]}, 'shot_id': 4},
+        {'shot': {}, 'shot_id': 5},
+    ]
+    target = InProcessTarget(shot_events)
+
+    # The invalid shot is left out of the drift reference
+    reference = target.service.drift_engine.reference
+    assert reference['distance_to_goal'].count == 5
+    assert reference['prediction'].count == 5
+
+    response = target(EventFactory(shot_events, batch_size=6).next_event())
+
+    assert len(response['predictions']) == 5
+    assert response['batchItemFailures'] == []
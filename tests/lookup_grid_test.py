@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from lookup_grid import LookupGridModel
+
+
+class SmoothModelMock:
+    accepts_columns = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        distance = np.nan_to_num(np.asarray(X['distance_to_goal']), nan=30.0)
+        angle = np.nan_to_num(np.asarray(X['angle_to_goal']), nan=0.5)
+        return 1 / (1 + np.exp(0.1 * distance - angle))
+
+
+class FrameModelMock:
+    def predict(self, X):
+        assert isinstance(X, pd.DataFrame)
+        return (X['distance_to_goal'] + X['angle_to_goal']).to_numpy()
+
+
+def test_lookup_grid_matches_model_on_grid_points():
+    model_mock = SmoothModelMock()
+    grid = LookupGridModel.build(model_mock, distance_points=121, angle_points=61)
+
+    columns = {
+        'distance_to_goal': grid.distance_axis[[0, 10, 120]],
+        'angle_to_goal': grid.angle_axis[[0, 30, 60]],
+    }
+
+    np.testing.assert_allclose(grid.predict(columns), model_mock.predict(columns))
+
+
+def test_lookup_grid_error_bounds():
+    grid = LookupGridModel.build(SmoothModelMock())
+
+    assert grid.error_bounds['distance_step'] == 0.25
+    assert grid.error_bounds['max_abs_error'] < 1e-3
+    assert grid.error_bounds['mean_abs_error'] <= grid.error_bounds['max_abs_error']
+
+
+def test_lookup_grid_missing_and_out_of_range_values():
+    model_mock = SmoothModelMock()
+    grid = LookupGridModel.build(model_mock, distance_points=121, angle_points=61)
+
+    columns = {
+        'distance_to_goal': np.array([np.nan, 10.0, np.nan, 500.0]),
+        'angle_to_goal': np.array([0.5, np.nan, np.nan, 1.0]),
+    }
+    expected = model_mock.predict(
+        {
+            'distance_to_goal': np.array([np.nan, 10.0, np.nan, 120.0]),
+            'angle_to_goal': np.array([0.5, np.nan, np.nan, 1.0]),
+        }
+    )
+
+    np.testing.assert_allclose(grid.predict(columns), expected, atol=1e-4)
+
+
+def test_lookup_grid_builds_from_dataframe_models():
+    grid = LookupGridModel.build(FrameModelMock(), distance_points=11, angle_points=5)
+
+    prediction = grid.predict({'distance_to_goal': [12.5], 'angle_to_goal': [0.3]})
+
+    np.testing.assert_allclose(prediction, [12.8])
+
+
+def test_lookup_grid_save_load(tmp_path):
+    grid = LookupGridModel.build(SmoothModelMock(), distance_points=21, angle_points=11)
+    path = tmp_path / 'model_grid.npz'
+    grid.save(path)
+
+    loaded = LookupGridModel.load(path)
+    columns = {'distance_to_goal': [3.3, np.nan], 'angle_to_goal': [0.7, 1.1]}
+
+    assert loaded.error_bounds == grid.error_bounds
+    np.testing.assert_array_equal(loaded.predict(columns), grid.predict(columns))
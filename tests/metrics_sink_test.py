@@ -0,0 +1,225 @@
+import time
+import datetime
+
+from metrics_sink import MetricsSink, prep_db
+
+
+class CursorStub:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params=None):
+        self.connection.database.statements.append((statement, params))
+
+    def executemany(self, statement, rows):
+        if not self.connection.database.available:
+            raise ConnectionError("server closed the connection unexpectedly")
+        self.connection.pending.extend(rows)
+
+    def fetchone(self):
+        return None
+
+
+class ConnectionStub:
+    def __init__(self, database):
+        self.database = database
+        self.pending = []
+        self.closed = False
+        self.autocommit = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def cursor(self):
+        return CursorStub(self)
+
+    def commit(self):
+        self.database.rows.extend(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.closed = True
+
+
+class DatabaseStub:
+    """In-process stand-in for the Postgres server."""
+
+    def __init__(self):
+        self.available = True
+        self.rows = []
+        self.statements = []
+        self.dsns = []
+
+    def connect(self, dsn):
+        if not self.available:
+            raise ConnectionError("could not connect to server")
+        self.dsns.append(dsn)
+        return ConnectionStub(self)
+
+
+def metrics(value):
+    return {
+        'prediction_drift': value,
+        'num_drifted_columns': 1,
+        'share_missing_values': 0.0,
+        'distance_to_goal_quantile': 15.0,
+    }
+
+
+def test_sink_buffers_and_writes_batches_over_one_connection(tmp_path):
+    database = DatabaseStub()
+    sink = MetricsSink(
+        dsn='host=localhost dbname=test',
+        connect=database.connect,
+        batch_size=3,
+        spool_path=str(tmp_path / 'spool.jsonl'),
+    )
+
+    for i in range(7):
+        sink.write(metrics(i / 10))
+
+    assert [row[1] for row in database.rows] == [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+    assert sink.stats()['pending_rows'] == 1
+    assert sink.flush()
+    assert len(database.rows) == 7
+    assert isinstance(database.rows[0][0], datetime.datetime)
+    assert database.dsns == ['host=localhost dbname=test']
+
+
+def test_sink_spools_while_database_is_down_and_reconnects(tmp_path):
+    database = DatabaseStub()
+    spool_path = tmp_path / 'spool.jsonl'
+    sink = MetricsSink(
+        connect=database.connect, batch_size=2, spool_path=str(spool_path)
+    )
+
+    sink.write(metrics(0.1))
+    sink.write(metrics(0.2))
+    database.available = False
+    sink.write(metrics(0.3))
+    sink.write(metrics(0.4))
+
+    assert spool_path.exists()
+    assert sink.stats()['spooled_rows'] == 2
+    assert sink.stats()['failed_flushes'] == 1
+    assert sink.conn is None
+
+    database.available = True
+    sink.write(metrics(0.5))
+    assert sink.flush()
+
+    assert [row[1] for row in database.rows] == [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert not spool_path.exists()
+    assert sink.stats()['connections'] == 2
+
+
+def test_sink_quarantines_corrupt_spool_lines(tmp_path):
+    database = DatabaseStub()
+    spool_path = tmp_path / 'spool.jsonl'
+    sink = MetricsSink(connect=database.connect, spool_path=str(spool_path))
+    database.available = False
+    sink.write(metrics(0.1))
+    # A crash mid-write leaves a truncated last line
+    with open(spool_path, 'at', encoding='utf-8') as f_out:
+        f_out.write('["2024-01-01T00:00:00", 0.2')
+
+    database.available = True
+    sink.write(metrics(0.3))
+
+    assert [row[1] for row in database.rows] == [0.1, 0.3]
+    assert not spool_path.exists()
+    corrupt_path = tmp_path / 'spool.jsonl.corrupt'
+    assert corrupt_path.read_text(encoding='utf-8') == ('["2024-01-01T00:00:00", 0.2\n')
+    assert sink.stats()['corrupt_rows'] == 1
+
+    # Later flushes are not affected
+    sink.write(metrics(0.4))
+    assert [row[1] for row in database.rows] == [0.1, 0.3, 0.4]
+
+
+def test_sink_flushes_after_interval(tmp_path):
+    database = DatabaseStub()
+    sink = MetricsSink(
+        connect=database.connect,
+        batch_size=100,
+        flush_interval=0,
+        spool_path=str(tmp_path / 'spool.jsonl'),
+    )
+
+    sink.write(metrics(0.1))
+
+    assert len(database.rows) == 1
+
+
+def test_sink_writes_each_row_by_default(tmp_path):
+    database = DatabaseStub()
+    sink = MetricsSink(connect=database.connect, spool_path=str(tmp_path / 'spool'))
+
+    sink.write(metrics(0.1))
+
+    assert len(database.rows) == 1
+
+
+def test_sink_flushes_partial_batch_without_further_writes(tmp_path):
+    database = DatabaseStub()
+    sink = MetricsSink(
+        connect=database.connect,
+        batch_size=10,
+        flush_interval=0.05,
+        spool_path=str(tmp_path / 'spool.jsonl'),
+    )
+
+    sink.write(metrics(0.1))
+    assert not database.rows
+
+    deadline = time.monotonic() + 2
+    while not database.rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(database.rows) == 1
+    assert sink.stats()['pending_rows'] == 0
+
+
+def test_prep_db_uses_configured_dsn():
+    database = DatabaseStub()
+
+    prep_db('host=pg port=5433 dbname=metrics user=u', connect=database.connect)
+
+    assert 'dbname=postgres' in database.dsns[0]
+    assert 'port=5433' in database.dsns[0]
+    assert database.dsns[1] == 'host=pg port=5433 dbname=metrics user=u'
+    assert any('CREATE DATABASE "metrics"' in s for s, _ in database.statements)
+    assert any('CREATE TABLE IF NOT EXISTS' in s for s, _ in database.statements)
+
+
+def test_sink_prepares_database_on_first_flush(tmp_path):
+    database = DatabaseStub()
+    database.available = False
+    sink = MetricsSink(
+        dsn='host=pg dbname=metrics',
+        connect=database.connect,
+        batch_size=1,
+        spool_path=str(tmp_path / 'spool.jsonl'),
+        prepare_db=True,
+    )
+
+    assert not database.statements
+
+    # An unreachable database at startup only spools the rows
+    sink.write(metrics(0.1))
+    assert sink.prepare_db
+
+    database.available = True
+    sink.write(metrics(0.2))
+
+    assert not sink.prepare_db
+    assert any('CREATE TABLE IF NOT EXISTS' in s for s, _ in database.statements)
+    assert [row[1] for row in database.rows] == [0.1, 0.2]
@@ -0,0 +1,94 @@
+import model
+from model_reloader import ModelReloader
+
+
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        return [self.value] * len(X)
+
+
+def test_new_version_is_staged_then_swapped_between_invocations():
+    service = model.ModelService(ConstantModel(0.1), None, 'run-1')
+    production = {'run_id': 'run-1'}
+    loaded = []
+
+    def load_version(run_id):
+        loaded.append(run_id)
+        return {'model': ConstantModel(0.9), 'reference_data': None}
+
+    reloader = ModelReloader(service, lambda: production['run_id'], load_version)
+
+    assert not reloader.poll_once()
+    production['run_id'] = 'run-2'
+    assert reloader.poll_once()
+    # Already staged: not loaded twice
+    assert not reloader.poll_once()
+    assert loaded == ['run-2']
+
+    # Staging warms the new model but leaves the served one untouched
+    assert service.staged_model['model'].calls == 1
+    assert service.model_version == 'run-1'
+    assert service.predict_batch([{'distance_to_goal': 1, 'angle_to_goal': 1}]) == [0.1]
+
+    assert service.swap_staged_model()
+    assert service.model_version == 'run-2'
+    assert service.staged_model is None
+    assert not service.swap_staged_model()
+
+
+def test_failed_version_is_retried_with_backoff():
+    service = model.ModelService(ConstantModel(0.1), None, 'run-1')
+    attempts = []
+
+    def load_version(run_id):
+        attempts.append(run_id)
+        if len(attempts) < 4:
+            raise IOError('S3 timeout')
+        return {'model': ConstantModel(0.9), 'reference_data': None}
+
+    reloader = ModelReloader(service, lambda: 'run-2', load_version)
+
+    # Retried on polls 1, 3, 6 and 11: 1, 2 and 4 polls are skipped in between
+    staged = [reloader.poll_once() for _ in range(11)]
+
+    assert attempts == ['run-2'] * 4
+    assert staged.index(True) == 10
+    assert reloader.stats() == {
+        'reloads': 1,
+        'failed_reloads': 3,
+        'failed_version': None,
+        'failed_attempts': 0,
+    }
+    assert service.staged_model['model_version'] == 'run-2'
+
+
+def test_backoff_is_capped_and_reset_by_a_new_version():
+    service = model.ModelService(ConstantModel(0.1), None, 'run-1')
+    production = {'run_id': 'run-2'}
+    attempts = []
+
+    def load_version(run_id):
+        attempts.append(run_id)
+        raise IOError('artifact missing')
+
+    reloader = ModelReloader(
+        service, lambda: production['run_id'], load_version, max_skipped_polls=2
+    )
+
+    for _ in range(10):
+        reloader.poll_once()
+    # Polls 1, 3, 6 and 9; skips are capped at 2
+    assert attempts == ['run-2'] * 4
+    assert reloader.skipped_polls == 1
+
+    production['run_id'] = 'run-3'
+    reloader.poll_once()
+
+    assert attempts[-1] == 'run-3'
+    assert reloader.stats()['failed_attempts'] == 1
+    assert service.model_version == 'run-1'
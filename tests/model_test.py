@@ -1,6 +1,17 @@
+import json
+import math
+import base64
 from pathlib import Path
 
+import numpy as np
+import pytest
+
 import model
+from drift import DriftEngine, build_reference_profile
+from drift_worker import DriftWorker
+from instrumentation import MemoryExporter, Instrumentation
+from sink_dispatcher import SinkDispatcher
+from prediction_cache import PredictionCache
 
 
 def read_text(file):
@@ -35,6 +46,17 @@ def test_prepare_features():
     assert actual_features == expected_fetures
 
 
+def test_prepare_features_from_positions():
+    model_service = model.ModelService(None, None)
+
+    shot = {"positions": [{"y": 50, "x": 100 - 11 / 1.05}, {"y": 0, "x": 0}]}
+
+    features = model_service.prepare_features(shot)
+
+    assert math.isclose(features["distance_to_goal"], 11.0)
+    assert math.isclose(features["angle_to_goal"], 2 * math.atan(3.66 / 11))
+
+
 class ModelMock:
     def __init__(self, value):
         self.value = value
@@ -86,7 +108,487 @@ def test_lambda_handler():
                     'shot_id': 123,
                 },
             }
-        ]
+        ],
+        'batchItemFailures': [],
     }
 
     assert actual_predictions == expected_predictions
+
+
+class DistanceModelMock:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        return [distance / 100 for distance in X['distance_to_goal']]
+
+
+def encode_shot(shot_id, distance_to_goal, angle_to_goal):
+    shot_event = {
+        "shot": {"distance_to_goal": distance_to_goal, "angle_to_goal": angle_to_goal},
+        "shot_id": shot_id,
+    }
+    return base64.b64encode(json.dumps(shot_event).encode('utf-8')).decode('utf-8')
+
+
+def test_predict_batch():
+    model_mock = DistanceModelMock()
+    model_service = model.ModelService(model_mock, None)
+
+    features_batch = [
+        {"distance_to_goal": 10.0, "angle_to_goal": 0.5},
+        {"distance_to_goal": 20.0, "angle_to_goal": 0.3},
+    ]
+
+    assert model_service.predict_batch(features_batch) == [0.1, 0.2]
+    assert model_service.predict_batch([]) == []
+    assert model_mock.calls == 1
+
+
+def test_lambda_handler_batch_order():
+    model_mock = DistanceModelMock()
+    model_version = 'Test223'
+    published = []
+    model_service = model.ModelService(
+        model_mock, None, model_version, callbacks=[published.append]
+    )
+
+    shots = [(7, 30.0, 0.2), (3, 10.0, 0.9), (5, 20.0, 0.4)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+
+    actual_predictions = model_service.lambda_handler(event)
+    actual_events = actual_predictions['predictions']
+
+    assert model_mock.calls == 1
+    assert [e['prediction']['shot_id'] for e in actual_events] == [7, 3, 5]
+    assert [e['prediction']['shot_xgoals'] for e in actual_events] == [
+        0.3,
+        0.1,
+        0.2,
+    ]
+    assert published == actual_events
+    assert [row['distance_to_goal'] for row in model_service.data_buffer] == [
+        30.0,
+        10.0,
+        20.0,
+    ]
+
+
+class KinesisClientStub:
+    def __init__(self):
+        self.calls = []
+
+    def put_records(self, StreamName, Records):
+        self.calls.append((StreamName, [r['PartitionKey'] for r in Records]))
+        return {'FailedRecordCount': 0, 'Records': [{} for _ in Records]}
+
+
+def test_lambda_handler_flushes_batch_publisher():
+    kinesis_client = KinesisClientStub()
+    publisher = model.KinesisBatchPublisher(kinesis_client, 'predictions')
+    model_service = model.ModelService(
+        DistanceModelMock(), None, 'Test123', callbacks=[publisher]
+    )
+
+    shots = [(4, 10.0, 0.5), (9, 20.0, 0.3)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+    model_service.lambda_handler(event)
+
+    assert kinesis_client.calls == [('predictions', ['4', '9'])]
+    assert not publisher.pending
+
+
+def test_lambda_handler_scores_in_chunks_with_dispatcher():
+    model_mock = DistanceModelMock()
+    published = []
+    dispatcher = SinkDispatcher(max_workers=2)
+    model_service = model.ModelService(
+        model_mock,
+        None,
+        'Test123',
+        callbacks=[published.append],
+        dispatcher=dispatcher,
+        score_chunk_size=2,
+    )
+
+    shots = [(shot_id, 10.0 * shot_id, 0.5) for shot_id in range(1, 6)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+    actual_events = model_service.lambda_handler(event)['predictions']
+    dispatcher.shutdown()
+
+    assert model_mock.calls == 3
+    assert [e['prediction']['shot_id'] for e in actual_events] == [1, 2, 3, 4, 5]
+    assert published == actual_events
+
+
+def kinesis_event(shots):
+    return {
+        "Records": [
+            {"kinesis": {"data": encode_shot(*shot), "sequenceNumber": f"{shot[0]}00"}}
+            for shot in shots
+        ]
+    }
+
+
+class RejectingKinesisClientStub(KinesisClientStub):
+    def __init__(self, rejected):
+        super().__init__()
+        self.rejected = rejected
+
+    def put_records(self, StreamName, Records):
+        super().put_records(StreamName, Records)
+        results = [
+            (
+                {'ErrorCode': 'ProvisionedThroughputExceededException'}
+                if r['PartitionKey'] in self.rejected
+                else {}
+            )
+            for r in Records
+        ]
+        failed = sum('ErrorCode' in result for result in results)
+        return {'FailedRecordCount': failed, 'Records': results}
+
+
+def test_lambda_handler_reports_unpublished_records():
+    kinesis_client = RejectingKinesisClientStub(rejected={'9'})
+    publisher = model.KinesisBatchPublisher(
+        kinesis_client, 'predictions', max_retries=1, sleep=lambda _: None
+    )
+    exporter = MemoryExporter()
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test123',
+        callbacks=[publisher],
+        instrumentation=Instrumentation(exporter),
+    )
+
+    response = model_service.lambda_handler(
+        kinesis_event([(4, 10.0, 0.5), (9, 20.0, 0.3)])
+    )
+
+    # The rejected prediction is handed back to Kinesis instead of being lost
+    assert response['batchItemFailures'] == [{'itemIdentifier': '900'}]
+    assert exporter.records[0]['counters']['unpublished_records'] == 1
+
+
+def test_lambda_handler_reports_chunks_a_dispatched_sink_failed():
+    def sink(prediction_event):
+        if prediction_event['prediction']['shot_id'] == 3:
+            raise ConnectionError('sink unavailable')
+
+    dispatcher = SinkDispatcher(max_workers=2)
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test123',
+        callbacks=[sink],
+        dispatcher=dispatcher,
+        score_chunk_size=2,
+    )
+
+    shots = [(shot_id, 10.0 * shot_id, 0.5) for shot_id in range(1, 6)]
+    response = model_service.lambda_handler(kinesis_event(shots))
+    dispatcher.shutdown()
+
+    assert len(response['predictions']) == 5
+    assert response['batchItemFailures'] == [
+        {'itemIdentifier': '300'},
+        {'itemIdentifier': '400'},
+    ]
+
+
+def test_lambda_handler_raises_on_unexpected_errors(monkeypatch):
+    model_service = model.ModelService(DistanceModelMock(), None, 'Test123')
+
+    def broken_swap():
+        raise RuntimeError('staged model is corrupt')
+
+    monkeypatch.setattr(model_service, 'swap_staged_model', broken_swap)
+
+    # Returning a response would acknowledge every record of the batch
+    with pytest.raises(RuntimeError, match='staged model is corrupt'):
+        model_service.lambda_handler(kinesis_event([(1, 10.0, 0.5)]))
+
+
+def test_predict_with_cache():
+    model_mock = DistanceModelMock()
+    cache = PredictionCache(precision=1)
+    model_service = model.ModelService(model_mock, None, 'Test223', cache=cache)
+
+    features_batch = [
+        {"distance_to_goal": 10.0, "angle_to_goal": 0.5},
+        {"distance_to_goal": 10.01, "angle_to_goal": 0.5},
+    ]
+
+    assert model_service.predict_batch(features_batch) == [0.1, 0.1]
+    assert model_service.predict(features_batch[0]) == 0.1
+    assert model_mock.calls == 1
+
+    model_service.model_version = 'Test224'
+    model_service.predict(features_batch[0])
+
+    assert model_mock.calls == 2
+
+
+class MetricsSinkMock:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, metrics):
+        self.rows.append(metrics)
+
+
+def test_lambda_handler_streaming_drift():
+    metrics_sink = MetricsSinkMock()
+    saved_metrics = metrics_sink.rows
+
+    drift_engine = DriftEngine.from_columns({})
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test223',
+        drift_engine=drift_engine,
+        metrics_sink=metrics_sink,
+    )
+
+    shots = [(i, 10.0 + i, 0.5) for i in range(model.BUFFER_THRESHOLD - 1)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+    model_service.lambda_handler(event)
+
+    assert not saved_metrics
+    assert drift_engine.window.rows == model.BUFFER_THRESHOLD - 1
+
+    model_service.lambda_handler(event)
+
+    assert len(saved_metrics) == 1
+    assert saved_metrics[0]['share_missing_values'] == 0.0
+    assert drift_engine.window.rows == 0
+    assert not model_service.data_buffer
+
+
+def test_lambda_handler_without_drift_threshold_never_flushes():
+    metrics_sink = MetricsSinkMock()
+    drift_engine = DriftEngine.from_columns({})
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test223',
+        drift_engine=drift_engine,
+        metrics_sink=metrics_sink,
+        drift_threshold=None,
+    )
+
+    shots = [(i, 10.0 + i, 0.5) for i in range(model.BUFFER_THRESHOLD)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+    model_service.lambda_handler(event)
+
+    assert not metrics_sink.rows
+    assert drift_engine.window.rows == model.BUFFER_THRESHOLD
+
+
+def test_load_reference_profile(tmp_path, monkeypatch):
+    profile = build_reference_profile(
+        {
+            'distance_to_goal': [10.0, 20.0, 30.0],
+            'angle_to_goal': [0.5, 0.4, 0.3],
+            'prediction': [0.2, 0.1, 0.05],
+        }
+    )
+    (tmp_path / model.REFERENCE_PROFILE_NAME).write_text(
+        json.dumps(profile), encoding='utf-8'
+    )
+    monkeypatch.setenv('MODEL_LOCATION', str(tmp_path))
+
+    reference_profile = model.load_reference_profile(model.get_model_location('run'))
+    drift_engine = model.create_drift_engine(reference_profile)
+
+    assert reference_profile == profile
+    assert set(drift_engine.reference) == {
+        'distance_to_goal',
+        'angle_to_goal',
+        'prediction',
+    }
+
+
+def test_lambda_handler_hands_drift_off_to_worker():
+    metrics_sink = MetricsSinkMock()
+    saved_metrics = metrics_sink.rows
+
+    drift_worker = DriftWorker()
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test223',
+        drift_engine=DriftEngine.from_columns({}),
+        drift_worker=drift_worker,
+        metrics_sink=metrics_sink,
+    )
+
+    shots = [(i, 10.0 + i, 0.5) for i in range(model.BUFFER_THRESHOLD)]
+    event = {"Records": [{"kinesis": {"data": encode_shot(*shot)}} for shot in shots]}
+    actual_predictions = model_service.lambda_handler(event)
+
+    assert len(actual_predictions['predictions']) == model.BUFFER_THRESHOLD
+    assert drift_worker.flush(timeout=5)
+    assert len(saved_metrics) == 1
+    assert drift_worker.stats()['processed_windows'] == 1
+    drift_worker.stop(timeout=5)
+
+
+def test_prewarm_scores_dummy_batch_without_side_effects():
+    model_mock = DistanceModelMock()
+    published = []
+    model_service = model.ModelService(
+        model_mock,
+        None,
+        'Test123',
+        callbacks=[published.append],
+        cache=PredictionCache(maxsize=8),
+    )
+
+    model_service.prewarm()
+
+    assert model_mock.calls == 1
+    assert not published
+    assert not model_service.data_buffer
+    assert not model_service.cache
+
+
+def test_init_timer_records_phases():
+    timer = model.InitTimer()
+
+    with timer.phase('registry'):
+        pass
+    with timer.phase('load_model'):
+        pass
+
+    assert list(timer.timings) == ['registry', 'load_model']
+    assert all(value >= 0 for value in timer.timings.values())
+
+
+def test_lambda_handler_swaps_staged_model_before_scoring():
+    old_model, new_model = DistanceModelMock(), DistanceModelMock()
+    model_service = model.ModelService(old_model, None, 'run-1', score_chunk_size=1)
+    model_service.stage_model(new_model, None, 'run-2')
+
+    event = {
+        "Records": [{"kinesis": {"data": encode_shot(i, 10.0, 0.5)}} for i in range(3)]
+    }
+    actual_events = model_service.lambda_handler(event)['predictions']
+
+    assert old_model.calls == 0
+    # One prewarm call plus one per chunk
+    assert new_model.calls == 4
+    assert {e['version'] for e in actual_events} == {'run-2'}
+
+
+class StrictModelMock(DistanceModelMock):
+    def predict(self, X):
+        if any(value > 25 for value in X['distance_to_goal']):
+            raise ValueError('distance_to_goal out of range')
+        return super().predict(X)
+
+
+def test_lambda_handler_skips_invalid_and_reports_failed_records():
+    published = []
+    exporter = MemoryExporter()
+    model_service = model.ModelService(
+        StrictModelMock(),
+        None,
+        'Test123',
+        callbacks=[published.append],
+        instrumentation=Instrumentation(exporter),
+    )
+
+    bad_shot = base64.b64encode(json.dumps({'shot': {}, 'shot_id': 2}).encode())
+    records = [
+        encode_shot(1, 10.0, 0.5),
+        'not base64!',
+        bad_shot.decode('utf-8'),
+        encode_shot(4, 'far', 0.5),
+        encode_shot(5, 20.0, 0.5),
+        encode_shot(6, 30.0, 0.5),
+    ]
+    event = {
+        "Records": [
+            {"kinesis": {"data": data, "sequenceNumber": f"4959{i}"}}
+            for i, data in enumerate(records)
+        ]
+    }
+
+    actual_response = model_service.lambda_handler(event)
+
+    assert [e['prediction']['shot_id'] for e in actual_response['predictions']] == [
+        1,
+        5,
+    ]
+    assert published == actual_response['predictions']
+    # Malformed records would fail on every retry, so only scoring failures
+    # are handed back to Kinesis
+    assert actual_response['batchItemFailures'] == [{'itemIdentifier': '49595'}]
+    counters = exporter.records[0]['counters']
+    assert counters['rejected_records'] == 3
+    assert counters['failed_records'] == 1
+
+
+class ColumnModelMock:
+    accepts_columns = True
+
+    def __init__(self):
+        self.inputs = []
+
+    def predict(self, X):
+        self.inputs.append(X)
+        return X['distance_to_goal'] / 100
+
+
+def test_lambda_handler_passes_feature_arrays_through():
+    serving_model = ColumnModelMock()
+    model_service = model.ModelService(serving_model, None, 'Test123')
+
+    records = [encode_shot(1, 10.0, 0.5), 'not base64!', encode_shot(3, 20.0, 0.25)]
+    event = {"Records": [{"kinesis": {"data": data}} for data in records]}
+    actual_response = model_service.lambda_handler(event)
+
+    assert len(serving_model.inputs) == 1
+    columns = serving_model.inputs[0]
+    assert all(isinstance(values, np.ndarray) for values in columns.values())
+    np.testing.assert_array_equal(columns['angle_to_goal'], [0.5, 0.25])
+    assert [e['prediction']['shot_xgoals'] for e in actual_response['predictions']] == [
+        0.1,
+        0.2,
+    ]
+    window = model_service.data_buffer.window(2)
+    np.testing.assert_array_equal(window['distance_to_goal'], [10.0, 20.0])
+    np.testing.assert_array_equal(window['prediction'], [0.1, 0.2])
+
+
+def test_lambda_handler_reports_stage_metrics():
+    exporter = MemoryExporter()
+    model_service = model.ModelService(
+        DistanceModelMock(),
+        None,
+        'Test123',
+        cache=PredictionCache(maxsize=8),
+        instrumentation=Instrumentation(exporter),
+    )
+
+    records = [encode_shot(1, 10.0, 0.5), encode_shot(2, 10.0, 0.5), 'not base64!']
+    event = {"Records": [{"kinesis": {"data": data}} for data in records]}
+    model_service.lambda_handler(event)
+
+    assert len(exporter.records) == 1
+    exported = exporter.records[0]
+    assert {'decode', 'score', 'predict', 'publish', 'total'} <= set(
+        exported['timings']
+    )
+    assert exported['counters'] == {
+        'records': 3,
+        'rejected_records': 1,
+        'failed_records': 0,
+        'unpublished_records': 0,
+        'buffer_size': 2,
+        'cache_hits': 1,
+    }
@@ -0,0 +1,93 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+def shot(distance_to_goal, angle_to_goal):
+    return {'distance_to_goal': distance_to_goal, 'angle_to_goal': angle_to_goal}
+
+
+class BatchPredictor:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, features_batch):
+        self.batches.append(features_batch)
+        return [features['distance_to_goal'] / 100 for features in features_batch]
+
+
+def test_key_quantizes_features():
+    cache = PredictionCache(precision=1)
+
+    assert cache.key(shot(11.04, 0.51)) == cache.key(shot(10.96, 0.49))
+    assert cache.key(shot(11.0, 0.5)) != cache.key(shot(11.1, 0.5))
+    assert cache.key(shot(float('nan'), 0.5)) is None
+    assert cache.key({'angle_to_goal': 0.5}) is None
+
+
+def test_get_or_predict_scores_only_misses():
+    cache = PredictionCache(precision=1)
+    predictor = BatchPredictor()
+
+    first = cache.get_or_predict('v1', [shot(10, 0.5), shot(20, 0.5)], predictor)
+    second = cache.get_or_predict(
+        'v1', [shot(20.01, 0.5), shot(30, 0.5), shot(30, 0.5)], predictor
+    )
+
+    assert first == [0.1, 0.2]
+    assert second == [0.2, 0.3, 0.3]
+    assert predictor.batches[1] == [shot(30, 0.5)]
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 3
+
+
+def test_lru_eviction():
+    cache = PredictionCache(maxsize=2, precision=0)
+    predictor = BatchPredictor()
+
+    cache.get_or_predict('v1', [shot(10, 0), shot(20, 0)], predictor)
+    cache.get_or_predict('v1', [shot(10, 0)], predictor)  # 10 is now most recent
+    cache.get_or_predict('v1', [shot(30, 0)], predictor)
+
+    assert cache.key(shot(20, 0)) not in cache.entries
+    assert cache.key(shot(10, 0)) in cache.entries
+    assert cache.stats()['evictions'] == 1
+    assert len(cache) == 2
+
+
+def test_model_version_change_invalidates():
+    cache = PredictionCache()
+    predictor = BatchPredictor()
+
+    cache.get_or_predict('v1', [shot(10, 0.5)], predictor)
+    cache.get_or_predict('v2', [shot(10, 0.5)], predictor)
+
+    assert len(predictor.batches) == 2
+    assert cache.stats()['invalidations'] == 1
+    assert cache.model_version == 'v2'
+
+
+def test_get_or_predict_columns_matches_dict_keys():
+    cache = PredictionCache(precision=1)
+    batches = []
+
+    def predict_columns(columns):
+        batches.append(columns)
+        return columns['distance_to_goal'] / 100
+
+    columns = {
+        'distance_to_goal': np.array([10.0, 20.0, 10.01, np.nan]),
+        'angle_to_goal': np.array([0.5, 0.5, 0.5, 0.5]),
+    }
+    predictions = cache.get_or_predict_columns('v1', columns, predict_columns)
+
+    np.testing.assert_allclose(predictions[:3], [0.1, 0.2, 0.1])
+    assert np.isnan(predictions[3])
+    # The duplicate is served by the first row; the NaN row is never cached
+    np.testing.assert_array_equal(batches[0]['distance_to_goal'][:2], [10.0, 20.0])
+    assert len(batches[0]['distance_to_goal']) == 3
+    assert cache.column_keys(columns)[:2] == [
+        cache.key(shot(10.0, 0.5)),
+        cache.key(shot(20.0, 0.5)),
+    ]
+    assert len(cache) == 2
@@ -0,0 +1,88 @@
+import json
+import base64
+
+import numpy as np
+
+from shot_geometry import shot_features
+from record_decoder import decode_records
+
+
+def kinesis_record(payload, sequence_number):
+    if not isinstance(payload, str):
+        payload = base64.b64encode(json.dumps(payload).encode('utf-8')).decode()
+    return {'kinesis': {'data': payload, 'sequenceNumber': sequence_number}}
+
+
+def shot_event(shot_id, distance_to_goal, angle_to_goal):
+    return {
+        'shot': {'distance_to_goal': distance_to_goal, 'angle_to_goal': angle_to_goal},
+        'shot_id': shot_id,
+    }
+
+
+def test_decode_records_to_columns():
+    records = [
+        kinesis_record(shot_event(7, 12.5, 0.4), '1'),
+        kinesis_record(shot_event(8, 30, None), '2'),
+    ]
+
+    batch = decode_records(records)
+
+    assert batch.shot_ids == [7, 8]
+    np.testing.assert_array_equal(batch.distance_to_goal, [12.5, 30.0])
+    np.testing.assert_array_equal(batch.angle_to_goal, [0.4, np.nan])
+    assert batch.valid.all()
+    assert not batch.errors
+    columns = batch.feature_columns()
+    np.testing.assert_array_equal(columns['distance_to_goal'], [12.5, 30.0])
+    np.testing.assert_array_equal(columns['angle_to_goal'], [0.4, np.nan])
+
+
+def test_decode_records_flags_invalid_records():
+    records = [
+        kinesis_record(shot_event(1, 10.0, 0.5), '1'),
+        kinesis_record('not base64!', '2'),
+        kinesis_record(base64.b64encode(b'{"shot":').decode(), '3'),
+        kinesis_record({'shot': {'distance_to_goal': 1.0}, 'shot_id': 4}, '4'),
+        kinesis_record(shot_event(5, 'far', 0.5), '5'),
+        kinesis_record(shot_event(6, True, 0.5), '6'),
+        {'kinesis': {'sequenceNumber': '7'}},
+        kinesis_record(shot_event(8, 20.0, 0.3), '8'),
+    ]
+
+    batch = decode_records(records)
+
+    assert batch.valid.tolist() == [True] + [False] * 6 + [True]
+    assert sorted(batch.errors) == [1, 2, 3, 4, 5, 6]
+    assert batch.errors[3] == "missing field 'angle_to_goal'"
+    assert batch.errors[4].startswith('TypeError: distance_to_goal must be a number')
+    assert batch.errors[6] == "missing field 'data'"
+    assert [batch.shot_ids[i] for i in batch.valid_indexes()] == [1, 8]
+    columns = batch.feature_columns()
+    np.testing.assert_array_equal(columns['distance_to_goal'], [10.0, 20.0])
+    np.testing.assert_array_equal(columns['angle_to_goal'], [0.5, 0.3])
+
+
+def test_decode_records_computes_features_from_positions():
+    records = [
+        kinesis_record(
+            {'shot': {'positions': [{'y': 40, 'x': 88}]}, 'shot_id': 1}, '1'
+        ),
+        kinesis_record(shot_event(2, 12.5, 0.4), '2'),
+        kinesis_record(
+            {'shot': {'positions': [{'y': 61, 'x': 75}]}, 'shot_id': 3}, '3'
+        ),
+        kinesis_record({'shot': {'positions': []}, 'shot_id': 4}, '4'),
+        kinesis_record(
+            {'shot': {'positions': [{'y': 'a', 'x': 1}]}, 'shot_id': 5}, '5'
+        ),
+    ]
+
+    batch = decode_records(records)
+
+    distance, angle = shot_features([88, 75], [40, 61])
+    np.testing.assert_array_equal(batch.distance_to_goal[[0, 2]], distance)
+    np.testing.assert_array_equal(batch.angle_to_goal[[0, 2]], angle)
+    assert batch.distance_to_goal[1] == 12.5
+    assert batch.shot_ids[:3] == [1, 2, 3]
+    assert sorted(batch.errors) == [3, 4]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ring_buffer import RingBuffer
+
+COLUMNS = ('distance_to_goal', 'prediction')
+
+
+def batch(start, stop):
+    values = np.arange(start, stop, dtype=float)
+    return {'distance_to_goal': values, 'prediction': values / 100}
+
+
+def test_append_and_window_views():
+    buffer = RingBuffer(capacity=4, columns=COLUMNS)
+    for value in range(6):
+        buffer.append({'distance_to_goal': value, 'prediction': value / 100})
+
+    window = buffer.window()
+
+    assert len(buffer) == 4
+    assert window['distance_to_goal'].tolist() == [2.0, 3.0, 4.0, 5.0]
+    # Contiguous slices of the preallocated arrays, not copies
+    assert np.shares_memory(
+        window['distance_to_goal'], buffer.arrays['distance_to_goal']
+    )
+    assert [row['distance_to_goal'] for row in buffer] == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_extend_wraps_around_and_keeps_newest_rows():
+    buffer = RingBuffer(capacity=5, columns=COLUMNS)
+    buffer.extend(batch(0, 3))
+    buffer.extend(batch(3, 7))
+
+    assert buffer.window()['distance_to_goal'].tolist() == [2, 3, 4, 5, 6]
+    assert buffer.window(2)['prediction'].tolist() == [0.05, 0.06]
+
+    buffer.extend(batch(10, 22))
+    assert buffer.window()['distance_to_goal'].tolist() == [17, 18, 19, 20, 21]
+    assert buffer.pending == 5
+
+
+def test_tumbling_windows_hold_pending_rows():
+    buffer = RingBuffer(capacity=8, columns=COLUMNS)
+    buffer.extend(batch(0, 3))
+    assert buffer.take_window()['distance_to_goal'].tolist() == [0, 1, 2]
+
+    buffer.extend(batch(3, 5))
+    assert buffer.pending == 2
+    assert buffer.take_window()['distance_to_goal'].tolist() == [3, 4]
+    assert buffer.pending == 0
+
+
+def test_sliding_windows_span_invocations():
+    buffer = RingBuffer(capacity=8, window_size=4, columns=COLUMNS)
+    buffer.extend(batch(0, 3))
+    buffer.extend(batch(3, 5))
+    first = buffer.take_window(copy=True)
+
+    buffer.extend(batch(5, 7))
+    second = buffer.take_window()
+
+    assert first['distance_to_goal'].tolist() == [1, 2, 3, 4]
+    assert second['distance_to_goal'].tolist() == [3, 4, 5, 6]
+
+    buffer.clear()
+    assert not buffer
+    assert buffer.take_window()['distance_to_goal'].size == 0
+
+
+def test_window_size_must_fit_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(capacity=4, window_size=5)
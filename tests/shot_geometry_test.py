@@ -0,0 +1,47 @@
+import numpy as np
+
+from shot_geometry import positions_xy, shot_features
+
+
+def reference_features(x, y):
+    """The row-wise feature code the pipeline used before shot_geometry."""
+    X = (100 - x) * 105 / 100
+    C = abs(y - 50) * 68 / 100
+    angle = np.arctan(7.32 * X / (X**2 + C**2 - (7.32 / 2) ** 2))
+    return np.sqrt(X**2 + C**2), angle if angle > 0 else angle + np.pi
+
+
+def test_shot_features_match_reference_bit_for_bit():
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 101, 500).astype(float)
+    y = rng.integers(0, 101, 500).astype(float)
+
+    distance, angle = shot_features(x, y)
+
+    expected = [reference_features(a, b) for a, b in zip(x, y)]
+    np.testing.assert_array_equal(distance, [d for d, _ in expected])
+    np.testing.assert_array_equal(angle, [a for _, a in expected])
+
+
+def test_shot_features_geometry():
+    # Penalty spot: 11 m out, centred, so the goal mouth subtends 2*atan(3.66/11)
+    distance, angle = shot_features(100 - 11 / 1.05, 50)
+
+    np.testing.assert_allclose(distance, 11.0)
+    np.testing.assert_allclose(angle, 2 * np.arctan(3.66 / 11))
+
+
+def test_shot_features_inside_goal_mouth_is_obtuse():
+    _, angle = shot_features([99.0, 10.0], [50.0, 50.0])
+
+    assert angle[0] > np.pi / 2
+    assert 0 < angle[1] < np.pi / 2
+
+
+def test_positions_xy_takes_shot_origin():
+    positions = [[{'y': 40, 'x': 88}, {'y': 0, 'x': 0}], [{'y': 61, 'x': 75}]]
+
+    x, y = positions_xy(positions)
+
+    np.testing.assert_array_equal(x, [88, 75])
+    np.testing.assert_array_equal(y, [40, 61])
@@ -0,0 +1,102 @@
+import time
+import threading
+
+from sink_dispatcher import SinkDispatcher
+
+
+class SlowSink:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.events = []
+        self.flushes = 0
+
+    def __call__(self, prediction_event):
+        time.sleep(self.delay)
+        self.events.append(prediction_event)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_publish_keeps_order_per_sink():
+    dispatcher = SinkDispatcher(max_workers=4)
+    fast, slow = SlowSink(), SlowSink(delay=0.001)
+
+    for chunk in range(10):
+        dispatcher.publish([fast, slow], [chunk * 3 + i for i in range(3)])
+
+    assert dispatcher.join([fast, slow])
+    assert fast.events == list(range(30))
+    assert slow.events == list(range(30))
+    assert fast.flushes == slow.flushes == 10
+    assert dispatcher.stats()['published_chunks'] == 20
+    dispatcher.shutdown()
+
+
+def test_publish_overlaps_sinks():
+    release = threading.Event()
+    started = []
+
+    def blocking_sink(prediction_event):
+        started.append(prediction_event)
+        release.wait(1.0)
+
+    other = SlowSink()
+    dispatcher = SinkDispatcher(max_workers=2)
+    dispatcher.publish([blocking_sink, other], ['a'])
+
+    # The second sink is not held up by the first one
+    deadline = time.monotonic() + 1.0
+    while not other.events and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert other.events == ['a']
+    release.set()
+    assert dispatcher.join([blocking_sink, other])
+    dispatcher.shutdown()
+
+
+def test_publish_blocks_when_too_many_chunks_pending():
+    release = threading.Event()
+
+    def blocking_sink(prediction_event):
+        release.wait(1.0)
+
+    dispatcher = SinkDispatcher(max_workers=1, max_pending=2)
+    dispatcher.publish([blocking_sink], [1])
+    dispatcher.publish([blocking_sink], [2])
+
+    publisher = threading.Thread(target=dispatcher.publish, args=([blocking_sink], [3]))
+    publisher.start()
+    publisher.join(0.05)
+    assert publisher.is_alive()
+
+    release.set()
+    publisher.join(1.0)
+    assert not publisher.is_alive()
+    assert dispatcher.stats()['backpressure_waits'] == 1
+    dispatcher.shutdown()
+
+
+def test_join_times_out_and_failures_are_isolated():
+    release = threading.Event()
+
+    def stuck_sink(prediction_event):
+        release.wait(1.0)
+
+    stuck_sink.publish_timeout = 0.05
+
+    def failing_sink(prediction_event):
+        raise ConnectionError('sink unavailable')
+
+    dispatcher = SinkDispatcher(max_workers=2)
+    dispatcher.publish([stuck_sink, failing_sink], [1])
+
+    assert not dispatcher.join([stuck_sink, failing_sink])
+    release.set()
+    dispatcher.shutdown()
+    assert dispatcher.stats() == {
+        'published_chunks': 1,
+        'failed_chunks': 1,
+        'timed_out_sinks': 1,
+        'backpressure_waits': 0,
+    }
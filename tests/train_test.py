@@ -1,6 +1,26 @@
+import json
 from pathlib import Path
+from concurrent import futures
 
+import mlflow
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from hyperopt import STATUS_OK, Trials, tpe, fmin
+from sklearn.feature_extraction import DictVectorizer
+
+import model
+from drift import build_reference_profile
 from src.pipeline.data_ingestion import read_data
+from src.pipeline import model_training
+from src.pipeline.model_training import (
+    SEARCH_SPACE,
+    best_trial,
+    trial_params,
+    dmatrix_columns,
+    parallel_search,
+)
+from src.pipeline.data_preprocessing import preprocess_data
 
 
 class MockBucket:
@@ -32,3 +52,169 @@ def test_read_data_nonexistent_directory():
         read_data.fn("/nonexistent/directory")
     except Exception as e:
         assert isinstance(e, FileNotFoundError)
+
+
+def test_dmatrix_columns_keeps_missing_values():
+    X = np.array([[1.0, np.nan], [0.0, 2.5], [np.nan, 3.0]])
+    dmatrix = xgb.DMatrix(X, feature_names=['angle_to_goal', 'distance_to_goal'])
+
+    columns = dmatrix_columns(dmatrix)
+
+    np.testing.assert_array_equal(columns['angle_to_goal'], [1.0, 0.0, np.nan])
+    np.testing.assert_array_equal(columns['distance_to_goal'], [np.nan, 2.5, 3.0])
+
+
+def test_reference_profile_is_json_serializable():
+    columns = {
+        'angle_to_goal': np.array([0.4, 0.5, np.nan, 0.9]),
+        'distance_to_goal': np.array([11.0, 20.0, 8.0, 30.0]),
+        'prediction': np.array([0.1, 0.05, 0.3, 0.02]),
+    }
+
+    profile = json.loads(json.dumps(build_reference_profile(columns)))
+
+    assert profile['columns']['angle_to_goal']['missing_rate'] == 0.25
+    assert profile['columns']['distance_to_goal']['count'] == 4
+    assert set(profile['columns']['prediction']['quantiles']) == {
+        '0.05',
+        '0.25',
+        '0.5',
+        '0.75',
+        '0.95',
+    }
+
+
+def make_shots(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            'distance_to_goal': rng.uniform(2, 40, rows),
+            'angle_to_goal': rng.uniform(0.05, 1.5, rows),
+            'is_goal': rng.integers(0, 2, rows),
+        }
+    )
+
+
+def test_preprocess_data_matches_dict_vectorizer():
+    splits = [make_shots(rows, seed) for seed, rows in enumerate((60, 20, 20))]
+
+    dtrain, dval, dtest = preprocess_data.fn(*splits)
+
+    dv = DictVectorizer(sparse=False)
+    X = dv.fit_transform(splits[0].drop(columns='is_goal').to_dict(orient='records'))
+    assert dtrain.feature_names == dv.feature_names_
+    columns = dmatrix_columns(dtrain)
+    for i, name in enumerate(dv.feature_names_):
+        np.testing.assert_array_equal(columns[name], X[:, i].astype(np.float32))
+    np.testing.assert_array_equal(dtrain.get_label(), splits[0]['is_goal'])
+    assert (dval.num_row(), dtest.num_row()) == (20, 20)
+
+
+def test_preprocess_data_matrices_train_serving_compatible_model():
+    splits = [make_shots(rows, seed) for seed, rows in enumerate((200, 50, 50))]
+
+    dtrain, dval, _ = preprocess_data.fn(*splits)
+    booster = xgb.train(
+        {'objective': 'binary:logistic', 'tree_method': 'hist'},
+        dtrain,
+        num_boost_round=5,
+        evals=[(dval, 'validation')],
+        verbose_eval=False,
+    )
+
+    assert booster.feature_names == ['angle_to_goal', 'distance_to_goal']
+    # ModelService scores a DataFrame with its columns in FEATURE_COLUMNS order
+    frame = pd.DataFrame({name: splits[1][name] for name in model.FEATURE_COLUMNS})
+    assert len(booster.predict(xgb.DMatrix(frame))) == 50
+
+
+def toy_loss(params):
+    return {
+        'loss': abs(np.log(params['learning_rate']) + 2) + params['max_depth'] / 100,
+        'status': STATUS_OK,
+    }
+
+
+def test_parallel_search_replays_serial_fmin():
+    serial = Trials()
+    fmin(
+        toy_loss,
+        SEARCH_SPACE,
+        algo=tpe.suggest,
+        max_evals=30,
+        trials=serial,
+        rstate=np.random.default_rng(7),
+        show_progressbar=False,
+    )
+
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        parallel = parallel_search(
+            toy_loss,
+            SEARCH_SPACE,
+            30,
+            executor,
+            seed=7,
+            startup_params={'nthread': 1},
+        )
+
+    assert [trial_params(trial, SEARCH_SPACE) for trial in parallel.trials] == [
+        trial_params(trial, SEARCH_SPACE) for trial in serial.trials
+    ]
+    assert best_trial(parallel)['tid'] == best_trial(serial)['tid']
+
+
+def test_parallel_search_passes_thread_limits():
+    seen = []
+
+    def evaluate(params):
+        seen.append(params['nthread'])
+        return toy_loss(params)
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        trials = parallel_search(
+            evaluate,
+            SEARCH_SPACE,
+            22,
+            executor,
+            startup_params={'nthread': 2},
+            params={'nthread': 4},
+        )
+
+    assert len(trials.trials) == 22
+    assert sorted(seen) == [2] * 20 + [4] * 2
+
+
+def test_hyperopt_train_workers_match_serial_search(tmp_path, monkeypatch):
+    monkeypatch.setenv('MLFLOW_TRACKING_URI', f"sqlite:///{tmp_path / 'mlflow.db'}")
+    monkeypatch.delenv('MLFLOW_EXPERIMENT_NAME', raising=False)
+    monkeypatch.delenv('MLFLOW_EXPERIMENT_ID', raising=False)
+    monkeypatch.setattr(model_training, 'log_auc_report', lambda auc: None)
+    # Two concurrent startup trials, then two that run alone
+    monkeypatch.setattr(model_training, 'N_STARTUP_JOBS', 2)
+    splits = [make_shots(rows, seed) for seed, rows in enumerate((200, 50, 50))]
+    dtrain, dval, _ = preprocess_data.fn(*splits)
+
+    results = {}
+    for workers in (1, 2):
+        experiment_id = mlflow.create_experiment(
+            f"workers-{workers}", artifact_location=(tmp_path / 'artifacts').as_uri()
+        )
+        mlflow.set_experiment(experiment_id=experiment_id)
+        # Some MLflow versions also export the experiment to the environment;
+        # the workers must get it without that
+        monkeypatch.delenv('MLFLOW_EXPERIMENT_ID', raising=False)
+        params, run_id = model_training.hyperopt_train.fn(
+            dtrain, dval, max_evals=4, workers=workers, threads_per_trial=1
+        )
+        runs = mlflow.search_runs([experiment_id])
+        # One run per trial, in the experiment the caller set
+        assert len(runs) == 4
+        assert run_id in set(runs['run_id'])
+        results[workers] = params, mlflow.get_run(run_id), runs
+
+    serial_params, serial_run, _ = results[1]
+    parallel_params, parallel_run, parallel_runs = results[2]
+    assert parallel_params == serial_params
+    assert parallel_run.data.metrics['auc'] == serial_run.data.metrics['auc']
+    # Concurrent trials share the CPUs, trials that run alone use them all
+    assert sorted(parallel_runs['params.nthread']) == ['1', '1', '2', '2']
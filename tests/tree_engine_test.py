@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from tree_engine import TreeEnsembleModel
+
+FEATURE_NAMES = ['angle_to_goal', 'distance_to_goal']
+
+
+def train_booster(seed=42):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(0, np.pi, 2000), rng.uniform(0, 110, 2000)])
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = (rng.random(2000) < 1 / (1 + np.nan_to_num(X[:, 1], nan=20) / 8)).astype(int)
+    dtrain = xgb.DMatrix(X, label=y, feature_names=FEATURE_NAMES)
+    params = {'objective': 'binary:logistic', 'max_depth': 6, 'seed': seed}
+    return xgb.train(params=params, dtrain=dtrain, num_boost_round=30)
+
+
+def random_inputs(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(-0.5, 3.5, n), rng.uniform(-5, 130, n)])
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+def test_tree_engine_matches_booster():
+    booster = train_booster()
+    tree_model = TreeEnsembleModel.from_booster(booster)
+    X = random_inputs()
+
+    expected = booster.predict(xgb.DMatrix(X, feature_names=FEATURE_NAMES))
+
+    np.testing.assert_allclose(tree_model.predict(X), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_tree_engine_accepts_named_columns():
+    booster = train_booster()
+    tree_model = TreeEnsembleModel.from_booster(booster)
+    X = random_inputs(n=50)
+    expected = booster.predict(xgb.DMatrix(X, feature_names=FEATURE_NAMES))
+
+    # Serving builds columns in a different order than the booster's features
+    columns = {'distance_to_goal': X[:, 1], 'angle_to_goal': X[:, 0]}
+
+    np.testing.assert_allclose(
+        tree_model.predict(columns), expected, rtol=1e-5, atol=1e-6
+    )
+    np.testing.assert_allclose(
+        tree_model.predict(pd.DataFrame(columns)), expected, rtol=1e-5, atol=1e-6
+    )
+
+
+def test_tree_engine_save_load(tmp_path):
+    booster = train_booster()
+    tree_model = TreeEnsembleModel.from_booster(booster)
+    path = tmp_path / 'model_trees.npz'
+    tree_model.save(path)
+
+    loaded = TreeEnsembleModel.load(path)
+    X = random_inputs(n=200)
+
+    assert loaded.feature_names == FEATURE_NAMES
+    assert loaded.max_depth == tree_model.max_depth
+    np.testing.assert_array_equal(loaded.predict(X), tree_model.predict(X))
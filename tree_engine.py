@@ -0,0 +1,162 @@
+import json
+
+import numpy as np
+
+ARTIFACT_NAME = 'model_trees.npz'
+
+LINK_FUNCTIONS = {
+    'binary:logistic': 'logistic',
+    'reg:logistic': 'logistic',
+    'reg:squarederror': 'identity',
+}
+
+NODE_ARRAYS = (
+    'feature',
+    'threshold',
+    'left',
+    'right',
+    'default_left',
+    'value',
+    'roots',
+)
+
+
+def parse_base_score(value):
+    # Newer xgboost releases store the base score as a one-element vector "[5E-1]"
+    return float(str(value).strip('[]'))
+
+
+class TreeEnsembleModel:  # pylint: disable=too-many-instance-attributes
+    """
+    NumPy evaluator for an xgboost tree ensemble exported as flat node arrays.
+
+    Every tree is stored back to back in the same arrays; ``roots`` holds the
+    index of each tree's root node. Leaves have ``feature == -1`` and carry
+    their output in ``value``. Prediction walks all trees for all rows at once,
+    one tree level per step, so it needs neither xgboost nor pandas.
+    """
+
+    # ModelService can hand over a plain mapping of feature columns
+    accepts_columns = True
+
+    def __init__(self, feature_names, nodes, base_margin, link='logistic'):
+        self.feature_names = list(feature_names)
+        self.feature = np.asarray(nodes['feature'], dtype=np.int32)
+        self.threshold = np.asarray(nodes['threshold'], dtype=np.float32)
+        self.left = np.asarray(nodes['left'], dtype=np.int32)
+        self.right = np.asarray(nodes['right'], dtype=np.int32)
+        self.default_left = np.asarray(nodes['default_left'], dtype=bool)
+        self.value = np.asarray(nodes['value'], dtype=np.float32)
+        self.roots = np.asarray(nodes['roots'], dtype=np.int32)
+        self.base_margin = float(base_margin)
+        self.link = link
+        if 'max_depth' in nodes:
+            self.max_depth = int(nodes['max_depth'])
+        else:
+            self.max_depth = self._max_depth()
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Compile a trained ``xgb.Booster`` into flat tree arrays."""
+        learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+
+        objective = learner['objective']['name']
+        if objective not in LINK_FUNCTIONS:
+            raise ValueError(f"Unsupported objective for tree export: {objective}")
+        link = LINK_FUNCTIONS[objective]
+
+        base_score = parse_base_score(learner['learner_model_param']['base_score'])
+        if link == 'logistic':
+            base_margin = np.log(base_score / (1.0 - base_score))
+        else:
+            base_margin = base_score
+
+        nodes = {name: [] for name in NODE_ARRAYS}
+        for tree in learner['gradient_booster']['model']['trees']:
+            if any(tree['split_type']):
+                raise ValueError("Categorical splits are not supported")
+
+            offset = len(nodes['feature'])
+            nodes['roots'].append(offset)
+            for node, left_child in enumerate(tree['left_children']):
+                condition = tree['split_conditions'][node]
+                if left_child == -1:
+                    nodes['feature'].append(-1)
+                    nodes['threshold'].append(0.0)
+                    nodes['left'].append(-1)
+                    nodes['right'].append(-1)
+                    nodes['default_left'].append(False)
+                    nodes['value'].append(condition)
+                else:
+                    nodes['feature'].append(tree['split_indices'][node])
+                    nodes['threshold'].append(condition)
+                    nodes['left'].append(offset + left_child)
+                    nodes['right'].append(offset + tree['right_children'][node])
+                    nodes['default_left'].append(bool(tree['default_left'][node]))
+                    nodes['value'].append(0.0)
+
+        feature_names = learner['feature_names'] or [
+            f'f{index}' for index in range(int(booster.num_features()))
+        ]
+        return cls(feature_names, nodes, base_margin, link)
+
+    def save(self, path):
+        np.savez(
+            path,
+            feature_names=np.array(self.feature_names),
+            base_margin=np.array(self.base_margin),
+            link=np.array(self.link),
+            max_depth=np.array(self.max_depth),
+            **{name: getattr(self, name) for name in NODE_ARRAYS},
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            arrays = dict(npz)
+        return cls(
+            feature_names=[str(name) for name in arrays.pop('feature_names')],
+            base_margin=float(arrays.pop('base_margin')),
+            link=str(arrays.pop('link')),
+            nodes=arrays,
+        )
+
+    def _max_depth(self):
+        depth = np.zeros(len(self.feature), dtype=np.int32)
+        # Children always come after their parent within a tree
+        for node in np.flatnonzero(self.feature >= 0):
+            depth[self.left[node]] = depth[node] + 1
+            depth[self.right[node]] = depth[node] + 1
+        return int(depth.max()) if len(depth) else 0
+
+    def _feature_matrix(self, X):
+        if isinstance(X, np.ndarray):
+            return np.asarray(X, dtype=np.float32).reshape(-1, len(self.feature_names))
+        # DataFrame or mapping of columns, matched by feature name
+        return np.column_stack(
+            [np.asarray(X[name], dtype=np.float32) for name in self.feature_names]
+        )
+
+    def predict_margin(self, X):
+        X = self._feature_matrix(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            is_split = feature >= 0
+            x = X[rows, np.where(is_split, feature, 0)]
+            go_left = np.where(
+                np.isnan(x), self.default_left[node], x < self.threshold[node]
+            )
+            node = np.where(
+                is_split, np.where(go_left, self.left[node], self.right[node]), node
+            )
+
+        return self.value[node].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict(self, X):
+        margin = self.predict_margin(X)
+        if self.link == 'logistic':
+            return 1.0 / (1.0 + np.exp(-margin))
+        return margin